@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+#
+# ase_worker.py
+#
+#   2026/10/18
+#   persistent worker pool for ASE relaxations (calc_code = ASE)
+#     - ase is required (chgnet for --calc chgnet)
+#     - the calculator is created once in each worker process,
+#       and each worker relaxes many structures
+#     - the same contract as ase_in.py + job_cryspy:
+#       POSCAR --> CONTCAR, log.tote (eV/cell), out.log, and stat_job "done"
+#       ("skip" if the relaxation fails, same as the CHGNet example)
+#
+#   usage:
+#     1. job_cryspy only requests a relaxation, and the worker writes stat_job
+#          #!/bin/sh
+#          touch worker_request
+#     2. run the worker pool in the CrySPY project directory (with cryspy_driver.py or repeat_cryspy)
+#          ase_worker.py -j 8 --calc emt
+#          ase_worker.py -j 4 --calc chgnet --fmax 0.01
+#          ase_worker.py -j 8 --calc_file my_calc.py
+#
+#   work/*/ with stat_job "submitted" and worker_request are claimed by renaming
+#   worker_request to worker_claimed, so several ase_worker.py can share a work directory
+#
+#   if a worker process dies (e.g., out of memory or a segfault in the calculator),
+#   the pool is recreated and the claims of the directories in the pool are released,
+#   they are relaxed again one at a time, and a directory that kills the pool alone is set to "skip"
+#
+#   --calc_file: python file defining
+#     get_calculator()                  called once per worker process
+#     relax(atoms, calc) (optional)     return relaxed atoms, default: FixSymmetry,
+#                                       FrechetCellFilter, and BFGS as in the ASE examples
+#
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import glob
+import os
+import time
+
+from phase_timer import add_prof_option, phase, start_prof
+
+
+REQUEST = 'worker_request'
+CLAIMED = 'worker_claimed'
+
+# ---------- worker process state
+_calc = None
+_relax = None
+_params = None
+
+
+def _read_stat(workdir):
+    with open(os.path.join(workdir, 'stat_job'), 'r') as f:
+        return f.read().splitlines()
+
+
+def write_stat(workdir, status):
+    '''same as sed -i -e '3 s/^.*$/status/' stat_job'''
+    path = os.path.join(workdir, 'stat_job')
+    lines = _read_stat(workdir)
+    if len(lines) >= 3:
+        lines[2] = status
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp, path)
+
+
+def default_relax(atoms, calc):
+    from ase.constraints import FixSymmetry
+    from ase.filters import FrechetCellFilter
+    from ase.optimize import BFGS
+
+    atoms.calc = calc
+    atoms.set_constraint([FixSymmetry(atoms)])
+    ecf = FrechetCellFilter(atoms, hydrostatic_strain=False)
+    opt = BFGS(ecf, logfile=_params['logfile'])
+    opt.run(fmax=_params['fmax'], steps=_params['steps'])
+    return ecf.atoms
+
+
+def chgnet_relax(atoms, relaxer):
+    from pymatgen.io.ase import AseAtomsAdaptor
+
+    result = relaxer.relax(atoms=atoms, fmax=_params['fmax'], steps=_params['steps'],
+                           verbose=False)
+    opt_atoms = AseAtomsAdaptor.get_atoms(result['final_structure'])
+    opt_atoms.info['energy'] = result['trajectory'].energies[-1]    # eV/cell
+    return opt_atoms
+
+
+def init_worker(calc_name, calc_file, params):
+    '''
+    create the calculator once in each worker process
+    '''
+    global _calc, _relax, _params
+    _params = params
+    if calc_file is not None:
+        namespace = {'__file__': calc_file}
+        with open(calc_file, 'r') as f:
+            exec(compile(f.read(), calc_file, 'exec'), namespace)
+        _calc = namespace['get_calculator']()
+        _relax = namespace.get('relax', default_relax)
+    elif calc_name == 'emt':
+        from ase.calculators.emt import EMT
+        _calc, _relax = EMT(), default_relax
+    elif calc_name == 'lj':
+        from ase.calculators.lj import LennardJones
+        _calc, _relax = LennardJones(), default_relax
+    elif calc_name == 'chgnet':
+        from chgnet.model import StructOptimizer
+        _calc, _relax = StructOptimizer(), chgnet_relax
+    else:
+        raise ValueError(f'Unknown calculator: {calc_name}')
+
+
+def relax_dir(workdir):
+    '''
+    relax workdir/POSCAR in a worker process
+    return (workdir, status, elapsed time)
+    '''
+    from ase.io import read, write
+
+    start = time.perf_counter()
+    try:
+        _params['logfile'] = os.path.join(workdir, 'out.log')
+        atoms = read(os.path.join(workdir, 'POSCAR'), format='vasp')
+        opt_atoms = _relax(atoms, _calc)
+        e = opt_atoms.info['energy'] if 'energy' in opt_atoms.info else opt_atoms.get_total_energy()
+        write(os.path.join(workdir, 'CONTCAR'), opt_atoms, format='vasp', direct=True)
+        with open(os.path.join(workdir, 'log.tote'), mode='w') as f:
+            f.write(str(e))
+        status = 'done'
+    except Exception as exc:
+        with open(os.path.join(workdir, 'out.log'), 'a') as f:
+            f.write(f'ase_worker: {type(exc).__name__}: {exc}\n')
+        status = 'skip'
+    return workdir, status, time.perf_counter() - start
+
+
+def claim(workdir):
+    '''
+    claim workdir if stat_job is submitted and worker_request exists
+    the rename is atomic, only one worker pool gets it
+    '''
+    try:
+        lines = _read_stat(workdir)
+        if len(lines) < 3 or lines[2].strip() != 'submitted':
+            return False
+        os.rename(os.path.join(workdir, REQUEST), os.path.join(workdir, CLAIMED))
+    except OSError:
+        return False
+    # ------ remove old results in a reused work directory
+    for name in ('CONTCAR', 'log.tote'):
+        if os.path.isfile(os.path.join(workdir, name)):
+            os.remove(os.path.join(workdir, name))
+    return True
+
+
+def scan(workdir_root):
+    return sorted(os.path.dirname(path) for path in glob.glob(os.path.join(workdir_root, '*', REQUEST)))
+
+
+def release(workdir):
+    '''
+    give the claim back, the next scan claims workdir again
+    '''
+    os.rename(os.path.join(workdir, CLAIMED), os.path.join(workdir, REQUEST))
+
+
+def serve(args):
+    params = {'fmax': args.fmax, 'steps': args.steps}
+    nrelax, tot_time = 0, 0.0
+    start = time.perf_counter()
+    interval = args.min_interval
+    last_busy = time.monotonic()
+    suspects = set()    # directories in a crashed pool, relaxed one at a time
+
+    def new_pool():
+        return ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                                   initargs=(args.calc, args.calc_file, params))
+
+    executor = new_pool()
+    running = {}    # {future: workdir}
+    try:
+        with phase('serve') as ph:
+            while True:
+                # ---------- claim requests, keep at most 2 tasks per worker in the queue
+                for workdir in scan(args.workdir):
+                    if len(running) >= 2*args.jobs or not suspects.isdisjoint(running.values()):
+                        break
+                    if workdir in suspects and running:
+                        continue
+                    if claim(workdir):
+                        running[executor.submit(relax_dir, workdir)] = workdir
+                        if workdir in suspects:
+                            break
+                # ---------- results
+                if running:
+                    done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                    lost = []
+                    for future in done:
+                        workdir = running.pop(future)
+                        try:
+                            workdir, status, elapsed = future.result()
+                        except BrokenProcessPool:
+                            lost.append(workdir)
+                            continue
+                        ph.add()
+                        suspects.discard(workdir)
+                        os.remove(os.path.join(workdir, CLAIMED))
+                        write_stat(workdir, status)
+                        nrelax += 1
+                        tot_time += elapsed
+                        print(f'{workdir}: {status} ({elapsed:.2f} s)', flush=True)
+                    if lost:
+                        # ------ every task of the pool is lost, release or skip them and start a new pool
+                        lost += running.values()
+                        running = {}
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        if len(lost) == 1:    # alone in the pool: this directory kills the worker
+                            workdir = lost[0]
+                            suspects.discard(workdir)
+                            with open(os.path.join(workdir, 'out.log'), 'a') as f:
+                                f.write('ase_worker: worker process died\n')
+                            os.remove(os.path.join(workdir, CLAIMED))
+                            write_stat(workdir, 'skip')
+                            print(f'{workdir}: skip (worker process died)', flush=True)
+                        else:
+                            for workdir in lost:
+                                release(workdir)
+                                suspects.add(workdir)
+                                print(f'{workdir}: released (worker process died)', flush=True)
+                        executor = new_pool()
+                    interval = args.min_interval
+                    last_busy = time.monotonic()
+                    continue
+                # ---------- idle
+                if args.once or (args.idle_exit is not None and time.monotonic() - last_busy > args.idle_exit):
+                    break
+                time.sleep(interval)
+                interval = min(2*interval, args.max_interval)
+    finally:
+        # ------ interrupted: give the running directories back
+        for workdir in running.values():
+            release(workdir)
+        executor.shutdown(wait=False, cancel_futures=True)
+    elapsed = time.perf_counter() - start
+    print(f'Relaxed {nrelax} structures in {elapsed:.1f} s'
+          f' (relaxation {tot_time:.1f} s, {args.jobs} processes)')
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-j', '--jobs', help='number of worker processes (default 1)', type=int, default=1)
+    parser.add_argument('--calc', help='calculator (default: emt)', choices=['emt', 'lj', 'chgnet'], default='emt')
+    parser.add_argument('--calc_file', help='python file defining get_calculator() and optionally relax(atoms, calc)')
+    parser.add_argument('--fmax', help='fmax in eV/A (default 0.05)', type=float, default=0.05)
+    parser.add_argument('--steps', help='max steps (default 2000)', type=int, default=2000)
+    parser.add_argument('--threads', help='OMP_NUM_THREADS in each worker (default 1)', default='1')
+    parser.add_argument('--workdir', help='work directory (default: work)', default='work')
+    parser.add_argument('--min_interval', help='first polling interval in s (default 0.2)', type=float, default=0.2)
+    parser.add_argument('--max_interval', help='max polling interval in s (default 10)', type=float, default=10.0)
+    parser.add_argument('--idle_exit', help='exit after idle for this many s (default: never)', type=float)
+    parser.add_argument('--once', help='relax the current requests and exit', action='store_true')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- threads: before numpy/torch are imported in the workers
+    os.environ['OMP_NUM_THREADS'] = args.threads
+    os.environ['MKL_NUM_THREADS'] = args.threads
+
+    # ---------- serve
+    try:
+        serve(args)
+    except KeyboardInterrupt:
+        print('Interrupted')
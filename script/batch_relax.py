@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+#
+# batch_relax.py
+#
+#   2026/10/18
+#   batched relaxation for cheap pair/many-body potentials
+#     - numpy and pymatgen are required
+#     - structures with the same number of atoms are stacked and relaxed together:
+#       energy, forces, and stress of the whole batch in NumPy, FIRE update of all of them
+#     - potentials
+#         lj: Lennard-Jones, shifted to zero at rc (same as ase.calculators.lj, smooth=False)
+#         sc: Sutton-Chen (EMT-like embedded atom), Ni Cu Pd Ag Pt Au Al, mixing rule:
+#             eps_ij, a_ij, n_ij, m_ij = sqrt(eps_i*eps_j), (a_i+a_j)/2, (n_i+n_j)/2, (m_i+m_j)/2
+#     - cell degrees of freedom as in ase.constraints.UnitCellFilter (cell_factor = natom),
+#       no symmetry constraint (FixSymmetry is not applied)
+#     - same contract as ase_in.py + job_cryspy: POSCAR --> CONTCAR, log.tote (eV/cell), out.log
+#
+#   example:
+#     - work directories with worker_request (see ase_worker.py), stat_job --> done
+#       batch_relax.py --pot sc
+#     - given directories
+#       batch_relax.py work/000001 work/000002 --pot lj --sigma 2.4 --rc 3.0
+#
+import argparse
+import os
+import time
+
+import numpy as np
+
+from periodic_nbr import image_shifts
+from phase_timer import add_prof_option, phase, start_prof
+
+
+# ---------- Sutton-Chen parameters: n, m, eps (eV), c, a (A)
+SC_PARAMS = {
+    'Ni': (9, 6, 1.5707e-2, 39.432, 3.52),
+    'Cu': (9, 6, 1.2382e-2, 39.432, 3.61),
+    'Pd': (12, 7, 4.1790e-3, 108.27, 3.89),
+    'Ag': (12, 6, 2.5415e-3, 144.41, 4.09),
+    'Pt': (10, 8, 1.9833e-2, 34.408, 3.92),
+    'Au': (10, 8, 1.2793e-2, 34.408, 4.08),
+    'Al': (7, 6, 3.3147e-2, 16.399, 4.05),
+}
+
+
+# ---------- batched kernels
+def build_pairs(lattices, positions, rcut):
+    '''
+    ordered pairs (i, j, image) within rcut for all the structures in the batch
+    return b, i, j (npair,), nshift (npair, 3): r_j - r_i = (frac_j - frac_i + nshift) @ lattice
+    '''
+    frac = positions @ np.linalg.inv(lattices)
+    diff = frac[:, None, :, :] - frac[:, :, None, :]    # x_j - x_i
+    wrap = -np.round(diff)
+    shifts = image_shifts(lattices, rcut).astype(float)
+    cart = (diff + wrap) @ lattices[:, None, :, :]    # (nbatch, n, n, 3)
+    cart_shifts = shifts @ lattices    # (nbatch, nimage, 3)
+    vec = cart[:, :, :, None, :] + cart_shifts[:, None, None, :, :]
+    dist2 = (vec**2).sum(axis=-1)
+    b, i, j, m = np.nonzero((dist2 < rcut**2) & (dist2 > 1e-16))
+    return b, i, j, wrap[b, i, j] + shifts[m]
+
+
+def pair_list(lattices, positions, rcut, pairs=None):
+    '''
+    pairs within rcut, from pairs = (b, i, j, nshift) built with a larger cutoff if given
+    return b, i, j (npair,), vec (npair, 3) = r_j + shift - r_i, dist (npair,)
+    '''
+    if pairs is None:
+        pairs = build_pairs(lattices, positions, rcut)
+    b, i, j, nshift = pairs
+    frac = positions @ np.linalg.inv(lattices)
+    vec = np.einsum('pk,pkl->pl', frac[b, j] - frac[b, i] + nshift, lattices[b])
+    dist = np.sqrt((vec**2).sum(axis=-1))
+    sel = dist < rcut
+    return b[sel], i[sel], j[sel], vec[sel], dist[sel]
+
+
+def _sum_pairs(dedr, b, i, j, vec, dist, shape, volumes):
+    '''
+    energies are summed by the caller, forces and stress from dE/dr of each ordered pair
+    '''
+    nbatch, natom = shape
+    g = (dedr / dist)[:, None] * vec    # (npair, 3)
+    bi = b*natom + i
+    bj = b*natom + j
+    forces = np.empty((nbatch*natom, 3))
+    for k in range(3):
+        forces[:, k] = (np.bincount(bi, weights=g[:, k], minlength=nbatch*natom)
+                        - np.bincount(bj, weights=g[:, k], minlength=nbatch*natom))
+    stress = np.empty((nbatch, 3, 3))
+    for k in range(3):
+        for l in range(k, 3):
+            stress[:, k, l] = stress[:, l, k] = np.bincount(b, weights=g[:, k]*vec[:, l], minlength=nbatch)
+    return forces.reshape(nbatch, natom, 3), stress / volumes[:, None, None]
+
+
+def lj_kernel(lattices, positions, types, params, pairs=None):
+    '''
+    return energies (nbatch,), forces (nbatch, n, 3), stress (nbatch, 3, 3) in eV/A^3
+    pairs: see pair_list()
+    '''
+    eps, sigma, rc = params['epsilon'], params['sigma'], params['rc']
+    shape = positions.shape[:2]
+    b, i, j, vec, dist = pair_list(lattices, positions, rc, pairs)
+    sr6 = (sigma / dist)**6
+    e0 = 4*eps*((sigma/rc)**12 - (sigma/rc)**6) if params['shift'] else 0.0
+    energies = 0.5*np.bincount(b, weights=4*eps*(sr6**2 - sr6) - e0, minlength=shape[0])
+    dedr = 0.5*4*eps*(-12*sr6**2 + 6*sr6) / dist
+    forces, stress = _sum_pairs(dedr, b, i, j, vec, dist, shape, np.abs(np.linalg.det(lattices)))
+    return energies, forces, stress
+
+
+def sc_kernel(lattices, positions, types, params, pairs=None):
+    '''
+    Sutton-Chen: E = sum_i [ 1/2 sum_j eps_ij V_ij(r) - eps_i c_i sqrt(rho_i) ],
+    V_ij = (a_ij/r)^n_ij, rho_i = sum_j (a_ij/r)^m_ij, both shifted to zero at rc
+    types: (nbatch, n) index into params['table'] (ntype, 5)
+    '''
+    table = params['table']
+    rc = params['rc']
+    nbatch, natom = shape = positions.shape[:2]
+    b, i, j, vec, dist = pair_list(lattices, positions, rc, pairs)
+    ti = types[b, i]
+    tj = types[b, j]
+    n = 0.5*(table[ti, 0] + table[tj, 0])
+    m = 0.5*(table[ti, 1] + table[tj, 1])
+    eps = np.sqrt(table[ti, 2] * table[tj, 2])
+    a = 0.5*(table[ti, 4] + table[tj, 4])
+    # ---------- pair and density, (a/r)^p = exp(p log(a/r))
+    log_ar = np.log(a / dist)
+    log_arc = np.log(a / rc)
+    vr = np.exp(n*log_ar)
+    rho_r = np.exp(m*log_ar)
+    bi = b*natom + i
+    rho = np.bincount(bi, weights=rho_r - np.exp(m*log_arc), minlength=nbatch*natom).reshape(shape)
+    rho = np.maximum(rho, 1e-12)
+    eps_c = table[types, 2] * table[types, 3]    # eps_i * c_i
+    energies = (0.5*np.bincount(b, weights=eps*(vr - np.exp(n*log_arc)), minlength=nbatch)
+                - (eps_c * np.sqrt(rho)).sum(axis=1))
+    # ---------- dE/dr of ordered pair ij: 1/2 phi' + F'(rho_i) rho'
+    dembed = (-0.5 * eps_c / np.sqrt(rho)).ravel()
+    dedr = (0.5*eps*(-n)*vr + dembed[bi]*(-m)*rho_r) / dist
+    forces, stress = _sum_pairs(dedr, b, i, j, vec, dist, shape, np.abs(np.linalg.det(lattices)))
+    return energies, forces, stress
+
+
+KERNELS = {'lj': lj_kernel, 'sc': sc_kernel}
+
+
+# ---------- batched FIRE with cell degrees of freedom
+def fire_relax(lattices, positions, types, kernel, params, fmax=0.05, steps=2000, skin=0.5,
+               dt=0.1, maxstep=0.2, dtmax=1.0, nmin=5, finc=1.1, fdec=0.5, astart=0.1, fa=0.99):
+    '''
+    FIRE (same parameters as ase.optimize.FIRE) for all the structures at once
+    variables: positions in the undeformed cell and cell_factor * deformation gradient
+    pair list is built with rc + skin, and rebuilt only when an excluded pair
+    can come within rc: 2 max|displacement| + (rc + skin) |strain| > skin
+    return lattices, positions, energies, nsteps, converged
+    '''
+    nbatch, natom = positions.shape[:2]
+    orig_cell = lattices.copy()
+    cell_factor = float(natom)
+    eye = np.broadcast_to(np.eye(3), (nbatch, 3, 3))
+    # ------ generalized coordinates (nbatch, natom + 3, 3)
+    x = np.concatenate([positions, cell_factor * eye], axis=1)
+    v = np.zeros_like(x)
+    dts = np.full(nbatch, dt)
+    alphas = np.full(nbatch, astart)
+    nsince = np.zeros(nbatch, dtype=int)
+    active = np.ones(nbatch, dtype=bool)
+    nsteps = np.zeros(nbatch, dtype=int)
+    energies = np.zeros(nbatch)
+    # ------ pair list: (b, i, j, nshift) with b in the whole batch, reference frac and cells
+    rlist = params['rc'] + skin
+    nbr = {'pairs': None, 'frac': None, 'cells': None}
+
+    def update_pairs(idx, cells, pos):
+        frac = pos @ np.linalg.inv(cells)
+        if nbr['pairs'] is not None:
+            strain = np.linalg.norm(np.linalg.inv(nbr['cells'][idx]) @ cells - np.eye(3), ord=2, axis=(1, 2))
+            dfrac = frac - nbr['frac'][idx]
+            disp = np.sqrt(((dfrac @ cells)**2).sum(axis=-1)).max(axis=1)
+            if (2*disp + rlist*strain < skin).all():
+                return
+        b, i, j, nshift = build_pairs(cells, pos, rlist)
+        nbr['pairs'] = (idx[b], i, j, nshift)
+        if nbr['frac'] is None:
+            nbr['frac'] = np.zeros((nbatch, natom, 3))
+            nbr['cells'] = np.zeros((nbatch, 3, 3))
+        nbr['frac'][idx] = frac
+        nbr['cells'][idx] = cells
+
+    def evaluate(idx):
+        dg = x[idx, natom:] / cell_factor    # deformation gradient
+        cells = orig_cell[idx] @ np.swapaxes(dg, 1, 2)
+        pos = x[idx, :natom] @ np.swapaxes(dg, 1, 2)
+        update_pairs(idx, cells, pos)
+        # ------ pairs of idx, b --> position in idx
+        local = np.full(nbatch, -1)
+        local[idx] = np.arange(len(idx))
+        b, i, j, nshift = nbr['pairs']
+        sel = local[b] >= 0
+        e, f, s = kernel(cells, pos, types[idx], params, (local[b[sel]], i[sel], j[sel], nshift[sel]))
+        virial = -np.abs(np.linalg.det(cells))[:, None, None] * s
+        gf = np.concatenate([f @ dg, np.swapaxes(np.linalg.solve(dg, np.swapaxes(virial, 1, 2)), 1, 2) / cell_factor],
+                            axis=1)
+        return e, gf
+
+    for step in range(steps + 1):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        e, f = evaluate(idx)
+        energies[idx] = e
+        # ------ convergence
+        conv = np.sqrt((f**2).sum(axis=-1)).max(axis=1) < fmax
+        active[idx[conv]] = False
+        if step == steps:
+            break
+        keep = ~conv
+        idx, f = idx[keep], f[keep]
+        first = nsteps[idx] == 0    # no velocity yet
+        nsteps[idx] += 1
+        # ------ FIRE
+        vi = v[idx]
+        vf = (vi * f).sum(axis=(1, 2))
+        up = vf > 0
+        fnorm = np.sqrt((f**2).sum(axis=(1, 2)))[:, None, None]
+        vnorm = np.sqrt((vi**2).sum(axis=(1, 2)))[:, None, None]
+        a = alphas[idx][:, None, None]
+        vi = np.where(up[:, None, None], (1 - a)*vi + a*f/np.maximum(fnorm, 1e-30)*vnorm, 0.0)
+        grow = up & (nsince[idx] > nmin)
+        down = ~up & ~first
+        dts[idx] = np.where(grow, np.minimum(dts[idx]*finc, dtmax), np.where(down, dts[idx]*fdec, dts[idx]))
+        alphas[idx] = np.where(grow, alphas[idx]*fa, np.where(down, astart, alphas[idx]))
+        nsince[idx] = np.where(up, nsince[idx] + 1, np.where(down, 0, nsince[idx]))
+        d = dts[idx][:, None, None]
+        vi = vi + d*f
+        dr = d*vi
+        normdr = np.sqrt((dr**2).sum(axis=(1, 2)))[:, None, None]
+        dr = np.where(normdr > maxstep, maxstep*dr/np.maximum(normdr, 1e-30), dr)
+        v[idx] = vi
+        x[idx] += dr
+
+    dg = x[:, natom:] / cell_factor
+    cells = orig_cell @ np.swapaxes(dg, 1, 2)
+    pos = x[:, :natom] @ np.swapaxes(dg, 1, 2)
+    return cells, pos, energies, nsteps, ~active
+
+
+# ---------- work directories
+def load_dirs(workdirs, pot, params):
+    '''
+    read POSCAR in workdirs, group by the number of atoms
+    return {natom: [(workdir, Structure), ...]}, [(workdir, error message), ...]
+    a directory which cannot be loaded does not stop the others
+    '''
+    from pymatgen.core import Structure
+
+    groups = {}
+    failed = []
+    for workdir in workdirs:
+        try:
+            struc = Structure.from_file(os.path.join(workdir, 'POSCAR'))
+            if pot == 'sc':
+                missing = {sp.symbol for sp in struc.species} - set(SC_PARAMS)
+                if missing:
+                    raise ValueError(f'no Sutton-Chen parameters for {missing}')
+        except Exception as exc:
+            failed.append((workdir, f'{type(exc).__name__}: {exc}'))
+            continue
+        groups.setdefault(len(struc), []).append((workdir, struc))
+    return groups, failed
+
+
+def relax_group(items, pot, params, fmax, steps, batch_size):
+    '''
+    relax [(workdir, Structure), ...] with the same number of atoms in batches
+    write CONTCAR, log.tote, out.log, return [(workdir, converged), ...]
+    '''
+    from pymatgen.core import Structure
+
+    symbols = list(SC_PARAMS)
+    results = []
+    for i in range(0, len(items), batch_size):
+        batch = items[i:i+batch_size]
+        lattices = np.array([s.lattice.matrix for _, s in batch])
+        positions = np.array([s.cart_coords for _, s in batch])
+        if pot == 'sc':
+            types = np.array([[symbols.index(sp.symbol) for sp in s.species] for _, s in batch])
+        else:
+            types = np.zeros(positions.shape[:2], dtype=int)
+        cells, pos, energies, nsteps, converged = fire_relax(lattices, positions, types, KERNELS[pot], params,
+                                                             fmax=fmax, steps=steps)
+        for k, (workdir, struc) in enumerate(batch):
+            opt = Structure(cells[k], struc.species, pos[k], coords_are_cartesian=True)
+            opt.to(fmt='poscar', filename=os.path.join(workdir, 'CONTCAR'))
+            with open(os.path.join(workdir, 'log.tote'), mode='w') as f:
+                f.write(str(energies[k]))
+            with open(os.path.join(workdir, 'out.log'), mode='w') as f:
+                f.write(f'batch_relax.py: pot = {pot}, FIRE steps = {nsteps[k]}, converged = {converged[k]}\n')
+                f.write(f'energy = {energies[k]} eV/cell\n')
+            results.append((workdir, bool(converged[k])))
+    return results
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('workdirs', help='directories with POSCAR (default: requests in work, see ase_worker.py)',
+                        nargs='*')
+    parser.add_argument('--pot', help='potential (default: sc)', choices=['lj', 'sc'], default='sc')
+    parser.add_argument('--epsilon', help='LJ epsilon in eV (default 1.0)', type=float, default=1.0)
+    parser.add_argument('--sigma', help='LJ sigma in A (default 1.0)', type=float, default=1.0)
+    parser.add_argument('--rc', help='cutoff in A (default: 3 sigma for lj, 1.75 max(a) for sc)', type=float)
+    parser.add_argument('--no_shift', help='LJ energy is not shifted at rc (same as LAMMPS lj/cut)', action='store_true')
+    parser.add_argument('--fmax', help='fmax in eV/A (default 0.05)', type=float, default=0.05)
+    parser.add_argument('--steps', help='max FIRE steps (default 2000)', type=int, default=2000)
+    parser.add_argument('-b', '--batch', help='max structures in a batch (default 64)', type=int, default=64)
+    parser.add_argument('--workdir', help='work directory for requests (default: work)', default='work')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- potential
+    if args.pot == 'lj':
+        params = {'epsilon': args.epsilon, 'sigma': args.sigma, 'shift': not args.no_shift,
+                  'rc': args.rc if args.rc else 3.0*args.sigma}
+    else:
+        table = np.array(list(SC_PARAMS.values()), dtype=float)
+        params = {'table': table, 'rc': args.rc if args.rc else 1.75*table[:, 4].max()}
+
+    # ---------- directories: given or claimed requests
+    claimed = not args.workdirs
+    if claimed:
+        from ase_worker import CLAIMED, claim, scan, write_stat
+        workdirs = [workdir for workdir in scan(args.workdir) if claim(workdir)]
+    else:
+        workdirs = args.workdirs
+
+    # ---------- relax
+    start = time.perf_counter()
+    nconv = 0
+    with phase('load'):
+        groups, failed = load_dirs(workdirs, args.pot, params)
+    # ------ same as ase_worker.relax_dir: "skip" if the structure cannot be relaxed
+    for workdir, error in failed:
+        with open(os.path.join(workdir, 'out.log'), 'a') as f:
+            f.write(f'batch_relax.py: {error}\n')
+        if claimed:
+            os.remove(os.path.join(workdir, CLAIMED))
+            write_stat(workdir, 'skip')
+        print(f'{workdir}: skip ({error})')
+    with phase('relax') as ph:
+        for natom, items in sorted(groups.items()):
+            for workdir, converged in relax_group(items, args.pot, params, args.fmax, args.steps, args.batch):
+                nconv += converged
+                if claimed:
+                    os.remove(os.path.join(workdir, CLAIMED))
+                    write_stat(workdir, 'done')
+                ph.add()
+    elapsed = time.perf_counter() - start
+    print(f'Relaxed {len(workdirs) - len(failed)} structures in {elapsed:.2f} s, converged: {nconv}'
+          f', skipped: {len(failed)}')
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+#
+# bench_scripts.py
+#
+#   2026/10/18
+#   benchmark of the utility scripts with synthetic data
+#     - numpy, pandas, and pymatgen are required (same as the scripts)
+#     - inputs are generated offline in datadir (default: bench_data) and reused
+#       while the scale parameters are the same (datadir/params.json)
+#     - each case runs the script in a subprocess (fresh interpreter, outputs in datadir/run/case)
+#       wall time, cpu time (including child processes), and peak RSS are measured
+#       (peak RSS of the main process, not of the -j workers)
+#     - output: bench_results.json (machine-readable)
+#
+#   synthetic data
+#     init_POSCARS                  random Si16 and Cu8Au8 structures with ID_ lines, up to poscar_mb
+#     pkl_data/                     EA-style: init_struc_data.pkl, opt_struc_data.pkl, rslt_data.pkl
+#                                   LAQA-style: laqa_step.pkl, laqa_energy.pkl, laqa_score.pkl, id_select_hist.pkl
+#     qe/pwscf.in, qe/pwscf.out     vc-relax with qe_steps ionic steps (Si16)
+#     qe_work/*/                    nwork short pwscf.in/pwscf.out pairs for --batch
+#
+#   scale presets (each value can be overwritten by the options)
+#     small:  nstruc 500,   poscar_mb 10,   qe_steps 200,   nwork 50
+#     medium: nstruc 5000,  poscar_mb 200,  qe_steps 2000,  nwork 500
+#     large:  nstruc 50000, poscar_mb 2000, qe_steps 20000, nwork 2000
+#
+#   comparison
+#     regression if min wall time > baseline * (1 + threshold) and the difference > 0.05 s,
+#     or peak RSS > baseline * (1 + mem_threshold)
+#     the exit code is 1 if any regression is found
+#
+#   example:
+#     bench_scripts.py
+#     bench_scripts.py --scale medium -r 5 -o baseline.json
+#     bench_scripts.py --scale medium -r 5 --compare baseline.json
+#     bench_scripts.py --cases pos2pkl kpt_check --poscar_mb 50
+#     bench_scripts.py --compare baseline.json --results bench_results.json    # no run, compare only
+#
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import datetime
+import json
+import os
+import pickle
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SCALES = {
+    'small': {'nstruc': 500, 'poscar_mb': 10.0, 'qe_steps': 200, 'nwork': 50},
+    'medium': {'nstruc': 5000, 'poscar_mb': 200.0, 'qe_steps': 2000, 'nwork': 500},
+    'large': {'nstruc': 50000, 'poscar_mb': 2000.0, 'qe_steps': 20000, 'nwork': 2000},
+}
+SYSTEMS = {
+    'Si16': (['Si'], [16], 20.0),             # elements, numbers of atoms, volume/atom
+    'Cu8Au8': (['Cu', 'Au'], [8, 8], 14.5),
+}
+
+
+# ---------- random structures
+def random_cells(rng, nstruc, nat, vol_atom):
+    '''
+    return lattices (nstruc, 3, 3) and fractional coordinates (nstruc, nat, 3)
+    lattice vectors: lengths within +-20 % and angles 60--120 deg, scaled to vol_atom * nat
+    '''
+    abc = rng.uniform(0.8, 1.2, size=(nstruc, 3))
+    alpha, beta, gamma = np.radians(rng.uniform(60.0, 120.0, size=(3, nstruc)))
+    lattices = np.zeros((nstruc, 3, 3))
+    lattices[:, 0, 0] = abc[:, 0]
+    lattices[:, 1, 0] = abc[:, 1] * np.cos(gamma)
+    lattices[:, 1, 1] = abc[:, 1] * np.sin(gamma)
+    cx = np.cos(beta)
+    cy = (np.cos(alpha) - np.cos(beta)*np.cos(gamma)) / np.sin(gamma)
+    cz = np.sqrt(np.clip(1.0 - cx**2 - cy**2, 0.05, None))    # clip: avoid degenerate cells
+    lattices[:, 2] = abc[:, 2, None] * np.stack([cx, cy, cz], axis=1)
+    vol = np.abs(np.linalg.det(lattices))
+    lattices *= ((vol_atom * nat / vol) ** (1.0/3.0))[:, None, None]
+    coords = rng.random((nstruc, nat, 3))
+    return lattices, coords
+
+
+def random_strucs(rng, nstruc, system):
+    '''
+    return {cid: pymatgen Structure}
+    '''
+    from pymatgen.core import Structure
+
+    elements, nats, vol_atom = SYSTEMS[system]
+    species = [ele for ele, n in zip(elements, nats) for _ in range(n)]
+    lattices, coords = random_cells(rng, nstruc, len(species), vol_atom)
+    return {cid: Structure(lattices[cid], species, coords[cid]) for cid in range(nstruc)}
+
+
+def poscar_text(cid, lattice, elements, nats, coords):
+    lines = [f'ID_{cid}', '1.0']
+    lines += ['  {:.10f} {:.10f} {:.10f}'.format(*vec) for vec in lattice]
+    lines += ['  ' + ' '.join(elements), '  ' + ' '.join(str(n) for n in nats), 'Direct']
+    lines += ['  {:.10f} {:.10f} {:.10f}'.format(*xyz) for xyz in coords]
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- generators
+def gen_poscars(rng, filename, target_mb, chunk=2000):
+    '''
+    init_POSCARS of alternating Si16 and Cu8Au8 blocks until target_mb
+    '''
+    target = int(target_mb * 1024**2)
+    nbyte, cid = 0, 0
+    with open(filename, 'w') as f:
+        while nbyte < target:
+            for system in SYSTEMS:
+                elements, nats, vol_atom = SYSTEMS[system]
+                lattices, coords = random_cells(rng, chunk, sum(nats), vol_atom)
+                texts = []
+                for lattice, xyz in zip(lattices, coords):
+                    texts.append(poscar_text(cid, lattice, elements, nats, xyz))
+                    cid += 1
+                data = ''.join(texts)
+                f.write(data)
+                nbyte += len(data)
+                if nbyte >= target:
+                    break
+    return cid
+
+
+def gen_pkl_data(rng, pkl_dir, nstruc, system='Si16'):
+    '''
+    EA-style and LAQA-style pkl_data with nstruc structures
+    '''
+    import pandas as pd
+
+    os.makedirs(pkl_dir, exist_ok=True)
+    init_struc_data = random_strucs(rng, nstruc, system)
+    opt_struc_data = {}
+    for cid, struc in init_struc_data.items():
+        opt = struc.copy()
+        opt.perturb(0.05)
+        opt_struc_data[cid] = opt
+    # ------ rslt_data: EA with 20 structures per generation
+    ngen = max(1, nstruc // 20)
+    rslt_data = pd.DataFrame({
+        'Gen': (np.arange(nstruc) * ngen // nstruc + 1).astype(np.int64),
+        'Spg_num': rng.choice([1, 2, 12, 63, 139, 166, 194, 225, 227], size=nstruc),
+        'Spg_sym': 'P1',
+        'Spg_num_opt': rng.choice([1, 2, 12, 63, 139, 166, 194, 225, 227], size=nstruc),
+        'Spg_sym_opt': 'P1',
+        'E_eV_atom': rng.normal(-5.0, 0.3, size=nstruc),
+        'Magmom': np.nan,
+        'Opt': rng.choice(['done', 'not_yet', 'no_file'], size=nstruc, p=[0.9, 0.08, 0.02]),
+    }, index=pd.Index(np.arange(nstruc), name='Struc_ID'))
+    # ------ LAQA: 1--30 selections per ID, energies decrease toward a random minimum
+    laqa_step, laqa_energy, laqa_score = {}, {}, {}
+    nsel = rng.integers(1, 31, size=nstruc)
+    for cid in range(nstruc):
+        steps = rng.integers(1, 100, size=nsel[cid])
+        emin = rng.normal(-5.0, 0.3)
+        energy = emin + 2.0 * np.exp(-np.cumsum(steps) / 200.0)
+        laqa_step[cid] = steps.tolist()
+        laqa_energy[cid] = energy.tolist()
+        laqa_score[cid] = (-energy + rng.normal(0.0, 0.05, size=nsel[cid])).tolist()
+    # ------ id_select_hist: IDs with more selections are selected again
+    remaining = nsel - 1
+    id_select_hist = []
+    while remaining.any():
+        ids = np.flatnonzero(remaining > 0)
+        nsel_now = min(len(ids), 10)
+        id_select_hist.append(sorted(rng.choice(ids, size=nsel_now, replace=False).tolist()))
+        remaining[id_select_hist[-1]] -= 1
+    for name, obj in (('init_struc_data', init_struc_data), ('opt_struc_data', opt_struc_data),
+                      ('rslt_data', rslt_data), ('laqa_step', laqa_step), ('laqa_energy', laqa_energy),
+                      ('laqa_score', laqa_score), ('id_select_hist', id_select_hist)):
+        with open(os.path.join(pkl_dir, f'{name}.pkl'), 'wb') as f:
+            pickle.dump(obj, f)
+
+
+def pwscf_in_text(lattice, species, coords):
+    lines = [' &control', "    calculation = 'vc-relax'", '    nstep = 100000', ' /', '',
+             ' &system', '    ibrav = 0', f'    nat = {len(species)}', f'    ntyp = {len(set(species))}',
+             '    ecutwfc = 44.0', ' /', '', ' &electrons', ' /', '', ' &ions', ' /', '', ' &cell', ' /', '',
+             'ATOMIC_SPECIES']
+    lines += [f'  {ele}  1.0  {ele}.UPF' for ele in dict.fromkeys(species)]
+    lines += ['', 'CELL_PARAMETERS angstrom']
+    lines += ['  {:.8f} {:.8f} {:.8f}'.format(*vec) for vec in lattice]
+    lines += ['ATOMIC_POSITIONS (crystal)']
+    lines += ['{} {:.8f} {:.8f} {:.8f}'.format(ele, *xyz) for ele, xyz in zip(species, coords)]
+    lines += ['K_POINTS automatic', ' 4 4 4 0 0 0']
+    return '\n'.join(lines) + '\n'
+
+
+def pwscf_step_text(rng, istep, lattice, species, coords, nscf=12):
+    '''
+    one ionic step of pw.x output: scf iterations, forces, stress, and the new structure
+    '''
+    energy = -93.0 - 0.01 * np.log1p(istep)
+    lines = [f'     number of scf cycles    = {istep:4d}', f'     number of bfgs steps    = {istep:4d}', '']
+    for it in range(1, nscf + 1):
+        lines += [f'     iteration #{it:3d}     ecut=    44.00 Ry     beta= 0.70',
+                  '     Davidson diagonalization with overlap',
+                  f'     total cpu time spent up to now is {istep*1.7 + it*0.1:10.1f} secs', '',
+                  f'     total energy              = {energy + 0.1/it:17.8f} Ry',
+                  f'     estimated scf accuracy    < {10.0**-it:17.8f} Ry', '']
+    lines += [f'!    total energy              = {energy:17.8f} Ry', '', '     Forces acting on atoms (cartesian axes, Ry/au):', '']
+    forces = rng.normal(0.0, 1e-3, size=(len(species), 3))
+    lines += [f'     atom {i+1:4d} type  1   force = {fx:14.8f}{fy:14.8f}{fz:14.8f}'
+              for i, (fx, fy, fz) in enumerate(forces)]
+    lines += ['', '     Computing stress (Cartesian axis) and pressure', '',
+              '          total   stress  (Ry/bohr**3)                   (kbar)     P=       -0.51', '']
+    lines += ['CELL_PARAMETERS (angstrom)']
+    lines += ['  {:14.9f} {:14.9f} {:14.9f}'.format(*vec) for vec in lattice]
+    lines += ['', 'ATOMIC_POSITIONS (crystal)']
+    lines += ['{}  {:14.10f} {:14.10f} {:14.10f}'.format(ele, *xyz) for ele, xyz in zip(species, coords)]
+    lines += ['', '']
+    return '\n'.join(lines)
+
+
+def gen_pwscf(rng, qe_dir, nstep, system='Si16'):
+    '''
+    pwscf.in and pwscf.out of a vc-relax with nstep ionic steps
+    '''
+    elements, nats, vol_atom = SYSTEMS[system]
+    species = [ele for ele, n in zip(elements, nats) for _ in range(n)]
+    lattices, coords = random_cells(rng, 1, len(species), vol_atom)
+    lattice, coord = lattices[0], coords[0]
+    os.makedirs(qe_dir, exist_ok=True)
+    with open(os.path.join(qe_dir, 'pwscf.in'), 'w') as f:
+        f.write(pwscf_in_text(lattice, species, coord))
+    with open(os.path.join(qe_dir, 'pwscf.out'), 'w') as f:
+        f.write('\n     Program PWSCF v.7.2 starts on  18Oct2026 at 12: 0: 0\n\n')
+        f.write(f'     number of atoms/cell      = {len(species):12d}\n\n')
+        for istep in range(1, nstep + 1):
+            lattice = lattice + rng.normal(0.0, 1e-4, size=(3, 3))
+            coord = (coord + rng.normal(0.0, 1e-4, size=coord.shape)) % 1.0
+            f.write(pwscf_step_text(rng, istep, lattice, species, coord))
+        f.write('\n     End final coordinates\n\n     JOB DONE.\n')
+
+
+def gen_qe_work(rng, work_dir, nwork, nstep=20):
+    for cid in range(nwork):
+        gen_pwscf(rng, os.path.join(work_dir, str(cid)), nstep, system=list(SYSTEMS)[cid % len(SYSTEMS)])
+
+
+def generate(datadir, params):
+    '''
+    generate synthetic data, skipped if datadir/params.json is the same as params
+    '''
+    params_file = os.path.join(datadir, 'params.json')
+    if os.path.isfile(params_file):
+        with open(params_file, 'r') as f:
+            if json.load(f) == params:
+                print(f'Reuse synthetic data in {datadir}')
+                return
+    if os.path.isdir(datadir):
+        shutil.rmtree(datadir)
+    os.makedirs(datadir)
+    rng = np.random.default_rng(params['seed'])
+    # ------ each generator has its own stream, the data do not depend on the order
+    rngs = [np.random.default_rng(seed) for seed in rng.integers(0, 2**32, size=4)]
+    start = time.perf_counter()
+    npos = gen_poscars(rngs[0], os.path.join(datadir, 'init_POSCARS'), params['poscar_mb'])
+    print(f'init_POSCARS: {npos} structures ({time.perf_counter() - start:.1f} s)', flush=True)
+    start = time.perf_counter()
+    gen_pkl_data(rngs[1], os.path.join(datadir, 'pkl_data'), params['nstruc'])
+    print(f'pkl_data: {params["nstruc"]} structures ({time.perf_counter() - start:.1f} s)', flush=True)
+    start = time.perf_counter()
+    gen_pwscf(rngs[2], os.path.join(datadir, 'qe'), params['qe_steps'])
+    size = os.path.getsize(os.path.join(datadir, 'qe', 'pwscf.out')) / 1024**2
+    print(f'qe/pwscf.out: {params["qe_steps"]} steps, {size:.1f} MB ({time.perf_counter() - start:.1f} s)', flush=True)
+    start = time.perf_counter()
+    gen_qe_work(rngs[3], os.path.join(datadir, 'qe_work'), params['nwork'])
+    print(f'qe_work: {params["nwork"]} directories ({time.perf_counter() - start:.1f} s)', flush=True)
+    with open(params_file, 'w') as f:    # written last: incomplete data are not reused
+        json.dump(params, f, indent=2)
+
+
+# ---------- cases
+def get_cases(njobs):
+    '''
+    {name: argv}, argv is run in datadir/run/name, paths are relative to it
+    '''
+    pkl = os.path.join('..', '..', 'pkl_data')
+    qe = os.path.join('..', '..', 'qe')
+    script = lambda name: [sys.executable, os.path.join(SCRIPT_DIR, name)]
+    cases = {
+        'import_pymatgen': [sys.executable, '-c', 'import pymatgen.core, pandas'],
+        'pos2pkl': script('pos2pkl.py') + [os.path.join('..', '..', 'init_POSCARS'), '-p'],
+        'pos2pkl_segment': script('pos2pkl.py') + [os.path.join('..', '..', 'init_POSCARS'), '-p', '--segment'],
+        'extract_struc_top': script('extract_struc.py') + [os.path.join(pkl, 'opt_struc_data.pkl'), '-t', '50'],
+        'extract_struc_top_sym': script('extract_struc.py') + [os.path.join(pkl, 'opt_struc_data.pkl'),
+                                                              '-t', '50', '-s', '--no_cache'],
+        'extract_struc_all': script('extract_struc.py') + [os.path.join(pkl, 'opt_struc_data.pkl'), '-a'],
+        'print_pkl_rslt': script('print_pkl.py') + [os.path.join(pkl, 'rslt_data.pkl')],
+        'print_pkl_struc': script('print_pkl.py') + [os.path.join(pkl, 'opt_struc_data.pkl')],
+        'kpt_check': script('kpt_check.py') + [os.path.join(pkl, 'init_struc_data.pkl'), '100',
+                                               '-s', '50', '200', '400'],
+        'qe2vasp_cif': script('qe2vasp_cif.py') + [os.path.join(qe, 'pwscf.in'), os.path.join(qe, 'pwscf.out')],
+        'qe2vasp_cif_batch': script('qe2vasp_cif.py') + ['--batch', os.path.join('..', '..', 'qe_work', '*')],
+        'laqa_ragged': script('laqa_ragged.py') + [pkl, '--png', 'LAQA_step.png'],
+    }
+    if njobs > 1:
+        cases['pos2pkl_jobs'] = cases['pos2pkl'] + ['-j', str(njobs)]
+        cases['extract_struc_all_jobs'] = cases['extract_struc_all'] + ['-j', str(njobs)]
+        cases['qe2vasp_cif_batch_jobs'] = cases['qe2vasp_cif_batch'] + ['-j', str(njobs)]
+    return cases
+
+
+def run_once(argv, rundir):
+    '''
+    run argv in a clean rundir
+    return dict: wall_s, cpu_s (process and its children), peak_rss_mb, returncode
+    '''
+    if os.path.isdir(rundir):
+        shutil.rmtree(rundir)
+    os.makedirs(rundir)
+    env = dict(os.environ, MPLBACKEND='Agg', PYTHONDONTWRITEBYTECODE='1')
+    with open(os.path.join(rundir, 'bench_stdout'), 'w') as fout, \
+            open(os.path.join(rundir, 'bench_stderr'), 'w') as ferr:
+        start = time.perf_counter()
+        proc = subprocess.Popen(argv, cwd=rundir, stdin=subprocess.DEVNULL, stdout=fout, stderr=ferr, env=env)
+        # ------ wait4: rusage of this child only (ru_maxrss in KB on Linux)
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {'wall_s': wall, 'cpu_s': rusage.ru_utime + rusage.ru_stime,
+            'peak_rss_mb': rusage.ru_maxrss / 1024, 'returncode': proc.returncode,
+            '_children_cpu': children.ru_utime + children.ru_stime}
+
+
+def run_case(name, argv, datadir, repeat):
+    rundir = os.path.join(datadir, 'run', name)
+    walls, cpus, rsss = [], [], []
+    children_cpu = sum(resource.getrusage(resource.RUSAGE_CHILDREN)[:2])
+    for _ in range(repeat):
+        res = run_once(argv, rundir)
+        if res['returncode'] != 0:
+            with open(os.path.join(rundir, 'bench_stderr'), 'r') as f:
+                tail = f.read().splitlines()[-5:]
+            return {'status': 'failed', 'returncode': res['returncode'], 'stderr': tail}
+        walls.append(res['wall_s'])
+        # ------ RUSAGE_CHILDREN includes the worker processes of -j
+        cpus.append(res['_children_cpu'] - children_cpu)
+        children_cpu = res['_children_cpu']
+        rsss.append(res['peak_rss_mb'])
+    return {'status': 'ok', 'repeat': repeat,
+            'wall_s': float(np.median(walls)), 'wall_min_s': min(walls), 'wall_all_s': walls,
+            'cpu_s': float(np.median(cpus)), 'peak_rss_mb': max(rsss)}
+
+
+def metadata(params):
+    meta = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(), 'platform': platform.platform(),
+            'python': platform.python_version(), 'cpu_count': os.cpu_count(), 'params': params}
+    for module in ('numpy', 'pandas', 'pymatgen', 'spglib', 'matplotlib'):
+        try:
+            from importlib.metadata import version
+            meta[module] = version(module)
+        except Exception:
+            meta[module] = None
+    try:
+        meta['git'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                                     capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        meta['git'] = None
+    return meta
+
+
+# ---------- comparison
+def compare(results, baseline, threshold, mem_threshold, min_diff=0.05):
+    '''
+    print the comparison table and return names of the regressed cases
+    '''
+    regressed = []
+    print(f'\n{"case":<24} {"base (s)":>9} {"now (s)":>9} {"ratio":>6} {"base MB":>8} {"now MB":>8}  status')
+    for name, res in results['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None or base['status'] != 'ok' or res['status'] != 'ok':
+            status = 'failed' if res['status'] != 'ok' else 'new'
+            if res['status'] != 'ok':
+                regressed.append(name)
+            print(f'{name:<24} {"":>9} {"":>9} {"":>6} {"":>8} {"":>8}  {status}')
+            continue
+        ratio = res['wall_min_s'] / base['wall_min_s']
+        flags = []
+        if ratio > 1.0 + threshold and res['wall_min_s'] - base['wall_min_s'] > min_diff:
+            flags.append('SLOWER')
+        elif ratio < 1.0 - threshold and base['wall_min_s'] - res['wall_min_s'] > min_diff:
+            flags.append('faster')
+        if res['peak_rss_mb'] > base['peak_rss_mb'] * (1.0 + mem_threshold):
+            flags.append('MEMORY')
+        if 'SLOWER' in flags or 'MEMORY' in flags:
+            regressed.append(name)
+        print(f'{name:<24} {base["wall_min_s"]:9.3f} {res["wall_min_s"]:9.3f} {ratio:6.2f}'
+              f' {base["peak_rss_mb"]:8.1f} {res["peak_rss_mb"]:8.1f}  {" ".join(flags) or "ok"}')
+    if baseline['meta'].get('params') != results['meta'].get('params'):
+        print('Warning! scale parameters are different from the baseline')
+    for key in ('numpy', 'pandas', 'pymatgen', 'spglib', 'python'):
+        if baseline['meta'].get(key) != results['meta'].get(key):
+            print(f'{key}: {baseline["meta"].get(key)} --> {results["meta"].get(key)}')
+    return regressed
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', help='scale preset (default: small)', choices=list(SCALES), default='small')
+    parser.add_argument('--nstruc', help='number of structures in pkl_data', type=int)
+    parser.add_argument('--poscar_mb', help='size of init_POSCARS in MB', type=float)
+    parser.add_argument('--qe_steps', help='number of ionic steps in qe/pwscf.out', type=int)
+    parser.add_argument('--nwork', help='number of directories in qe_work', type=int)
+    parser.add_argument('--seed', help='random seed (default 0)', type=int, default=0)
+    parser.add_argument('--datadir', help='directory for synthetic data (default: bench_data)', default='bench_data')
+    parser.add_argument('--cases', help='cases to run (default: all)', nargs='+')
+    parser.add_argument('--list', help='list cases and exit', action='store_true')
+    parser.add_argument('-r', '--repeat', help='number of runs per case (default 3)', type=int, default=3)
+    parser.add_argument('-j', '--jobs', help='also run the -j cases with this many processes (default 1: no)',
+                        type=int, default=1)
+    parser.add_argument('-o', '--outfile', help='output json (default: bench_results.json)', default='bench_results.json')
+    parser.add_argument('--compare', help='baseline json, exit code 1 if regressions are found')
+    parser.add_argument('--results', help='compare this json with the baseline instead of running')
+    parser.add_argument('--threshold', help='relative slowdown flagged as regression (default 0.2)',
+                        type=float, default=0.2)
+    parser.add_argument('--mem_threshold', help='relative increase of peak RSS flagged as regression (default 0.2)',
+                        type=float, default=0.2)
+    args = parser.parse_args()
+
+    # ---------- compare only
+    if args.results:
+        if not args.compare:
+            parser.error('--results needs --compare')
+        with open(args.results, 'r') as f:
+            results = json.load(f)
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        raise SystemExit(1 if compare(results, baseline, args.threshold, args.mem_threshold) else 0)
+
+    # ---------- parameters
+    params = dict(SCALES[args.scale], seed=args.seed)
+    for key in ('nstruc', 'poscar_mb', 'qe_steps', 'nwork'):
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    cases = get_cases(args.jobs)
+    if args.list:
+        for name, argv in cases.items():
+            print(f'{name:<24} {" ".join(os.path.basename(x) if x.startswith(SCRIPT_DIR) else x for x in argv[1:])}')
+        raise SystemExit()
+    if args.cases:
+        unknown = set(args.cases) - set(cases)
+        if unknown:
+            raise SystemExit(f'Unknown cases: {" ".join(sorted(unknown))}')
+        cases = {name: cases[name] for name in args.cases}
+
+    # ---------- synthetic data
+    #            in another process: ru_maxrss of a child starts from the RSS of this process at fork
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        executor.submit(generate, args.datadir, params).result()
+
+    # ---------- run
+    results = {'meta': metadata(params), 'cases': {}}
+    for name, argv in cases.items():
+        res = run_case(name, argv, args.datadir, args.repeat)
+        results['cases'][name] = res
+        if res['status'] == 'ok':
+            print(f'{name:<24} {res["wall_min_s"]:9.3f} s (median {res["wall_s"]:.3f} s, cpu {res["cpu_s"]:.3f} s)'
+                  f' {res["peak_rss_mb"]:9.1f} MB', flush=True)
+        else:
+            print(f'{name:<24} failed (exit code {res["returncode"]})', flush=True)
+            for line in res['stderr']:
+                print(f'    {line}')
+    with open(args.outfile, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results: {args.outfile}')
+
+    # ---------- compare
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.threshold, args.mem_threshold)
+        if regressed:
+            print(f'\nRegression: {" ".join(regressed)}')
+            raise SystemExit(1)
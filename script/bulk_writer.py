@@ -0,0 +1,337 @@
+#
+# bulk_writer.py
+#
+#   2026/10/18
+#   write many structures into one file instead of one file per ID
+#     - numpy and pymatgen are required (h5py for .h5)
+#     - the format is chosen by the extension of the output file
+#         .cif              multi-block cif, one data block per structure: data_{cid} (data_{rank}_{cid} with rank)
+#         .xyz, .extxyz     extended xyz, Lattice, Properties, pbc, cid (and rank, spg) in the comment line
+#         .npz, .h5         array bundle with the same layout as struc_store.py
+#     - .cif and .xyz are gzip-compressed if the name ends with .gz (or compress=True, .gz is added)
+#       .npz and .h5 are compressed with deflate (gzip) if compress=True
+#     - structures are buffered and written every BUFFER_SIZE bytes or BUFFER_NSTRUC structures,
+#       so memory does not grow with the number of structures
+#
+#   layout of the array bundle (.npz: xxx.npy members, .h5: datasets)
+#     index             int64 (nstruc, 3): [cid, offset, nsite] in the written order (not sorted)
+#     lattice           float64 (nstruc, 3, 3)
+#     species           int16 (nsite_tot,): index into species_table
+#     frac_coords       float64 (nsite_tot, 3)
+#     species_table     str (nspecies,)
+#     rank              int64 (nstruc,), only with rank
+#
+#     d = np.load('all.npz')
+#     row = {cid: i for i, cid in enumerate(d['index'][:, 0])}[7]
+#     _, offset, nsite = d['index'][row]
+#     Structure(d['lattice'][row], d['species_table'][d['species'][offset:offset+nsite]],
+#               d['frac_coords'][offset:offset+nsite])
+#
+#   use in scripts:
+#     from bulk_writer import open_bulk_writer
+#     with open_bulk_writer('all.cif.gz') as writer:
+#         for cid, struc in struc_data.items():
+#             writer.write(cid, struc)
+#
+import gzip
+import os
+import shutil
+import zipfile
+
+import numpy as np
+
+import spg_cache
+
+
+BUFFER_SIZE = 4 * 1024**2    # byte, text formats
+BUFFER_NSTRUC = 4096    # structures, array bundles
+TEXT_FORMATS = ('cif', 'xyz')
+FORMATS = TEXT_FORMATS + ('npz', 'h5')
+_EXT = {'.cif': 'cif', '.xyz': 'xyz', '.extxyz': 'xyz', '.npz': 'npz', '.h5': 'h5', '.hdf5': 'h5'}
+
+
+def get_format(path):
+    '''
+    format from the extension, xxx.cif.gz --> cif
+    '''
+    name = path[:-3] if path.endswith('.gz') else path
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in _EXT:
+        raise ValueError(f'Unknown format: {path} (extension: {", ".join(_EXT)})')
+    fmt = _EXT[ext]
+    if fmt not in TEXT_FORMATS and name != path:
+        raise ValueError(f'{fmt} is compressed with compress=True, not .gz: {path}')
+    return fmt
+
+
+# ---------- records: formatted in the worker processes with -j
+def _sym_struc(struc, symprec):
+    return spg_cache.get_sym_entry(struc, symprec)['sym_struc']
+
+
+def _cif_block(cid, struc, rank, symprec):
+    from pymatgen.io.cif import CifWriter
+
+    if symprec is None:
+        cif = str(CifWriter(struc))
+    elif spg_cache.CACHE_ENABLED:
+        cif = spg_cache.get_sym_entry(struc, symprec, cif=True)['cif']
+    else:
+        cif = str(CifWriter(struc, symprec=symprec, angle_tolerance=spg_cache.ANGLE_TOLERANCE))
+    # ------ unique block name: data_{formula} --> data_{cid}
+    name = f'data_{cid}' if rank is None else f'data_{rank}_{cid}'
+    lines = cif.splitlines()
+    for i, line in enumerate(lines):
+        if line.startswith('data_'):
+            lines[i] = name
+            break
+    return '\n'.join(lines) + '\n\n'
+
+
+def _xyz_block(cid, struc, rank, symprec):
+    info = f'cid={cid}'
+    if rank is not None:
+        info += f' rank={rank}'
+    if symprec is not None:
+        entry = spg_cache.get_sym_entry(struc, symprec)
+        struc = entry['sym_struc']
+        info += f' spg={entry["spg_num"]}'
+    lattice = ' '.join(f'{x:.8f}' for x in struc.lattice.matrix.ravel())
+    lines = [str(struc.num_sites),
+             f'Lattice="{lattice}" Properties=species:S:1:pos:R:3 pbc="T T T" {info}']
+    for site in struc:
+        x, y, z = site.coords
+        lines.append(f'{site.species_string:<3} {x:14.8f} {y:14.8f} {z:14.8f}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_record(fmt, cid, struc, rank=None, symprec=None):
+    '''
+    one structure in the format of the writer
+    text formats: str, array bundles: (cid, rank, lattice, frac_coords, species)
+    symprec: symmetrized structure (cif: symmetrized cif as in spg_cache.write_sym_cif)
+    '''
+    if fmt == 'cif':
+        return _cif_block(cid, struc, rank, symprec)
+    if fmt == 'xyz':
+        return _xyz_block(cid, struc, rank, symprec)
+    if symprec is not None:
+        struc = _sym_struc(struc, symprec)
+    return (cid, rank, struc.lattice.matrix, struc.frac_coords,
+            [site.species_string for site in struc])
+
+
+def format_records(fmt, jobs, symprec=None):
+    '''
+    jobs: [(cid, struc, rank), ...] --> [record, ...]
+    '''
+    return [format_record(fmt, cid, struc, rank, symprec) for cid, struc, rank in jobs]
+
+
+# ---------- writers
+class _BulkWriter:
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.nstruc = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write(self, cid, struc, rank=None, symprec=None):
+        self.write_record(format_record(self.fmt, cid, struc, rank, symprec))
+
+
+class TextWriter(_BulkWriter):
+    def __init__(self, path, fmt, compress=False):
+        super().__init__(path, fmt)
+        if compress and not path.endswith('.gz'):
+            self.path = path = path + '.gz'
+        if path.endswith('.gz'):
+            self._f = gzip.open(path, 'wt', compresslevel=6)
+        else:
+            self._f = open(path, 'w')
+        self._buf = []
+        self._nbuf = 0
+
+    def write_record(self, record):
+        self._buf.append(record)
+        self._nbuf += len(record)
+        self.nstruc += 1
+        if self._nbuf >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buf:
+            self._f.write(''.join(self._buf))
+            self._buf = []
+            self._nbuf = 0
+
+    def close(self):
+        self.flush()
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.path)
+
+
+class _ArrayWriter(_BulkWriter):
+    '''
+    buffer the arrays of BUFFER_NSTRUC structures, _append() writes them
+    '''
+    def __init__(self, path, fmt):
+        super().__init__(path, fmt)
+        self.species_table = []
+        self._species_map = {}
+        self.nsite_tot = 0
+        self.with_rank = None
+        self._clear()
+
+    def _clear(self):
+        self._index, self._lattice, self._species, self._frac, self._rank = [], [], [], [], []
+
+    def write_record(self, record):
+        cid, rank, lattice, frac_coords, species = record
+        if self.with_rank is None:
+            self.with_rank = rank is not None
+        nsite = len(species)
+        self._index.append((cid, self.nsite_tot, nsite))
+        self._lattice.append(lattice)
+        self._frac.append(frac_coords)
+        for sp in species:
+            if sp not in self._species_map:
+                self._species_map[sp] = len(self.species_table)
+                self.species_table.append(sp)
+        self._species.append(np.array([self._species_map[sp] for sp in species], dtype=np.int16))
+        if self.with_rank:
+            self._rank.append(rank)
+        self.nsite_tot += nsite
+        self.nstruc += 1
+        if len(self._index) >= BUFFER_NSTRUC:
+            self.flush()
+
+    def flush(self):
+        if not self._index:
+            return
+        arrays = {
+            'index': np.array(self._index, dtype=np.int64).reshape(-1, 3),
+            'lattice': np.array(self._lattice, dtype=np.float64).reshape(-1, 3, 3),
+            'species': np.concatenate(self._species).astype(np.int16),
+            'frac_coords': np.concatenate(self._frac).astype(np.float64).reshape(-1, 3),
+        }
+        if self.with_rank:
+            arrays['rank'] = np.array(self._rank, dtype=np.int64)
+        self._append(arrays)
+        self._clear()
+
+
+class NpzWriter(_ArrayWriter):
+    '''
+    the arrays are appended to raw spill files next to the output,
+    and copied into the npz members (npy header + data) at close
+    '''
+    _SHAPES = {'index': (3,), 'lattice': (3, 3), 'species': (), 'frac_coords': (3,), 'rank': ()}
+    _DTYPES = {'index': np.int64, 'lattice': np.float64, 'species': np.int16, 'frac_coords': np.float64,
+               'rank': np.int64}
+
+    def __init__(self, path, compress=False):
+        super().__init__(path, 'npz')
+        self.compress = compress
+        self._spill = {}
+        self._nrow = {}
+
+    def _spill_path(self, name):
+        return f'{self.path}.{name}.tmp'
+
+    def _append(self, arrays):
+        for name, arr in arrays.items():
+            if name not in self._spill:
+                self._spill[name] = open(self._spill_path(name), 'wb')
+                self._nrow[name] = 0
+            self._spill[name].write(np.ascontiguousarray(arr).tobytes())
+            self._nrow[name] += len(arr)
+
+    def close(self):
+        self.flush()
+        compression = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        with zipfile.ZipFile(self.path, 'w', compression=compression, allowZip64=True) as zf:
+            for name in self._SHAPES:
+                if name == 'rank' and not self.with_rank:
+                    continue
+                header = {'descr': np.lib.format.dtype_to_descr(np.dtype(self._DTYPES[name])),
+                          'fortran_order': False, 'shape': (self._nrow.get(name, 0),) + self._SHAPES[name]}
+                with zf.open(f'{name}.npy', 'w', force_zip64=True) as f:
+                    np.lib.format.write_array_header_2_0(f, header)
+                    if name in self._spill:
+                        self._spill[name].close()
+                        with open(self._spill_path(name), 'rb') as spill:
+                            shutil.copyfileobj(spill, f, 16 * 1024**2)
+            with zf.open('species_table.npy', 'w') as f:
+                np.lib.format.write_array(f, np.array(self.species_table, dtype=str))
+        self._remove_spill()
+
+    def abort(self):
+        self._remove_spill()
+
+    def _remove_spill(self):
+        for name, f in self._spill.items():
+            f.close()
+            os.remove(self._spill_path(name))
+        self._spill = {}
+
+
+class H5Writer(_ArrayWriter):
+    '''
+    resizable (chunked) datasets, extended at each flush
+    '''
+    def __init__(self, path, compress=False):
+        try:
+            import h5py
+        except ImportError:
+            raise SystemExit('Error! h5py is required for .h5 output')
+
+        super().__init__(path, 'h5')
+        self._h5py = h5py
+        self._f = h5py.File(path, 'w')
+        self._kwargs = {'compression': 'gzip', 'shuffle': True} if compress else {}
+
+    def _append(self, arrays):
+        for name, arr in arrays.items():
+            if name not in self._f:
+                self._f.create_dataset(name, shape=(0,) + arr.shape[1:], maxshape=(None,) + arr.shape[1:],
+                                       dtype=arr.dtype, chunks=True, **self._kwargs)
+            dset = self._f[name]
+            n = dset.shape[0]
+            dset.resize(n + len(arr), axis=0)
+            dset[n:] = arr
+
+    def close(self):
+        self.flush()
+        self._f.create_dataset('species_table', data=self.species_table,
+                               dtype=self._h5py.string_dtype())
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+        os.remove(self.path)
+
+
+def open_bulk_writer(path, compress=False):
+    '''
+    writer of the format from the extension of path (see get_format)
+    writer.write(cid, struc, rank=None, symprec=None), or writer.write_record(format_record(...))
+    '''
+    fmt = get_format(path)
+    if fmt in TEXT_FORMATS:
+        return TextWriter(path, fmt, compress)
+    if fmt == 'npz':
+        return NpzWriter(path, compress)
+    return H5Writer(path, compress)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+#
+# cryspy_driver.py
+#
+#   2026/10/18
+#   event-driven replacement for the repeat_cryspy loop
+#     - run in the CrySPY project directory (where cryspy.in and log_cryspy are)
+#     - watchfiles is optional (pip install watchfiles), polling with adaptive backoff without it
+#     - output: cryspy_driver.csv (per-cycle latency, appended)
+#
+#   same rules as repeat_cryspy:
+#     "Done all structures!", "Reached maxgen_ea", "Reached max_select_bo" --> stop
+#     "EA is ready", "BO is ready", "LAQA is ready" --> cryspy -n twice at once
+#                                                      (selection and submission)
+#   instead of a fixed sleep, cryspy -n is called as soon as
+#     - a work/*/stat_job newly says "done" (a job finished), or
+#     - max_wait seconds passed without any finished job
+#   work/*/stat_job and log_cryspy are watched with watchfiles,
+#   otherwise polled every min_interval, doubled up to max_interval while nothing happens
+#
+#   cryspy_driver.csv
+#     cycle, start, trigger (start, done, timeout), wait_s (idle), run_s (cryspy -n), nrun, last_line
+#
+#   example:
+#     cryspy_driver.py
+#     cryspy_driver.py --min_interval 0.2 --max_wait 600 --no_watch
+#     nohup cryspy_driver.py > log_driver 2>&1 &
+#
+import argparse
+import asyncio
+import csv
+import glob
+import os
+import time
+
+from phase_timer import add_prof_option, phase, start_prof
+
+
+STOP_LINES = ('Done all structures!', 'Reached maxgen_ea', 'Reached max_select_bo')
+READY_LINES = ('EA is ready', 'BO is ready', 'LAQA is ready')
+
+
+def last_line(filename, nbyte=4096):
+    '''last non-empty line of filename, '' if not exist'''
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - nbyte))
+            lines = f.read().decode(errors='replace').splitlines()
+    except FileNotFoundError:
+        return ''
+    for line in reversed(lines):
+        if line.strip():
+            return line.strip()
+    return ''
+
+
+def is_stop(line):
+    return line.startswith(STOP_LINES)
+
+
+def is_ready(line):
+    return line in READY_LINES
+
+
+def done_jobs(workdir):
+    '''{(stat_job path, mtime_ns)} of work/*/stat_job which say done'''
+    done = set()
+    for path in glob.glob(os.path.join(workdir, '*', 'stat_job')):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, 'r') as f:
+                if any(line.strip() == 'done' for line in f):
+                    done.add((path, mtime))
+        except OSError:    # removed while reading
+            continue
+    return done
+
+
+async def run_cmd(cmd):
+    proc = await asyncio.create_subprocess_shell(cmd)
+    returncode = await proc.wait()
+    if returncode != 0:
+        raise SystemExit(f'{cmd} failed (exit code {returncode})')
+
+
+async def _wait_watch(args, seen, deadline):
+    import watchfiles
+
+    def watch_filter(change, path):
+        return os.path.basename(path) in ('stat_job', os.path.basename(args.log))
+
+    os.makedirs(args.workdir, exist_ok=True)
+    paths = [args.workdir] + ([args.log] if os.path.isfile(args.log) else [])
+    stop_event = asyncio.Event()
+    watcher = watchfiles.awatch(*paths, watch_filter=watch_filter,
+                                stop_event=stop_event, debounce=int(args.min_interval*1000))
+    try:
+        while True:
+            if done_jobs(args.workdir) - seen:
+                return 'done'
+            if is_stop(last_line(args.log)):
+                return 'stop'
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return 'timeout'
+            try:
+                await asyncio.wait_for(anext(watcher), timeout=remaining)
+            except asyncio.TimeoutError:
+                return 'timeout'
+    finally:
+        stop_event.set()
+
+
+async def _wait_poll(args, seen, deadline):
+    interval = args.min_interval
+    while True:
+        if done_jobs(args.workdir) - seen:
+            return 'done'
+        if is_stop(last_line(args.log)):
+            return 'stop'
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return 'timeout'
+        await asyncio.sleep(min(interval, remaining))
+        interval = min(2*interval, args.max_interval)
+
+
+async def wait_event(args, seen):
+    '''
+    wait until cryspy -n has something to do
+    seen: done_jobs() just after the last cryspy -n, they are not waited for again
+    return trigger: done, stop, or timeout
+    '''
+    deadline = time.monotonic() + args.max_wait
+    if args.watch:
+        try:
+            return await _wait_watch(args, seen, deadline)
+        except ImportError:
+            print('watchfiles is not installed, polling', flush=True)
+            args.watch = False
+    return await _wait_poll(args, seen, deadline)
+
+
+async def drive(args):
+    csv_new = not os.path.isfile(args.csv)
+    with open(args.csv, 'a', newline='') as fcsv:
+        writer = csv.writer(fcsv)
+        if csv_new:
+            writer.writerow(['cycle', 'start', 'trigger', 'wait_s', 'run_s', 'nrun', 'last_line'])
+        cycle = 0
+        trigger = 'start'
+        wait_s = 0.0
+        tot_wait, tot_run = 0.0, 0.0
+        while True:
+            cycle += 1
+            start = time.time()
+            # ---------- cryspy -n, twice more at once if X is ready
+            t0 = time.monotonic()
+            nrun = 0
+            nnow = 1
+            with phase('run') as ph:
+                while nnow > 0:
+                    await run_cmd(args.cmd)
+                    nrun += 1
+                    nnow -= 1
+                    line = last_line(args.log)
+                    if is_stop(line):
+                        break
+                    if is_ready(line):
+                        nnow = 2    # selection (EA, BO, LAQA) and submission
+                ph.add(nrun)
+            run_s = time.monotonic() - t0
+            tot_wait += wait_s
+            tot_run += run_s
+            writer.writerow([cycle, time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(start)),
+                             trigger, f'{wait_s:.3f}', f'{run_s:.3f}', nrun, line])
+            fcsv.flush()
+            print(f'[driver] cycle {cycle}: {trigger}, wait {wait_s:.2f} s, run {run_s:.2f} s ({nrun}): {line}',
+                  flush=True)
+            if is_stop(line):
+                break
+            # ---------- wait
+            t0 = time.monotonic()
+            with phase('wait'):
+                trigger = await wait_event(args, done_jobs(args.workdir))
+            wait_s = time.monotonic() - t0
+            if trigger == 'stop':
+                line = last_line(args.log)
+                print(f'[driver] stopped by log_cryspy: {line}', flush=True)
+                break
+    print(f'[driver] {cycle} cycles, wait {tot_wait:.1f} s, run {tot_run:.1f} s')
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cmd', help='command for one step (default: "cryspy -n")', default='cryspy -n')
+    parser.add_argument('--min_interval', help='first polling interval and debounce in s (default 0.5)',
+                        type=float, default=0.5)
+    parser.add_argument('--max_interval', help='max polling interval in s (default 60)', type=float, default=60.0)
+    parser.add_argument('--max_wait', help='call cryspy -n anyway after this many s (default 300)',
+                        type=float, default=300.0)
+    parser.add_argument('--no_watch', help='do not use watchfiles, polling only', dest='watch', action='store_false')
+    parser.add_argument('--workdir', help='work directory (default: work)', default='work')
+    parser.add_argument('--log', help='log file of CrySPY (default: log_cryspy)', default='log_cryspy')
+    parser.add_argument('--csv', help='latency log (default: cryspy_driver.csv)', default='cryspy_driver.csv')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- drive
+    try:
+        asyncio.run(drive(args))
+    except KeyboardInterrupt:
+        print('[driver] interrupted')
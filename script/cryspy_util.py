@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+#
+# cryspy_util.py
+#
+#   2026/10/18
+#   single entry point for the scripts, with an optional resident server
+#     - cryspy_util.py COMMAND [args ...] is the same as COMMAND.py [args ...]
+#       only the script of COMMAND is imported (heavy libraries are imported in the
+#       scripts where needed, e.g., print_pkl id_queueing.pkl does not import pymatgen)
+#     - only the standard library is imported here, the client starts fast
+#
+#   resident server
+#     cryspy_util.py serve &                 pymatgen, spglib, pandas, ... are imported once
+#     cryspy_util.py spg_check POSCAR        served if the server is running, otherwise run here
+#     cryspy_util.py stop
+#   each request is run in a process forked from the server (warm imports, no state is shared
+#   between requests) with the cwd, environment, arguments, and stdin/stdout/stderr of the client,
+#   and the exit code is returned to the client
+#   the socket is only accessible by the same user
+#
+#   socket: CRYSPY_UTIL_SOCKET or $XDG_RUNTIME_DIR/cryspy_util.sock (/tmp/cryspy_util_{uid}.sock)
+#   --local: do not use the server
+#   python3 -S cryspy_util.py ...: the client skips site (faster startup),
+#                                  site-packages are enabled if run without the server
+#
+#   example:
+#     cryspy_util.py --list
+#     cryspy_util.py print_pkl pkl_data/id_queueing.pkl
+#     cryspy_util.py serve --idle_exit 3600 &
+#     for d in work/*; do cryspy_util.py spg_check $d/CONTCAR; done
+#     cryspy_util.py status
+#
+import marshal
+import os
+import socket
+import struct
+import sys
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMANDS = {
+    'ase_worker': 'persistent worker pool for ASE relaxations',
+    'batch_relax': 'batched FIRE relaxation with NumPy potentials',
+    'bench_scripts': 'benchmark of the scripts with synthetic data',
+    'cryspy_driver': 'event-driven replacement for repeat_cryspy',
+    'dedup_struc': 'duplicate detection in struc_data',
+    'extract_struc': 'write cif files of struc_data',
+    'fp_dscrpt': 'incremental f-fingerprint descriptors of struc_data',
+    'get_primitive_cell': 'primitive cell in POSCAR format',
+    'hull_tracker': 'incremental convex hull for EA-vc',
+    'kpt_check': 'k-point meshes of structures',
+    'laqa_ragged': 'LAQA statistics and figures',
+    'mindist_check': 'minimum interatomic distance check',
+    'phase_timer': 'aggregate per-phase timing json files',
+    'pkl_io': 'convert pickles (plain, gzip, block-compressed)',
+    'pos2pkl': 'init_POSCARS, POSCAR, cif --> init_struc_data.pkl',
+    'print_pkl': 'print pkl_data',
+    'qe2vasp_cif': 'QE input/output --> POSCAR and cif',
+    'run_db': 'SQLite index of many CrySPY runs',
+    'spg_check': 'space group of a structure or struc_data',
+    'struc2cif': 'symmetrized cif of a structure',
+    'struc_segment': 'segment directory of init_struc_data',
+    'struc_store': 'memory-mapped structure store',
+    'sym_pipeline': 'space group, primitive, conventional, and cif in one pass',
+}
+# ---------- third-party only: the modules in this directory read environment variables
+#            (CRYSPY_PROF, CRYSPY_SPG_CACHE, ...) at import, they are imported in each request
+PRELOAD = ['numpy', 'pandas', 'spglib', 'pymatgen.core', 'pymatgen.io.cif', 'pymatgen.io.vasp',
+           'pymatgen.symmetry.analyzer', 'pymatgen.analysis.structure_matcher']
+
+
+def socket_path():
+    if os.environ.get('CRYSPY_UTIL_SOCKET'):
+        return os.environ['CRYSPY_UTIL_SOCKET']
+    if os.environ.get('XDG_RUNTIME_DIR'):
+        return os.path.join(os.environ['XDG_RUNTIME_DIR'], 'cryspy_util.sock')
+    return f'/tmp/cryspy_util_{os.getuid()}.sock'
+
+
+# ---------- messages: length (uint32) + marshal (builtin, json would import re at client startup)
+#            only dict, list, str, int, and float are sent between processes of the same user
+def send_msg(sock, obj, fds=None):
+    data = marshal.dumps(obj)
+    data = struct.pack('<I', len(data)) + data
+    if fds:
+        socket.send_fds(sock, [data], fds)
+    else:
+        sock.sendall(data)
+
+
+def _recv_exact(sock, nbyte):
+    buf = b''
+    while len(buf) < nbyte:
+        chunk = sock.recv(nbyte - len(buf))
+        if not chunk:
+            raise ConnectionError('connection closed')
+        buf += chunk
+    return buf
+
+
+def recv_msg(sock, maxfds=0):
+    '''
+    return (obj, fds)
+    '''
+    fds = []
+    try:
+        if maxfds:
+            head, fds, _, _ = socket.recv_fds(sock, 4, maxfds)
+            if not head:
+                raise ConnectionError('connection closed')
+            head += _recv_exact(sock, 4 - len(head))
+        else:
+            head = _recv_exact(sock, 4)
+        (nbyte,) = struct.unpack('<I', head)
+        obj = marshal.loads(_recv_exact(sock, nbyte))
+        if not isinstance(obj, dict):
+            raise ValueError('bad message')
+    except BaseException:
+        for fd in fds:    # e.g. stdout of the client, the client waits for EOF of its pipe
+            os.close(fd)
+        raise
+    return obj, fds
+
+
+# ---------- run a command in this process
+def run_command(name, args):
+    '''
+    run script/name.py with args as __main__, return the exit code
+    '''
+    import runpy
+
+    if name not in COMMANDS:
+        print(f'Unknown command: {name} (cryspy_util.py --list)', file=sys.stderr)
+        return 2
+    if sys.flags.no_site:    # python3 -S cryspy_util.py: site-packages are needed from here
+        import site
+        site.main()
+    path = os.path.join(SCRIPT_DIR, f'{name}.py')
+    sys.argv = [path] + list(args)
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+# ---------- client
+def connect(path):
+    '''
+    connected socket, or None if the server is not running
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:    # no socket file, or no server behind it
+        sock.close()
+        return None
+    return sock
+
+
+def request(sock, name, args):
+    '''
+    run the command in the server with stdin/stdout/stderr of this process
+    return the exit code
+    '''
+    sys.stdout.flush()
+    sys.stderr.flush()
+    send_msg(sock, {'cmd': 'run', 'name': name, 'args': args, 'cwd': os.getcwd(), 'env': dict(os.environ)},
+             fds=[0, 1, 2])
+    pid = None
+    while True:
+        try:
+            reply, _ = recv_msg(sock)
+        except ConnectionError:
+            print('cryspy_util: the server closed the connection', file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:    # Ctrl-C --> the process running the command
+            if pid is not None:
+                os.kill(pid, 2)    # SIGINT, the signal module is not imported for startup time
+            continue
+        if 'code' in reply:
+            return reply['code']
+        pid = reply['pid']
+
+
+# ---------- server
+def _child(conn, msg, fds):
+    '''
+    forked process for one request, never returns
+    '''
+    import atexit
+    import signal
+
+    code = 1
+    try:
+        send_msg(conn, {'pid': os.getpid()})    # for Ctrl-C of the client
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)    # the scripts wait for their own children
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        for fd, target in zip(fds, (0, 1, 2)):
+            os.dup2(fd, target)
+            os.close(fd)
+        os.chdir(msg['cwd'])
+        os.environ.clear()
+        os.environ.update(msg['env'])
+        code = run_command(msg['name'], msg['args'])
+    except BaseException:
+        import traceback
+
+        traceback.print_exc()
+    finally:
+        try:
+            atexit._run_exitfuncs()    # e.g. phase_timer output, os._exit skips them
+            sys.stdout.flush()
+            sys.stderr.flush()
+            send_msg(conn, {'code': code})
+        finally:
+            os._exit(code if isinstance(code, int) and 0 <= code < 256 else 1)
+
+
+def _peer_uid(conn):
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+def serve(path, preload, idle_exit=None):
+    import importlib
+    import signal
+    import time
+
+    # ---------- already running or stale socket file
+    sock = connect(path)
+    if sock is not None:
+        sock.close()
+        raise SystemExit(f'Server is already running: {path}')
+    if os.path.exists(path):
+        os.remove(path)
+
+    # ---------- warm up
+    start = time.perf_counter()
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f'cryspy_util: skip {module} ({e})', file=sys.stderr)
+    print(f'cryspy_util: preloaded {len(preload)} modules in {time.perf_counter() - start:.2f} s', flush=True)
+
+    # ---------- listen, only the same user can connect
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)    # children are reaped automatically
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    old_umask = os.umask(0o177)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    os.umask(old_umask)
+    server.listen(64)
+    server.settimeout(idle_exit)
+    print(f'cryspy_util: listening on {path} (pid {os.getpid()})', flush=True)
+    nserved = 0
+    t_start = time.time()
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                print(f'cryspy_util: idle for {idle_exit} s, exit', flush=True)
+                break
+            with conn:
+                if _peer_uid(conn) != os.getuid():
+                    continue
+                try:
+                    msg, fds = recv_msg(conn, maxfds=3)
+                except (ConnectionError, ValueError, EOFError, TypeError):
+                    continue
+                try:
+                    if msg.get('cmd') == 'stop':
+                        send_msg(conn, {'code': 0})
+                        break
+                    if msg.get('cmd') == 'status':
+                        send_msg(conn, {'code': 0, 'pid': os.getpid(), 'nserved': nserved,
+                                        'uptime_s': time.time() - t_start, 'modules': len(sys.modules)})
+                    elif msg.get('cmd') == 'run' and len(fds) == 3:
+                        if os.fork() == 0:
+                            server.close()
+                            _child(conn, msg, fds)
+                        nserved += 1
+                except OSError:    # the client has gone
+                    pass
+                finally:
+                    for fd in fds:    # the child has its own copies
+                        os.close(fd)
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+    print(f'cryspy_util: served {nserved} requests', flush=True)
+
+
+def usage():
+    print('usage: cryspy_util.py [--local] COMMAND [args ...]\n'
+          '       cryspy_util.py serve [--socket PATH] [--preload MODULE ...] [--idle_exit SEC]\n'
+          '       cryspy_util.py stop | status | --list\n\n'
+          'COMMAND: ' + ' '.join(COMMANDS))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        usage()
+        return 0
+    if argv[0] == '--list':
+        for name, desc in COMMANDS.items():
+            print(f'{name:<20} {desc}')
+        return 0
+
+    # ---------- server commands
+    if argv[0] in ('serve', 'stop', 'status'):
+        import argparse
+
+        parser = argparse.ArgumentParser(prog=f'cryspy_util.py {argv[0]}')
+        parser.add_argument('--socket', help='socket path (default: CRYSPY_UTIL_SOCKET or per-user path)',
+                            default=socket_path())
+        if argv[0] == 'serve':
+            parser.add_argument('--preload', help='modules imported at start (default: pymatgen, pandas, ...)',
+                                nargs='+', default=PRELOAD)
+            parser.add_argument('--idle_exit', help='exit after idle for this many s (default: never)', type=float)
+        args = parser.parse_args(argv[1:])
+        if argv[0] == 'serve':
+            serve(args.socket, args.preload, args.idle_exit)
+            return 0
+        sock = connect(args.socket)
+        if sock is None:
+            print(f'Server is not running: {args.socket}')
+            return 1
+        with sock:
+            send_msg(sock, {'cmd': argv[0]})
+            reply, _ = recv_msg(sock)
+        if argv[0] == 'status':
+            print(f'pid {reply["pid"]}, served {reply["nserved"]} requests, up {reply["uptime_s"]:.0f} s,'
+                  f' {reply["modules"]} modules loaded')
+        return 0
+
+    # ---------- command: server if running, otherwise here
+    local = argv[0] == '--local'
+    if local:
+        argv = argv[1:]
+    name, args = argv[0].removesuffix('.py'), argv[1:]
+    if name not in COMMANDS:
+        print(f'Unknown command: {name} (cryspy_util.py --list)', file=sys.stderr)
+        return 2
+    sock = None if local else connect(socket_path())
+    if sock is None:
+        return run_command(name, args)
+    with sock:
+        return request(sock, name, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
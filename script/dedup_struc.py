@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+#
+# dedup_struc.py
+#
+#   2026/10/18
+#   find duplicate structures in opt_struc_data.pkl
+#     - numpy and pymatgen are required
+#     - input: opt_struc_data.pkl (.gz, .store), rslt_data.pkl in the same directory
+#     - output: dedup_groups.txt, unique_ids.txt, dedup_index.pkl
+#
+#   1. bucket: reduced formula and space group (Spg_num_opt in rslt_data)
+#   2. window: energy (E_eV_atom) and volume per atom in each bucket
+#   3. fingerprint: smeared pair distance histogram for each species pair,
+#                   distances are scaled by (V/N)^(1/3)
+#        cosine distance <= fp_tight           --> duplicate
+#        fp_tight < cosine distance <= fp_loose --> StructureMatcher
+#   buckets are processed across a process pool
+#
+#   dedup_index.pkl keeps the fingerprints and groups,
+#   only new IDs are compared with the representatives on rerun
+#
+#   example:
+#     dedup_struc.py opt_struc_data.pkl -j 8
+#     extract_struc.py opt_struc_data.pkl -i $(cat unique_ids.txt)
+#
+import argparse
+import bisect
+from concurrent.futures import ProcessPoolExecutor
+import os
+import pickle
+
+import numpy as np
+
+from periodic_nbr import pair_distances
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+from struc_store import open_struc_data
+
+
+def fingerprint(struc, rcut=3.0, nbin=60, sigma=0.05):
+    '''
+    smeared pair distance histogram concatenated over species pairs
+    distances are in units of (V/N)^(1/3), normalized to unit length
+    '''
+    scale = (struc.volume / len(struc))**(1/3)
+    species = [site.species_string for site in struc]
+    types = sorted(set(species))
+    tidx = np.array([types.index(sp) for sp in species])
+    ntype = len(types)
+    i, j, dist = pair_distances(struc.lattice.matrix, struc.frac_coords, rcut*scale)
+    # ------ pair type index for (ta <= tb)
+    ta = np.minimum(tidx[i], tidx[j])
+    tb = np.maximum(tidx[i], tidx[j])
+    ptype = ta*ntype - ta*(ta - 1)//2 + (tb - ta)
+    grid = np.linspace(0.0, rcut, nbin)
+    gauss = np.exp(-(grid[None, :] - dist[:, None]/scale)**2 / (2*sigma**2))
+    fp = np.zeros((ntype*(ntype + 1)//2, nbin))
+    np.add.at(fp, ptype, gauss)
+    fp = fp.ravel()
+    norm = np.linalg.norm(fp)
+    return fp / norm if norm > 0 else fp
+
+
+def compare_bucket(new_items, ref_items, params):
+    '''
+    items: [(cid, struc, energy, vpa, fp), ...], fp is None if not computed
+    return fingerprints of new items and duplicate pairs [(cid_a, cid_b), ...]
+    '''
+    from pymatgen.analysis.structure_matcher import StructureMatcher
+
+    matcher = None
+    new_fps = {}
+    items = []
+    for cid, struc, energy, vpa, fp in ref_items:
+        items.append((energy, cid, struc, vpa, fp, False))
+    for cid, struc, energy, vpa, fp in new_items:
+        if fp is None:
+            fp = fingerprint(struc, params['rcut'], params['nbin'], params['sigma'])
+        new_fps[cid] = fp
+        items.append((energy, cid, struc, vpa, fp, True))
+    items.sort(key=lambda x: (x[0], x[1]))
+    energies = [x[0] for x in items]
+
+    # ---------- candidates in the energy window
+    pairs = []
+    for k, (energy, cid, struc, vpa, fp, is_new) in enumerate(items):
+        if not is_new:
+            continue
+        kmin = bisect.bisect_left(energies, energy - params['etol'])
+        kmax = bisect.bisect_right(energies, energy + params['etol'])
+        for m in range(kmin, kmax):
+            e2, cid2, struc2, vpa2, fp2, is_new2 = items[m]
+            if m == k or (is_new2 and m < k):    # new-new pairs only once
+                continue
+            if abs(vpa2 - vpa) > params['vtol'] * max(vpa, vpa2):
+                continue
+            dist = 1.0 - float(np.dot(fp, fp2))
+            if dist <= params['fp_tight']:
+                pairs.append((cid, cid2))
+            elif dist <= params['fp_loose']:
+                if matcher is None:
+                    matcher = StructureMatcher()
+                if matcher.fit(struc, struc2):
+                    pairs.append((cid, cid2))
+    return new_fps, pairs
+
+
+def find_root(rep, cid):
+    while rep[cid] != cid:
+        rep[cid] = rep[rep[cid]]
+        cid = rep[cid]
+    return cid
+
+
+def load_index(filename, params):
+    if os.path.isfile(filename):
+        with open(filename, 'rb') as f:
+            index = pickle.load(f)
+        if index['params'] == params:
+            return index
+        print('Parameters changed, dedup_index is rebuilt')
+    return {'params': params, 'entries': {}, 'rep': {}}
+
+
+def dedup(struc_data, rslt_data, index, njobs=1):
+    '''
+    update index with IDs not in index['entries']
+    '''
+    params = index['params']
+    entries = index['entries']
+    rep = index['rep']
+
+    # ---------- new entries
+    new_buckets = {}
+    for cid, struc in struc_data.items():
+        if cid in entries or struc is None:
+            continue
+        energy, spg = 0.0, 0
+        if rslt_data is not None:
+            if cid not in rslt_data.index:
+                continue
+            energy = rslt_data.at[cid, 'E_eV_atom']
+            if energy is None or np.isnan(energy):
+                continue
+            if 'Spg_num_opt' in rslt_data.columns:
+                spg = int(rslt_data.at[cid, 'Spg_num_opt'])
+        key = (struc.composition.reduced_formula, spg)
+        vpa = struc.volume / len(struc)
+        new_buckets.setdefault(key, []).append((cid, struc, float(energy), vpa, None))
+    if not new_buckets:
+        return 0
+
+    # ---------- references: representatives in the same buckets
+    ref_buckets = {key: [] for key in new_buckets}
+    for cid, entry in entries.items():
+        if rep[cid] == cid and entry['key'] in ref_buckets:
+            ref_buckets[entry['key']].append((cid, struc_data[cid], entry['energy'], entry['vpa'], entry['fp']))
+
+    # ---------- compare
+    keys = list(new_buckets)
+    args = [(new_buckets[key], ref_buckets[key], params) for key in keys]
+    if njobs == 1:
+        results = [compare_bucket(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers=njobs) as executor:
+            results = list(executor.map(compare_bucket, *zip(*args)))
+
+    # ---------- update index and groups (union-find)
+    nnew = 0
+    for key, (new_fps, pairs) in zip(keys, results):
+        for cid, struc, energy, vpa, _ in new_buckets[key]:
+            entries[cid] = {'key': key, 'energy': energy, 'vpa': vpa, 'fp': new_fps[cid]}
+            rep[cid] = cid
+            nnew += 1
+        for a, b in pairs:
+            ra, rb = find_root(rep, a), find_root(rep, b)
+            if ra != rb:
+                # ------ the lowest energy structure is the representative
+                if (entries[ra]['energy'], ra) < (entries[rb]['energy'], rb):
+                    rep[rb] = ra
+                else:
+                    rep[ra] = rb
+    for cid in rep:
+        rep[cid] = find_root(rep, cid)
+    return nnew
+
+
+def out_groups(index, outdir):
+    groups = {}
+    for cid, root in index['rep'].items():
+        groups.setdefault(root, []).append(cid)
+    with open(os.path.join(outdir, 'dedup_groups.txt'), 'w') as f:
+        f.write('# representative: duplicates\n')
+        for root in sorted(groups):
+            members = sorted(cid for cid in groups[root] if cid != root)
+            if members:
+                f.write(f'{root}: {" ".join(str(cid) for cid in members)}\n')
+    with open(os.path.join(outdir, 'unique_ids.txt'), 'w') as f:
+        f.write(' '.join(str(cid) for cid in sorted(groups)) + '\n')
+    return groups
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='input file: opt_struc_data.pkl (.gz, .store)')
+    parser.add_argument('-j', '--jobs', help='number of processes (default 1)', type=int, default=1)
+    parser.add_argument('-o', '--outdir', help='output directory (default: current directory)', default='.')
+    parser.add_argument('--etol', help='energy window in eV/atom (default 0.002)', type=float, default=0.002)
+    parser.add_argument('--vtol', help='relative volume window (default 0.05)', type=float, default=0.05)
+    parser.add_argument('--fp_tight', help='fingerprint distance regarded as duplicate (default 0.002)', type=float, default=0.002)
+    parser.add_argument('--fp_loose', help='fingerprint distance checked by StructureMatcher (default 0.05)', type=float, default=0.05)
+    parser.add_argument('--no_rslt', help='do not use rslt_data.pkl (no energy and space group bucketing)', action='store_true')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- load
+    with phase('load'):
+        struc_data = open_struc_data(args.infile)
+        rslt_data = None
+        if not args.no_rslt:
+            # ------ rslt_data.pkl must be in the same directory as the input
+            rslt_path = os.path.dirname(os.path.abspath(args.infile)) + '/rslt_data.pkl'
+            rslt_data = load_data(rslt_path)
+
+    # ---------- dedup
+    params = {'etol': args.etol, 'vtol': args.vtol, 'fp_tight': args.fp_tight, 'fp_loose': args.fp_loose,
+              'rcut': 3.0, 'nbin': 60, 'sigma': 0.05, 'rslt': not args.no_rslt}
+    index_path = os.path.join(args.outdir, 'dedup_index.pkl')
+    with phase('load'):
+        index = load_index(index_path, params)
+    with phase('dedup') as ph:
+        nnew = dedup(struc_data, rslt_data, index, args.jobs)
+        ph.add(nnew)
+    with phase('write'):
+        with open(index_path, 'wb') as f:
+            pickle.dump(index, f)
+
+        # ---------- output
+        groups = out_groups(index, args.outdir)
+    print(f'New structures: {nnew}')
+    print(f'Structures in index: {len(index["entries"])}')
+    print(f'Unique structures: {len(groups)}')
+    print('Save dedup_groups.txt, unique_ids.txt, dedup_index.pkl')
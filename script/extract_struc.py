@@ -2,6 +2,14 @@
 #
 # extract_struc.py
 #
+#   2026/10/18
+#   --outfile option: write all the selected structures into one file (multi-block cif, extended xyz, npz, hdf5)
+#   --jobs option: write cif files in parallel
+#   symmetrized cif is cached in spg_cache (--no_cache to disable)
+#   read xxx_struc_data.store (see struc_store.py) as well as pickle
+#   query options: --ewin, --spg, --gen, --nat with rslt_index.npz (see rslt_index.py)
+#   top k by partial selection
+#
 #   2024/04/16 T. Yamashita
 #   --tolerance option
 #   gzip file
@@ -23,11 +31,135 @@
 #   pymatgen is required
 #
 import argparse
-import gzip
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import os
-import pickle
+import time
+
+from phase_timer import add_prof_option, phase, start_prof
+from rslt_index import load_rslt_index, query
+from bulk_writer import format_records, get_format, open_bulk_writer
+import spg_cache
+from struc_store import is_store, open_struc_data
+
+
+# ---------- worker process state
+_struc_data = None
+
+
+def init_worker(store, cache_enabled):
+    '''
+    store: open the store once in each worker process,
+    only the structures of the worker's chunks are read (memory-mapped)
+    '''
+    global _struc_data
+    spg_cache.CACHE_ENABLED = cache_enabled
+    if store is not None:
+        _struc_data = open_struc_data(store)
+
+
+def write_cifs(cif_jobs, symprec=None):
+    '''
+    write cif files in a worker process
+    cif_jobs: [(cifname, cid), ...] with a store (see init_worker), [(cifname, struc), ...] otherwise
+    '''
+    nwrite = 0
+    for cifname, struc in cif_jobs:
+        if _struc_data is not None:
+            struc = _struc_data[struc]
+        if struc is None:    # e.g., failed optimization
+            continue
+        if symprec is None:
+            struc.to(fmt='cif', filename=cifname)
+        else:
+            spg_cache.write_sym_cif(struc, cifname, symprec=symprec)
+        nwrite += 1
+    return nwrite
+
+
+def write_cifs_parallel(infile, struc_data, cif_jobs, symprec, njobs):
+    '''
+    split cif_jobs [(cifname, cid), ...] into chunks and write them across a process pool
+    store: only IDs are sent, each worker opens the store itself
+    pickle: the structures are sent in the chunks (the pickle is not reloaded in each worker)
+    '''
+    start = time.perf_counter()
+    store = infile if is_store(infile) else None
+    chunk = max(1, min(256, -(-len(cif_jobs) // (4*njobs))))    # ceil, 4 chunks per process
+    nwrite = 0
+    with phase('write') as ph, ProcessPoolExecutor(max_workers=njobs, initializer=init_worker,
+                                                   initargs=(store, spg_cache.CACHE_ENABLED)) as executor:
+        # ------ at most 2 chunks per process in flight
+        running = deque()
+        for i in range(0, len(cif_jobs), chunk):
+            jobs = cif_jobs[i:i+chunk]
+            if store is None:
+                jobs = [(cifname, struc_data[cid]) for cifname, cid in jobs]
+            running.append(executor.submit(write_cifs, jobs, symprec))
+            if len(running) >= 2*njobs:
+                nwrite += running.popleft().result()
+        while running:
+            nwrite += running.popleft().result()
+        ph.add(nwrite)
+    elapsed = time.perf_counter() - start
+    print(f'Wrote {nwrite} cif files in {elapsed:.2f} s'
+          f' ({nwrite/elapsed:.1f} files/s, {njobs} processes)')
+
+
+def write_bulk(struc_data, selected, outfile, symprec=None, compress=False, njobs=1):
+    '''
+    write the selected structures into one file, selected: iterable of (cid, rank or None)
+    structures are fetched (from the store) and written chunk by chunk,
+    with njobs > 1, chunks are formatted across a process pool and written in order
+    '''
+    start = time.perf_counter()
+    nskip = 0
+
+    def chunks(size):
+        nonlocal nskip
+        it = iter(selected)
+        while True:
+            jobs = []
+            ncid = 0
+            for cid, rank in islice(it, size):
+                ncid += 1
+                struc = struc_data[cid]
+                if struc is None:    # e.g., failed optimization
+                    nskip += 1
+                    continue
+                jobs.append((cid, struc, rank))
+            if ncid == 0:    # selected is exhausted
+                return
+            if jobs:
+                yield jobs
+
+    with phase('write') as ph, open_bulk_writer(outfile, compress) as writer:
+        if njobs > 1:
+            # ------ at most 2 chunks per process in flight
+            with ProcessPoolExecutor(max_workers=njobs) as executor:
+                running = deque()
+                for jobs in chunks(64):
+                    running.append(executor.submit(format_records, writer.fmt, jobs, symprec))
+                    if len(running) >= 2*njobs:
+                        for record in running.popleft().result():
+                            writer.write_record(record)
+                            ph.add()
+                while running:
+                    for record in running.popleft().result():
+                        writer.write_record(record)
+                        ph.add()
+        else:
+            for jobs in chunks(64):
+                for cid, struc, rank in jobs:
+                    writer.write(cid, struc, rank, symprec)
+                    ph.add()
+    elapsed = time.perf_counter() - start
+    print(f'Wrote {writer.nstruc} structures to {writer.path} in {elapsed:.2f} s'
+          f' ({writer.nstruc/elapsed:.1f} structures/s, {njobs} processes)')
+    if nskip:
+        print(f'Skipped {nskip} structures (None)')
 
-import pandas as pd
 
 if __name__ == '__main__':
     '''
@@ -51,10 +183,34 @@ if __name__ == '__main__':
     - write cif of top k structures (k = 3) with the rank in the filename and symmetry information
       extract_struc.py opt_struc_data.pkl -t 3 -rs
 
+    query needs rslt_data.pkl (and nat_data.pkl for --nat)
+    filters can be combined with each other and with -t
+    - write cif of structures within 0.05 eV/atom from the lowest energy
+      extract_struc.py opt_struc_data.pkl --ewin 0.05
+    - write cif of top 5 structures in space group 225 or 194 found in generation 3-10
+      extract_struc.py opt_struc_data.pkl -t 5 --spg 225 194 --gen 3 10
+    - print structures with nat = (4, 8) in EA-vc
+      extract_struc.py opt_struc_data.pkl --nat 4 8 -p
+
     - write all (output 0.cif, 1.cif, 2.cif ....)
       extract_struc.py opt_struc_data.pkl -a
     - write all (output 0.cif, 1.cif, 2.cif ....) with symmetry information
       extract_struc.py opt_struc_data.pkl -as
+    - write all with symmetry information using 8 processes
+      extract_struc.py opt_struc_data.pkl -as -j 8
+
+    store directory made by struc_store.py is also OK instead of pickle
+    only the requested structures are read from the store
+    - write cifs of ID 7 10 12
+      extract_struc.py opt_struc_data.store -i 7 10 12
+
+    one output file instead of {cid}.cif (format from the extension, see bulk_writer.py)
+    - write all into one multi-block cif (data_0, data_1, ...)
+      extract_struc.py opt_struc_data.pkl -a -o all.cif
+    - write top 100 with symmetry information into gzipped extended xyz (rank=1, 2, ... with -r)
+      extract_struc.py opt_struc_data.pkl -t 100 -rs -o top.xyz.gz
+    - write all into a compressed npz array bundle using 8 processes
+      extract_struc.py opt_struc_data.store -a -o all.npz -z -j 8
     '''
     # ---------- argparse
     parser = argparse.ArgumentParser()
@@ -67,6 +223,11 @@ if __name__ == '__main__':
     parser.add_argument('-t', '--top',
                         help='top k structures, e.g. (k = 3), extract_struc.py opt_struc_data.pkl -t 3 -s',
                         type=int, nargs=1)
+    parser.add_argument('--ewin', help='energy window from the lowest energy in eV/atom, e.g., --ewin 0.05',
+                        type=float)
+    parser.add_argument('--spg', help='space group numbers (Spg_num_opt), e.g., --spg 225 194', type=int, nargs='+')
+    parser.add_argument('--gen', help='range of generation in EA (inclusive), e.g., --gen 3 10', type=int, nargs=2)
+    parser.add_argument('--nat', help='number of atoms for each atom type in EA-vc, e.g., --nat 4 8', type=int, nargs='+')
     parser.add_argument('-r', '--rank',
                         help='add rank in file names, e.g., extract_struc.py opt_struc_data.pkl -t 3 -rs', action='store_true')
     parser.add_argument('-s', '--symmetrized',
@@ -75,59 +236,107 @@ if __name__ == '__main__':
     parser.add_argument('--tolerance',
                         help='tolerance for symmetrization (default 0.01), e.g., extract_struc.py opt_struc_data.pkl -i 0 1 -s --tolerance 0.01',
                         type=float, default=0.01)
-    parser.add_argument('infile', help='input file')
+    parser.add_argument('--no_cache', help='do not use the symmetry cache for -s', action='store_true')
+    parser.add_argument('-j', '--jobs',
+                        help='number of processes for writing cif files with --top or --all_id (default 1), e.g., extract_struc.py opt_struc_data.pkl -as -j 8',
+                        type=int, default=1)
+    parser.add_argument('-o', '--outfile',
+                        help='write all the selected structures into this file instead of {cid}.cif:'
+                             ' .cif, .xyz, .extxyz, .npz, .h5 (.gz for .cif and .xyz),'
+                             ' e.g., extract_struc.py opt_struc_data.pkl -a -o all.cif.gz')
+    parser.add_argument('-z', '--compress', help='compress the output file of --outfile', action='store_true')
+    parser.add_argument('infile', help='input file: pickle (.pkl, .pkl.gz) or store directory')
+    add_prof_option(parser)
     args = parser.parse_args()
+    if args.outfile is not None:
+        # ------ before loading struc_data
+        try:
+            get_format(args.outfile)
+        except ValueError as e:
+            parser.error(str(e))
+    start_prof(args.prof)
+    if args.no_cache:
+        spg_cache.CACHE_ENABLED = False
+    symprec = args.tolerance if args.symmetrized else None
+    bulk = args.outfile is not None and not args.print
 
     # ---------- load struc_data
-    if args.infile.endswith('.gz'):
-        with gzip.open(args.infile, 'rb') as f:
-            struc_data = pickle.load(f)
-    else:
-        with open(args.infile, 'rb') as f:
-            struc_data = pickle.load(f)
+    #            store: arrays are memory-mapped, structures are built on demand
+    with phase('load'):
+        struc_data = open_struc_data(args.infile)
 
     # ---------- index
+    if args.index and bulk:
+        write_bulk(struc_data, ((cid, None) for cid in args.index), args.outfile, symprec,
+                   args.compress, args.jobs)
+        raise SystemExit()
     if args.index:   # not vacant
-        for cid in args.index:
-            if args.print:
-                print(f'\nID {cid}')
-                print(struc_data[cid])
-            elif args.symmetrized:
-                struc_data[cid].to(fmt='cif', filename=f'{cid}.cif', symprec=args.tolerance)
-            else:
-                struc_data[cid].to(fmt='cif', filename=f'{cid}.cif')
+        with phase('write') as ph:
+            for cid in args.index:
+                if args.print:
+                    print(f'\nID {cid}')
+                    print(struc_data[cid])
+                elif args.symmetrized:
+                    spg_cache.write_sym_cif(struc_data[cid], f'{cid}.cif', symprec=args.tolerance)
+                else:
+                    struc_data[cid].to(fmt='cif', filename=f'{cid}.cif')
+                ph.add()
         raise SystemExit()
 
-    # ---------- top k
-    if args.top:   # not vacant
-        # ------ load rslt_data.pkl. It must be in the same directory as the input
-        rslt_path = os.path.dirname(os.path.abspath(args.infile)) + '/rslt_data.pkl'
-        rslt_data = pd.read_pickle(rslt_path)
-        # ------ top k data
-        top_k = rslt_data.sort_values(by=['E_eV_atom'], ascending=True).head(args.top[0])
-        for k, cid in enumerate(top_k.index):
-            if args.print:
-                print(f'\nID {cid}')
-                print(struc_data[cid])
+    # ---------- top k and query
+    if args.top or args.ewin is not None or args.spg or args.gen or args.nat:
+        # ------ rslt_index of rslt_data.pkl. It must be in the same directory as the input
+        with phase('select'):
+            rslt_index = load_rslt_index(os.path.dirname(os.path.abspath(args.infile)))
+            # ------ top k data
+            top_ids = query(rslt_index, k=args.top[0] if args.top else None, ewin=args.ewin,
+                            spg=args.spg, gen=args.gen, nat=args.nat)
+        if bulk:
+            write_bulk(struc_data, ((cid, k+1 if args.rank else None) for k, cid in enumerate(top_ids)),
+                       args.outfile, symprec, args.compress, args.jobs)
+            raise SystemExit()
+        if args.jobs > 1 and not args.print:
+            if args.rank:
+                cif_jobs = [(f'{k+1}_{cid}.cif', cid) for k, cid in enumerate(top_ids)]
             else:
-                if args.rank:
-                    cifname = f'{k+1}_{cid}.cif'
+                cif_jobs = [(f'{cid}.cif', cid) for cid in top_ids]
+            write_cifs_parallel(args.infile, struc_data, cif_jobs, args.tolerance if args.symmetrized else None, args.jobs)
+            raise SystemExit()
+        with phase('write') as ph:
+            for k, cid in enumerate(top_ids):
+                if args.print:
+                    print(f'\nID {cid}')
+                    print(struc_data[cid])
                 else:
-                    cifname=f'{cid}.cif'
-                if args.symmetrized:
-                    struc_data[cid].to(fmt='cif', filename=cifname, symprec=args.tolerance)
-                else:
-                    struc_data[cid].to(fmt='cif', filename=cifname)
+                    if args.rank:
+                        cifname = f'{k+1}_{cid}.cif'
+                    else:
+                        cifname=f'{cid}.cif'
+                    if args.symmetrized:
+                        spg_cache.write_sym_cif(struc_data[cid], cifname, symprec=args.tolerance)
+                    else:
+                        struc_data[cid].to(fmt='cif', filename=cifname)
+                ph.add()
         raise SystemExit()
 
     # ---------- all
     if args.all_id:
-        for cid, struc in struc_data.items():
-            if args.print:
-                print(f'\nID {cid}')
-                print(struc_data[cid])
-            elif args.symmetrized:
-                struc.to(fmt='cif', filename=f'{cid}.cif', symprec=args.tolerance)
-            else:
-                struc.to(fmt='cif', filename=f'{cid}.cif')
+        if bulk:
+            write_bulk(struc_data, ((cid, None) for cid in struc_data.keys()), args.outfile, symprec,
+                       args.compress, args.jobs)
+            raise SystemExit()
+        if args.jobs > 1 and not args.print:
+            cif_jobs = [(f'{cid}.cif', cid) for cid in struc_data.keys()]
+            write_cifs_parallel(args.infile, struc_data, cif_jobs, args.tolerance if args.symmetrized else None, args.jobs)
+            raise SystemExit()
+        with phase('write') as ph:
+            for cid, struc in struc_data.items():
+                if args.print:
+                    print(f'\nID {cid}')
+                    print(struc_data[cid])
+                elif args.symmetrized:
+                    spg_cache.write_sym_cif(struc, f'{cid}.cif', symprec=args.tolerance)
+                else:
+                    struc.to(fmt='cif', filename=f'{cid}.cif')
+                ph.add()
 
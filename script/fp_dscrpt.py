@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+#
+# fp_dscrpt.py
+#
+#   2026/10/18
+#   f-fingerprint descriptors (same as dscrpt = FP in CrySPY BO) of all structures in struc_data
+#     - numpy is required (pymatgen is required to read pickle)
+#     - input: xxx_struc_data.pkl (.gz) or xxx_struc_data.store
+#     - output: xxx_dscrpt_data.npz (one dense matrix with an ID index)
+#               --pkl: xxx_dscrpt_data.pkl as well ({cid: descriptor}, same as init_dscrpt_data.pkl)
+#
+#   F_AB(R) = V / (4 pi N_A N_B) sum_{i in A, j in B} g(R - R_ij) / R_ij^2 - 1
+#     g: normalized gaussian (fp_sigma), R = fp_rmin ... fp_rmax (fp_npoints)
+#     descriptor: F_AB for A <= B in the order of atype, concatenated
+#     F_AB = 0 if A or B is absent in the structure (EA-vc)
+#
+#   structures with the same number of sites are stacked into arrays (periodic_nbr.py)
+#   and processed in batches across a process pool
+#
+#   xxx_dscrpt_data.npz
+#     cid       int64 (nstruc,)
+#     dscrpt    float64 (nstruc, npair * fp_npoints), rows in the order of cid
+#     params    json string: atype, fp_rmin, fp_rmax, fp_npoints, fp_sigma
+#   only IDs not in the npz are computed on rerun (recomputed if params changed)
+#
+#   atype and fp_xxx are read from input_data.pkl in the same directory if found
+#   (options override them). default: fp_rmin 0.5, fp_rmax 5.0, fp_npoints 50, fp_sigma 0.2
+#
+#   example:
+#     fp_dscrpt.py opt_struc_data.pkl -j 8                   # --> opt_dscrpt_data.npz
+#     fp_dscrpt.py init_struc_data.pkl -a Si O --pkl         # --> init_dscrpt_data.npz, init_dscrpt_data.pkl
+#     fp_dscrpt.py opt_struc_data.store -o opt_dscrpt_data.npz
+#
+#     d = np.load('opt_dscrpt_data.npz')
+#     x = d['dscrpt'][np.searchsorted(d['cid'], [7, 10, 12])]
+#
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+from periodic_nbr import batch_pair_distances
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+from struc_store import iter_struc_arrays, open_struc_data
+
+
+DEFAULT_PARAMS = {'fp_rmin': 0.5, 'fp_rmax': 5.0, 'fp_npoints': 50, 'fp_sigma': 0.2}
+MAX_PAIRS = 100000    # pairs per gaussian block: memory of MAX_PAIRS * fp_npoints
+
+
+def fingerprint_batch(lattices, frac_coords, type_idx, params):
+    '''
+    f-fingerprint of structures with the same number of sites, (nbatch, npair * fp_npoints)
+    type_idx: (nbatch, nsite), index into atype
+    '''
+    ntype = len(params['atype'])
+    npair = ntype*(ntype + 1)//2
+    grid = np.linspace(params['fp_rmin'], params['fp_rmax'], params['fp_npoints'])
+    sigma = params['fp_sigma']
+    nbatch = len(lattices)
+    # ---------- pairs, a bit beyond rmax for the gaussian tail
+    b, i, j, dist = batch_pair_distances(lattices, frac_coords, params['fp_rmax'] + 3*sigma)
+    ta = type_idx[b, i]
+    tb = type_idx[b, j]
+    sel = ta <= tb    # i in A, j in B for A <= B
+    b, ta, tb, dist = b[sel], ta[sel], tb[sel], dist[sel]
+    ptype = ta*ntype - ta*(ta - 1)//2 + (tb - ta)
+    # ---------- weight: V / (4 pi N_A N_B R_ij^2)
+    volume = np.abs(np.linalg.det(lattices))
+    counts = np.stack([(type_idx == t).sum(axis=1) for t in range(ntype)], axis=1)    # (nbatch, ntype)
+    weight = volume[b] / (4*np.pi * counts[b, ta] * counts[b, tb] * dist**2)
+    # ---------- sum of gaussians, one bincount per block
+    group = b*npair + ptype
+    offsets = np.arange(len(grid))
+    fp = np.zeros(nbatch*npair*len(grid))
+    for start in range(0, len(dist), MAX_PAIRS):
+        s = slice(start, start + MAX_PAIRS)
+        gauss = np.exp(-(grid[None, :] - dist[s, None])**2 / (2*sigma**2)) / (np.sqrt(2*np.pi)*sigma)
+        idx = group[s, None]*len(grid) + offsets[None, :]
+        fp += np.bincount(idx.ravel(), weights=(weight[s, None]*gauss).ravel(), minlength=len(fp))
+    fp = fp.reshape(nbatch, npair, len(grid)) - 1.0
+    # ---------- absent pairs
+    ia, ib = np.triu_indices(ntype)
+    present = (counts[:, ia] > 0) & (counts[:, ib] > 0)    # (nbatch, npair), same order as ptype
+    fp[~present] = 0.0
+    return fp.reshape(nbatch, -1)
+
+
+def calc_batch(cids, lattices, frac_coords, type_idx, params):
+    return cids, fingerprint_batch(lattices, frac_coords, type_idx, params)
+
+
+def gen_batches(struc_data, cids, atype, chunk):
+    '''
+    group structures by the number of sites and yield batches of arrays
+    the batch size is reduced for large cells: nbatch * nsite^2 <= 2e6
+    '''
+    atype_idx = {a: k for k, a in enumerate(atype)}
+    groups = {}
+    for cid, lattice, frac_coords, species in iter_struc_arrays(struc_data, cids):
+        try:
+            tidx = [atype_idx[sp] for sp in species]
+        except KeyError as e:
+            raise SystemExit(f'Error! ID {cid}: species {e} is not in atype {atype}')
+        nsite = len(species)
+        group = groups.setdefault(nsite, ([], [], [], []))
+        group[0].append(cid)
+        group[1].append(lattice)
+        group[2].append(frac_coords)
+        group[3].append(tidx)
+        if len(group[0]) >= max(1, min(chunk, 2000000 // nsite**2)):
+            yield group[0], np.array(group[1]), np.array(group[2]), np.array(group[3])
+            del groups[nsite]
+    for group in groups.values():
+        yield group[0], np.array(group[1]), np.array(group[2]), np.array(group[3])
+
+
+def calc_dscrpt(struc_data, cids, params, njobs=1, chunk=1000):
+    '''
+    descriptors of cids, return (cids, matrix) in the computed order
+    '''
+    done_cids, rows = [], []
+    if njobs == 1:
+        for batch in gen_batches(struc_data, cids, params['atype'], chunk):
+            bcids, fp = calc_batch(*batch, params)
+            done_cids += bcids
+            rows.append(fp)
+    else:
+        # ------ at most 2 batches per process in flight
+        with ProcessPoolExecutor(max_workers=njobs) as executor:
+            running = deque()
+            for batch in gen_batches(struc_data, cids, params['atype'], chunk):
+                running.append(executor.submit(calc_batch, *batch, params))
+                if len(running) >= 2*njobs:
+                    bcids, fp = running.popleft().result()
+                    done_cids += bcids
+                    rows.append(fp)
+            while running:
+                bcids, fp = running.popleft().result()
+                done_cids += bcids
+                rows.append(fp)
+    ndim = len(params['atype'])*(len(params['atype']) + 1)//2 * params['fp_npoints']
+    return done_cids, np.concatenate(rows) if rows else np.zeros((0, ndim))
+
+
+def load_dscrpt(filename, params):
+    '''
+    (cid, dscrpt) in filename, empty if not found or params changed
+    '''
+    if os.path.isfile(filename):
+        with np.load(filename) as d:
+            if json.loads(str(d['params'])) == params:
+                return d['cid'], d['dscrpt']
+        print('Parameters changed, descriptors are recomputed')
+    ndim = len(params['atype'])*(len(params['atype']) + 1)//2 * params['fp_npoints']
+    return np.zeros(0, dtype=np.int64), np.zeros((0, ndim))
+
+
+def save_dscrpt(filename, cids, dscrpt, params):
+    # ---------- atomic: write a temporary file and rename
+    tmp = filename + '.tmp.npz'
+    np.savez(tmp, cid=np.asarray(cids, dtype=np.int64), dscrpt=dscrpt, params=json.dumps(params))
+    os.replace(tmp, filename)
+
+
+def default_outfile(infile):
+    # ---------- ./pkl_data/opt_struc_data.pkl --> ./pkl_data/opt_dscrpt_data.npz
+    name = os.path.basename(infile.rstrip('/'))
+    prefix = name.split('_struc_data')[0] if '_struc_data' in name else name.split('.')[0]
+    return os.path.join(os.path.dirname(infile.rstrip('/')), f'{prefix}_dscrpt_data.npz')
+
+
+def get_params(args, struc_data):
+    '''
+    options > input_data.pkl > default, atype: all species in struc_data if not given
+    '''
+    params = dict(DEFAULT_PARAMS)
+    atype = None
+    input_file = os.path.join(os.path.dirname(os.path.abspath(args.infile)), 'input_data.pkl')
+    if os.path.isfile(input_file):
+        rin = load_data(input_file)
+        for key in DEFAULT_PARAMS:
+            if getattr(rin, key, None) is not None:
+                params[key] = getattr(rin, key)
+        atype = list(getattr(rin, 'atype', None) or []) or None
+    for key in DEFAULT_PARAMS:
+        if getattr(args, key) is not None:
+            params[key] = getattr(args, key)
+    if args.atype:
+        atype = args.atype
+    if atype is None:
+        atype = sorted({sp for _, _, _, species in iter_struc_arrays(struc_data) for sp in species})
+    params['atype'] = list(atype)
+    params['fp_npoints'] = int(params['fp_npoints'])
+    return params
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='input file: xxx_struc_data.pkl (.gz) or xxx_struc_data.store')
+    parser.add_argument('-o', '--outfile', help='output npz (default: xxx_dscrpt_data.npz next to the input)')
+    parser.add_argument('-a', '--atype', help='atom types, e.g., -a Si O (default: input_data.pkl or all species)',
+                        nargs='+')
+    parser.add_argument('--fp_rmin', help='min distance in A (default 0.5)', type=float)
+    parser.add_argument('--fp_rmax', help='max distance in A (default 5.0)', type=float)
+    parser.add_argument('--fp_npoints', help='number of points (default 50)', type=int)
+    parser.add_argument('--fp_sigma', help='gaussian width in A (default 0.2)', type=float)
+    parser.add_argument('-j', '--jobs', help='number of processes (default 1)', type=int, default=1)
+    parser.add_argument('-c', '--chunk', help='max number of structures in a batch (default 1000)', type=int,
+                        default=1000)
+    parser.add_argument('--pkl', help='also write xxx_dscrpt_data.pkl ({cid: descriptor})', action='store_true')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- load
+    start = time.perf_counter()
+    with phase('load'):
+        struc_data = open_struc_data(args.infile)
+        params = get_params(args, struc_data)
+        outfile = args.outfile if args.outfile else default_outfile(args.infile)
+        old_cids, old_dscrpt = load_dscrpt(outfile, params)
+
+    # ---------- new IDs only
+    with phase('select'):
+        known = set(old_cids.tolist())
+        new_cids = [cid for cid in struc_data.keys() if cid not in known]
+
+    # ---------- calc
+    with phase('calc') as ph:
+        cids, dscrpt = calc_dscrpt(struc_data, new_cids, params, args.jobs, args.chunk)
+        ph.add(len(cids))
+
+    # ---------- merge, sort by cid, and save
+    with phase('write'):
+        all_cids = np.concatenate([old_cids, np.asarray(cids, dtype=np.int64)])
+        all_dscrpt = np.concatenate([old_dscrpt, dscrpt])
+        order = np.argsort(all_cids, kind='stable')
+        all_cids, all_dscrpt = all_cids[order], all_dscrpt[order]
+        if cids or not os.path.isfile(outfile):
+            save_dscrpt(outfile, all_cids, all_dscrpt, params)
+        if args.pkl:
+            pklfile = outfile[:-4] + '.pkl' if outfile.endswith('.npz') else outfile + '.pkl'
+            with open(pklfile, 'wb') as f:
+                pickle.dump({int(cid): x for cid, x in zip(all_cids, all_dscrpt)}, f)
+    elapsed = time.perf_counter() - start
+    print(f'atype: {" ".join(params["atype"])}, descriptor length: {all_dscrpt.shape[1]}')
+    print(f'Computed {len(cids)} new structures ({len(all_cids)} in total) in {elapsed:.2f} s')
+    print(f'Save {outfile}')
+    if args.pkl:
+        print(f'Save {pklfile}')
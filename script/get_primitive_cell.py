@@ -11,21 +11,28 @@
 #
 import argparse
 
-from pymatgen.core import Structure
+from phase_timer import add_prof_option, phase, start_prof
 
 
 def get_primitive(infile):
-    struc = Structure.from_file(infile)
+    from pymatgen.core import Structure
+
+    with phase('parse'):
+        struc = Structure.from_file(infile)
     # ---------- to primitive
-    struc = struc.get_primitive_structure()
+    with phase('symmetrize'):
+        struc = struc.get_primitive_structure()
     # ---------- output
-    print(struc.to(fmt='poscar'))
+    with phase('write'):
+        print(struc.to(fmt='poscar'))
 
 if __name__ == '__main__':
     # ---------- argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('infile', help='input file')
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
 
     # ---------- main
     get_primitive(args.infile)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+#
+# hull_tracker.py
+#
+#   2026/10/18
+#   incremental convex hull and hull distance for EA-vc
+#     - numpy, pandas, and pymatgen are required
+#     - input: pkl_data/rslt_data.pkl, nat_data.pkl, and input_data.pkl
+#              (atype, end_point, emax_ea, emin_ea are read from input_data.pkl,
+#               or given by options if CrySPY is not installed)
+#     - output: hull_state.pkl    state of the hull, read on the next run
+#               hull_hdist.pkl    per-generation snapshots {gen: {cid: hdist}}
+#
+#   only new IDs are processed on each run, generation by generation:
+#     1. PhaseDiagram of the current hull vertices + new entries
+#        (points inside the hull never become vertices)
+#     2. facets which were not in the previous hull are "new facets"
+#     3. hull distance is updated only for new entries and
+#        old entries inside the new facets
+#   energies follow cryspy_analyzer_EA-vc.ipynb: ComputedEntry(comp, E_eV_atom * natot)
+#
+#   example:
+#     hull_tracker.py
+#     hull_tracker.py ./data/pkl_data --atype Cu Au --end_point 0.0 0.0
+#
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+from pymatgen.core import Element
+from pymatgen.entries.computed_entries import ComputedEntry
+from pymatgen.analysis.phase_diagram import PhaseDiagram
+
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+
+
+def init_state(atype, end_point, emax_ea, emin_ea):
+    # ---------- end points are the first hull vertices
+    end_entries = [ComputedEntry(ele, end_e, entry_id=f'end_{ele}') for ele, end_e in zip(atype, end_point)]
+    return {
+        'atype': tuple(atype), 'end_point': tuple(end_point), 'emax_ea': emax_ea, 'emin_ea': emin_ea,
+        'vertices': end_entries,    # ComputedEntry on the hull
+        'facets': {},               # {frozenset(entry_id): (coords (n, n-1), e_per_atom (n,))}
+        'coords': {},               # {cid: coordinates in the phase diagram (n-1,)}
+        'energy': {},               # {cid: e_per_atom}
+        'hdist': {},                # {cid: hull distance}
+        'skipped': set(),           # nan, > emax_ea, < emin_ea
+    }
+
+
+def hull_energy(facets, coords):
+    '''
+    hull energy at coords (npoint, n-1) using facets
+    nan for the points outside all the facets
+    '''
+    e_hull = np.full(len(coords), np.nan)
+    if len(coords) == 0:
+        return e_hull
+    rhs = np.hstack([coords, np.ones((len(coords), 1))]).T    # (n, npoint)
+    for vcoords, ve in facets:
+        mat = np.hstack([vcoords, np.ones((len(vcoords), 1))]).T    # (n, n)
+        lam = np.linalg.solve(mat, rhs)    # barycentric coordinates (n, npoint)
+        inside = (lam >= -1e-8).all(axis=0)
+        e_hull[inside] = lam[:, inside].T @ ve
+    return e_hull
+
+
+def update_gen(state, new_entries, new_coords):
+    '''
+    new_entries: {cid: ComputedEntry}, new_coords: {cid: coords}
+    return the number of new facets and updated hull distances
+    '''
+    elements = [Element(ele) for ele in state['atype']]
+    pd_hull = PhaseDiagram(state['vertices'] + list(new_entries.values()), elements=elements)
+
+    # ---------- facets
+    facets = {}
+    for facet in pd_hull.facets:
+        key = frozenset(pd_hull.qhull_entries[i].entry_id for i in facet)
+        data = pd_hull.qhull_data[facet]
+        facets[key] = (data[:, :-1], data[:, -1])
+    new_facets = [facets[key] for key in facets.keys() - state['facets'].keys()]
+
+    # ---------- old entries inside the new facets
+    old_ids = list(state['coords'])
+    ndim = len(state['atype']) - 1
+    old_coords = np.array([state['coords'][cid] for cid in old_ids]).reshape(len(old_ids), ndim)
+    e_hull = hull_energy(new_facets, old_coords)
+    nupdate = 0
+    for cid, eh in zip(old_ids, e_hull):
+        if not np.isnan(eh):
+            state['hdist'][cid] = max(state['energy'][cid] - eh, 0.0)
+            nupdate += 1
+
+    # ---------- new entries: all facets
+    new_ids = list(new_entries)
+    coords = np.array([new_coords[cid] for cid in new_ids]).reshape(len(new_ids), ndim)
+    e_hull = hull_energy(facets.values(), coords)
+    for cid, eh in zip(new_ids, e_hull):
+        state['coords'][cid] = new_coords[cid]
+        state['energy'][cid] = new_entries[cid].energy_per_atom
+        state['hdist'][cid] = max(state['energy'][cid] - eh, 0.0)
+        nupdate += 1
+
+    # ---------- hull vertices
+    state['vertices'] = list(pd_hull.stable_entries)
+    state['facets'] = facets
+    return len(new_facets), nupdate
+
+
+def track(state, rslt_data, nat_data, hdist_hist):
+    atype = state['atype']
+    todo = rslt_data[~rslt_data.index.isin(state['coords'].keys() | state['skipped'])]
+    for gen, c_rslt in todo.groupby('Gen', sort=True):
+        start = time.perf_counter()
+        new_entries = {}
+        new_coords = {}
+        for cid, e in c_rslt['E_eV_atom'].items():
+            # ------ np.nan, emax_ea, emin_ea
+            if (np.isnan(e) or cid not in nat_data
+                    or (state['emax_ea'] is not None and e > state['emax_ea'])
+                    or (state['emin_ea'] is not None and e < state['emin_ea'])):
+                state['skipped'].add(cid)
+                continue
+            # ------ entry
+            nat = nat_data[cid]
+            composition = "".join(f"{element}{nat_i}" for element, nat_i in zip(atype, nat))
+            new_entries[cid] = ComputedEntry(composition, e*sum(nat), entry_id=cid)
+            new_coords[cid] = np.array(nat[1:], dtype=float) / sum(nat)
+        if not new_entries:
+            continue
+        nfacet, nupdate = update_gen(state, new_entries, new_coords)
+        hdist_hist[gen] = dict(state['hdist'])
+        print(f'Gen {gen}: {len(new_entries)} new entries, {nfacet} new facets,'
+              f' {nupdate} hull distances updated, {len(state["vertices"])} vertices'
+              f' ({time.perf_counter() - start:.2f} s)')
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pkl_dir', help='pkl_data directory (default: ./pkl_data)', nargs='?', default='./pkl_data')
+    parser.add_argument('-o', '--outdir', help='directory for hull_state.pkl and hull_hdist.pkl (default: .)', default='.')
+    parser.add_argument('--atype', help='atom types if input_data.pkl is not available, e.g., --atype Cu Au', nargs='+')
+    parser.add_argument('--end_point', help='energies of end points, e.g., --end_point 0.0 0.0', type=float, nargs='+')
+    parser.add_argument('--emax_ea', help='override emax_ea', type=float)
+    parser.add_argument('--emin_ea', help='override emin_ea', type=float)
+    parser.add_argument('--reset', help='discard hull_state.pkl and start from scratch', action='store_true')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- settings
+    if args.atype and args.end_point:
+        atype, end_point = args.atype, args.end_point
+        emax_ea, emin_ea = args.emax_ea, args.emin_ea
+    else:
+        rin = load_data(os.path.join(args.pkl_dir, 'input_data.pkl'))    # CrySPY is required
+        atype, end_point = rin.atype, rin.end_point
+        emax_ea = args.emax_ea if args.emax_ea is not None else rin.emax_ea
+        emin_ea = args.emin_ea if args.emin_ea is not None else rin.emin_ea
+
+    # ---------- state
+    state_path = os.path.join(args.outdir, 'hull_state.pkl')
+    hist_path = os.path.join(args.outdir, 'hull_hdist.pkl')
+    state = None
+    hdist_hist = {}
+    if os.path.isfile(state_path) and not args.reset:
+        state = load_data(state_path, cache=False)
+        hdist_hist = load_data(hist_path, cache=False)
+        if (state['atype'], state['end_point'], state['emax_ea'], state['emin_ea']) != (
+                tuple(atype), tuple(end_point), emax_ea, emin_ea):
+            print('Settings changed, hull_state.pkl is discarded')
+            state = None
+            hdist_hist = {}
+    if state is None:
+        state = init_state(atype, end_point, emax_ea, emin_ea)
+
+    # ---------- update
+    with phase('load'):
+        rslt_data = load_data(os.path.join(args.pkl_dir, 'rslt_data.pkl'))
+        nat_data = load_data(os.path.join(args.pkl_dir, 'nat_data.pkl'))
+    with phase('hull'):
+        track(state, rslt_data, nat_data, hdist_hist)
+
+    # ---------- save
+    with phase('write'):
+        with open(state_path, 'wb') as f:
+            pickle.dump(state, f)
+        with open(hist_path, 'wb') as f:
+            pickle.dump(hdist_hist, f)
+    print(f'Entries: {len(state["hdist"])}, on hull: {sum(1 for h in state["hdist"].values() if h < 1e-8)}')
+    print(f'Save {state_path}, {hist_path}')
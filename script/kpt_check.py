@@ -1,34 +1,41 @@
 #!/usr/bin/env python3
 #
 # kpt_check.py
+#     2026/10/18 --sweep option: vectorized k-point meshes of all structures for several kppvol
 #     2024/04/21 quit MITRelaxSet, just use Kpoints class, T. Yamashita
 #     2021/06/25 modified for new style of pymatgen, T. Yamashita
 #     20??/??/?? T. Yamashita
 #
 import argparse
-import pickle
 
-from pymatgen.core import Structure
-from pymatgen.io.vasp import Kpoints
+import numpy as np
+
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+from struc_store import iter_struc_arrays, open_struc_data
 
 
 def get_struc(filepath):
+    from pymatgen.core import Structure
+
     struc = Structure.from_file(filepath)
     return struc
 
 
 def load_init_struc(filepath):
-    with open(filepath, 'rb') as dstruc:
-        init_struc_data = pickle.load(dstruc)
-    return init_struc_data
+    return load_data(filepath)
 
 
 def write_kpt(struc, kppvol):
+    from pymatgen.io.vasp import Kpoints
+
     kpoints = Kpoints.automatic_density_by_vol(structure=struc, kppvol=kppvol)
     kpoints.write_file('KPOINTS')
 
 
 def kpt_check(struc, kppvol):
+    from pymatgen.io.vasp import Kpoints
+
     kpoints = Kpoints.automatic_density_by_vol(structure=struc, kppvol=kppvol)
     print('a =', struc.lattice.a)
     print('b =', struc.lattice.b)
@@ -41,8 +48,7 @@ def kpt_check(struc, kppvol):
 
 
 def kpt_check_init_struc(init_struc_data, kppvol, nstruc):
-    init_struc_data = [init_struc_data[i] for i in range(len(init_struc_data))]    # dict --> list
-    for cnt, struc in enumerate(init_struc_data):
+    for cnt, struc in enumerate(init_struc_data.values()):
         print('\n\n# ---------- {}th structure'.format(cnt))
         kpt_check(struc, kppvol)
         if cnt == nstruc-1:
@@ -50,30 +56,100 @@ def kpt_check_init_struc(init_struc_data, kppvol, nstruc):
     return
 
 
+def kpt_mesh(lattices, nats, kppvols):
+    '''
+    same divisions as Kpoints.automatic_density_by_vol for all structures at once
+    (Gamma or Monkhorst-Pack style is not determined)
+
+    lattices: (nstruc, 3, 3), nats: (nstruc,), kppvols: (nkppvol,)
+    return meshes: (nkppvol, nstruc, 3)
+    '''
+    lattices = np.asarray(lattices, dtype=float)
+    nats = np.asarray(nats, dtype=float)
+    kppvols = np.asarray(kppvols, dtype=float)
+    lengths = np.linalg.norm(lattices, axis=2)    # (nstruc, 3): a, b, c
+    recip_vol = (2*np.pi)**3 / np.abs(np.linalg.det(lattices))
+    kppa = kppvols[:, None] * recip_vol[None, :] * nats[None, :]    # (nkppvol, nstruc)
+    # ------ same as automatic_density
+    cube = np.abs(np.floor(kppa**(1/3) + 0.5)**3 - kppa) < 1
+    kppa = np.where(cube, kppa*1.01, kppa)
+    ngrid = kppa / nats[None, :]
+    mult = (ngrid * lengths.prod(axis=1)[None, :])**(1/3)
+    return np.floor(np.maximum(mult[:, :, None] / lengths[None, :, :], 1)).astype(int)
+
+
+def kpt_sweep(struc_data, kppvols, nmesh=10):
+    # ---------- stack lattices
+    lattices = []
+    nats = []
+    for _, lattice, _, species in iter_struc_arrays(struc_data):
+        lattices.append(lattice)
+        nats.append(len(species))
+    meshes = kpt_mesh(lattices, nats, kppvols)
+    nkpts = meshes.prod(axis=2)    # (nkppvol, nstruc)
+
+    # ---------- summary table
+    print(f'# Number of structures: {len(nats)}')
+    print('# k-points per structure (full mesh)')
+    print(f'# {"kppvol":>8} {"min":>8} {"median":>8} {"mean":>10} {"max":>8} {"total":>12}')
+    for kppvol, nkpt in zip(kppvols, nkpts):
+        print(f'  {kppvol:>8} {nkpt.min():>8} {np.median(nkpt):>8.1f} {nkpt.mean():>10.2f}'
+              f' {nkpt.max():>8} {nkpt.sum():>12}')
+
+    # ---------- mesh distribution
+    for kppvol, mesh in zip(kppvols, meshes):
+        uniq, counts = np.unique(mesh, axis=0, return_counts=True)
+        order = np.argsort(-counts, kind='stable')
+        print(f'\n# kppvol = {kppvol}: {len(uniq)} kinds of meshes')
+        print(f'# {"mesh":>12} {"count":>8}')
+        for i in order[:nmesh]:
+            print(f'  {uniq[i][0]:>4}{uniq[i][1]:>4}{uniq[i][2]:>4} {counts[i]:>8}')
+        if len(uniq) > nmesh:
+            print(f'  ... {len(uniq) - nmesh} more')
+
+
 if __name__ == '__main__':
     '''
     sys.argv[1] <-- POSCAR, CONTCAR, or init_struc_data.pkl
     sys.argv[2] <-- kppvol
+
+    - k-point mesh distributions of all structures for kppvol = 50, 100, 200, 400
+      kpt_check.py init_struc_data.pkl 100 --sweep 50 200 400
     '''
     # ---------- argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-w', '--write', help='write KPOINTS', action='store_true')
     parser.add_argument('-n', '--nstruc', help='number of structure to check', type=int, default=5)
+    parser.add_argument('-s', '--sweep', help='additional kppvol values for all structures in struc_data, e.g., -s 50 200 400',
+                        type=int, nargs='+')
+    parser.add_argument('--nmesh', help='number of meshes shown in the distribution (default 10)', type=int, default=10)
     parser.add_argument('infile', help='input file: POSCAR, CONTCAR, or init_struc_data.pkl')
     parser.add_argument('kppvol', help='kppvol', type=int)
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
 
     # ---------- main
     vaspfiles = ['POSCAR', 'CONTCAR']
     filename = args.infile.split('/')[-1]
-    if filename in vaspfiles:
-        struc = get_struc(args.infile)
-        if args.write:
-            write_kpt(struc, args.kppvol)
-        else:
-            kpt_check(struc, args.kppvol)
+    if args.sweep:
+        kppvols = sorted(set([args.kppvol] + args.sweep))
+        with phase('load'):
+            struc_data = open_struc_data(args.infile)
+        with phase('kpoints'):
+            kpt_sweep(struc_data, kppvols, args.nmesh)
+    elif filename in vaspfiles:
+        with phase('parse'):
+            struc = get_struc(args.infile)
+        with phase('kpoints'):
+            if args.write:
+                write_kpt(struc, args.kppvol)
+            else:
+                kpt_check(struc, args.kppvol)
     elif filename == 'init_struc_data.pkl':
-        init_struc_data = load_init_struc(args.infile)
-        kpt_check_init_struc(init_struc_data, args.kppvol, args.nstruc)
+        with phase('load'):
+            init_struc_data = load_init_struc(args.infile)
+        with phase('kpoints'):
+            kpt_check_init_struc(init_struc_data, args.kppvol, args.nstruc)
     else:
         raise SystemExit('usage: kpt_check.py [-h] [-w] [-n NSTRUC] infile kppvol')
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+#
+# laqa_ragged.py
+#
+#   2026/10/18
+#   flat (ragged array) representation of LAQA data and fast analysis
+#     - numpy is required, matplotlib for --png and --gif, pandas for rslt_data.pkl
+#     - input: pkl_data/laqa_step.pkl, laqa_energy.pkl, laqa_score.pkl, id_select_hist.pkl
+#              (rslt_data.pkl and tot_step_select.pkl if exist)
+#
+#   {cid: [v0, v1, ...]} --> Ragged: values (flat), offsets (nid + 1), ids (sorted)
+#     values of ids[r] = values[offsets[r]:offsets[r+1]]
+#   cumulative steps, required steps, and selection frames are computed without
+#   loops over IDs, the figures are drawn with one LineCollection per color
+#   and the animation only extends the visible part of a sorted segment array
+#
+#   example:
+#     laqa_ragged.py
+#     laqa_ragged.py ./pkl_data --png LAQA_step.png --gif LAQA_step.gif --stable 2 5
+#
+#   use in notebook:
+#     import sys; sys.path.append('path/to/cryspy_utility/script')
+#     from laqa_ragged import load_laqa, required_steps
+#
+import argparse
+import os
+
+import numpy as np
+
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+
+
+class Ragged:
+    '''
+    values: flat array, offsets: int64 (nid + 1,), ids: int64 sorted (nid,)
+    '''
+    def __init__(self, values, offsets, ids):
+        self.values = values
+        self.offsets = offsets
+        self.ids = ids
+
+    @classmethod
+    def from_dict(cls, data, ids=None, dtype=np.float64):
+        if ids is None:
+            ids = np.array(sorted(data), dtype=np.int64)
+        lengths = np.array([len(data.get(cid, ())) for cid in ids], dtype=np.int64)
+        offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        values = np.fromiter((v for cid in ids for v in data.get(cid, ())), dtype=dtype, count=offsets[-1])
+        return cls(values, offsets, ids)
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def row(self, cid):
+        r = np.searchsorted(self.ids, cid)
+        if r == len(self.ids) or self.ids[r] != cid:
+            raise KeyError(cid)
+        return r
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, cid):
+        r = self.row(cid)
+        return self.values[self.offsets[r]:self.offsets[r+1]]
+
+    def row_index(self):
+        '''row of each value'''
+        return np.repeat(np.arange(len(self.ids)), self.lengths)
+
+    def pos_index(self):
+        '''position of each value in its row'''
+        return np.arange(len(self.values)) - np.repeat(self.offsets[:-1], self.lengths)
+
+    def last(self, fill=np.nan):
+        '''last value of each row, fill for empty rows'''
+        out = np.full(len(self.ids), fill, dtype=np.result_type(self.values, type(fill)))
+        nonempty = self.lengths > 0
+        out[nonempty] = self.values[self.offsets[1:][nonempty] - 1]
+        return out
+
+    def cumsum(self):
+        '''cumulative sum within each row'''
+        csum = np.cumsum(self.values)
+        start = np.concatenate([[0], csum])[self.offsets[:-1]]
+        return Ragged(csum - np.repeat(start, self.lengths), self.offsets, self.ids)
+
+    def sum(self):
+        '''sum of each row'''
+        csum = np.concatenate([[0], np.cumsum(self.values)])
+        return csum[self.offsets[1:]] - csum[self.offsets[:-1]]
+
+
+def load_laqa(pkl_dir):
+    '''
+    return dict of Ragged: step, energy, score (if exists), select
+    select: ids = selection number (1, 2, ...), values = selected IDs
+    '''
+    laqa_step = load_data(os.path.join(pkl_dir, 'laqa_step.pkl'))
+    ids = np.array(sorted(laqa_step), dtype=np.int64)
+    laqa = {
+        'step': Ragged.from_dict(laqa_step, ids, dtype=np.int64),
+        'energy': Ragged.from_dict(load_data(os.path.join(pkl_dir, 'laqa_energy.pkl')), ids),
+    }
+    score_path = os.path.join(pkl_dir, 'laqa_score.pkl')
+    if os.path.isfile(score_path):
+        laqa['score'] = Ragged.from_dict(load_data(score_path), ids)
+    id_select_hist = load_data(os.path.join(pkl_dir, 'id_select_hist.pkl'))
+    laqa['select'] = Ragged.from_dict(dict(enumerate(id_select_hist, start=1)), dtype=np.int64)
+    return laqa
+
+
+def select_frames(laqa):
+    '''
+    selection number at which each value of laqa['step'] was obtained
+    0 for the first step (0th selection: all IDs), -1 if not selected yet
+    '''
+    step = laqa['step']
+    select = laqa['select']
+    frames = np.full(len(step.values), -1, dtype=np.int64)
+    frames[step.offsets[:-1][step.lengths > 0]] = 0
+    if len(select.values) == 0:
+        return frames
+    # ---------- k-th selection of each ID: rank of occurrence in the flat history
+    sel_ids = select.values
+    sel_no = select.ids[select.row_index()]
+    order = np.argsort(sel_ids, kind='stable')
+    sorted_ids = sel_ids[order]
+    first = np.searchsorted(sorted_ids, sorted_ids, side='left')
+    kth = np.empty(len(sel_ids), dtype=np.int64)
+    kth[order] = np.arange(len(sel_ids)) - first + 1
+    # ---------- flat position in step, skip data not yet obtained
+    rows = np.searchsorted(step.ids, sel_ids)
+    valid = (rows < len(step.ids))
+    valid[valid] &= step.ids[rows[valid]] == sel_ids[valid]
+    valid[valid] &= kth[valid] < step.lengths[rows[valid]]
+    frames[step.offsets[rows[valid]] + kth[valid]] = sel_no[valid]
+    return frames
+
+
+def required_steps(laqa, id_done=None):
+    '''
+    statistics of optimization steps
+    return req_step (steps for each ID), step_select (steps in each selection), summary dict
+    '''
+    step = laqa['step']
+    req_step = step.sum()
+    frames = select_frames(laqa)
+    nselect = len(laqa['select'])
+    obtained = frames >= 0
+    step_select = np.bincount(frames[obtained], weights=step.values[obtained],
+                              minlength=nselect + 1).astype(np.int64)
+    summary = {'total': int(step.values.sum())}
+    if id_done is not None:
+        done = np.isin(step.ids, id_done)
+        summary['ndone'] = int(len(id_done))
+        summary['done'] = int(req_step[done].sum())
+        summary['average'] = summary['done'] / max(len(id_done), 1)
+    return req_step, step_select, summary
+
+
+def step_segments(laqa, emin=0.0, stable_ids=()):
+    '''
+    line segments of energy vs. cumulative step, sorted by selection
+    return segs (nseg, 2, 2), frames (nseg,), stable mask (nseg,)
+    '''
+    step = laqa['step']
+    energy = laqa['energy']
+    x = step.cumsum().values.astype(np.float64)
+    y = energy.values - emin
+    frames = select_frames(laqa)
+    # ---------- segment: value k-1 --> k in the same row
+    pos = step.pos_index()
+    end = np.flatnonzero((pos > 0) & (frames >= 0))
+    segs = np.stack([np.stack([x[end - 1], y[end - 1]], axis=1),
+                     np.stack([x[end], y[end]], axis=1)], axis=1)
+    seg_frames = frames[end]
+    stable = np.isin(step.ids[step.row_index()[end]], stable_ids)
+    order = np.argsort(seg_frames, kind='stable')
+    return segs[order], seg_frames[order], stable[order]
+
+
+def _setup_axis(ax, title, sps, xlim, ylim):
+    from matplotlib.ticker import MultipleLocator
+
+    ax.set_xlim(xlim)
+    ax.set_ylim(ylim)
+    ax.xaxis.set_major_locator(MultipleLocator(sps))
+    ax.xaxis.set_minor_locator(MultipleLocator(sps/2))
+    ax.grid(which='minor')
+    ax.set_title(title)
+    ax.set_xlabel('Number of step')
+    ax.set_ylabel('Energy (eV/atom)')
+    ax.hlines(0.0, xlim[0], xlim[1], 'k', '--')
+
+
+def plot_steps(ax, laqa, emin=0.0, stable_ids=(), id_done=None, e_done=None):
+    '''
+    energy vs. step, one LineCollection per color
+    e_done: E_eV_atom for id_done (final points)
+    '''
+    from matplotlib.collections import LineCollection
+
+    segs, _, stable = step_segments(laqa, emin, stable_ids)
+    ax.add_collection(LineCollection(segs[~stable], colors='royalblue', linewidths=1.5))
+    ax.add_collection(LineCollection(segs[stable], colors='red'))
+    if id_done is not None:
+        rows = np.searchsorted(laqa['step'].ids, id_done)
+        req_step = laqa['step'].sum()[rows]
+        is_stable = np.isin(id_done, stable_ids)
+        for mask, color in ((~is_stable, 'royalblue'), (is_stable, 'red')):
+            ax.plot(req_step[mask], np.asarray(e_done)[mask] - emin, 'o', color=color, ms=6, mew=2.0, alpha=0.8)
+
+
+def animate_steps(fig, ax, laqa, emin=0.0, stable_ids=()):
+    '''
+    FuncAnimation with blitting, frame i shows selections up to i
+    '''
+    from matplotlib.animation import FuncAnimation
+    from matplotlib.collections import LineCollection
+
+    segs, seg_frames, stable = step_segments(laqa, emin, stable_ids)
+    nframe = len(laqa['select']) + 1
+    # ---------- number of visible segments at each frame
+    counts = [np.searchsorted(seg_frames[mask], np.arange(nframe), side='right') for mask in (~stable, stable)]
+    parts = [segs[~stable], segs[stable]]
+    collections = [LineCollection([], colors='royalblue', linewidths=1.5, animated=True),
+                   LineCollection([], colors='red', animated=True)]
+    for lc in collections:
+        ax.add_collection(lc)
+
+    def init():
+        for lc in collections:
+            lc.set_segments([])
+        return collections
+
+    def animate(i):
+        for lc, part, count in zip(collections, parts, counts):
+            lc.set_segments(part[:count[i]])
+        return collections
+
+    return FuncAnimation(fig, animate, init_func=init, frames=nframe, blit=True)
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('pkl_dir', help='pkl_data directory (default: ./pkl_data)', nargs='?', default='./pkl_data')
+    parser.add_argument('--png', help='energy vs. step figure, e.g., --png LAQA_step.png')
+    parser.add_argument('--gif', help='energy vs. step animation, e.g., --gif LAQA_step.gif')
+    parser.add_argument('--stable', help='IDs drawn in red', type=int, nargs='+', default=[])
+    parser.add_argument('--title', help='figure title', default='LAQA')
+    parser.add_argument('--sps', help='step per selection for x ticks (default 50)', type=int, default=50)
+    parser.add_argument('--ymax', help='ymax of the figure (default 20)', type=float, default=20.0)
+    parser.add_argument('--fps', help='fps of the animation (default 5)', type=int, default=5)
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- load
+    with phase('load'):
+        laqa = load_laqa(args.pkl_dir)
+    id_done, e_done, emin = None, None, 0.0
+    rslt_path = os.path.join(args.pkl_dir, 'rslt_data.pkl')
+    if os.path.isfile(rslt_path):
+        with phase('load'):
+            rslt_data = load_data(rslt_path)
+        id_done = rslt_data.index.to_numpy(dtype=np.int64)
+        e_done = rslt_data['E_eV_atom'].to_numpy(dtype=np.float64)
+        emin = np.nanmin(e_done)
+        print(f'Emin: {emin} eV/atom')
+
+    # ---------- required optimization steps
+    with phase('analyze'):
+        req_step, step_select, summary = required_steps(laqa, id_done)
+    print(f'Number of structures: {len(laqa["step"])}')
+    print(f'Number of selections: {len(laqa["select"])}')
+    print(f'Total optimization steps: {summary["total"]}')
+    tot_path = os.path.join(args.pkl_dir, 'tot_step_select.pkl')
+    if os.path.isfile(tot_path):
+        tot_step_select = load_data(tot_path)
+        if sum(tot_step_select) != summary['total']:
+            print(f'Total optimization steps in tot_step_select.pkl: {sum(tot_step_select)} (running jobs)')
+    if id_done is not None:
+        print(f'Number of completed structures: {summary["ndone"]}')
+        print(f'Total optimization steps for completed structures: {summary["done"]}')
+        print(f'Average number of optimization steps for completed structures: {summary["average"]}')
+    print(f'Steps in each selection: {step_select.tolist()}')
+    if 'score' in laqa:
+        score = laqa['score'].last()
+        top = np.argsort(-np.where(np.isfinite(score), score, -np.inf), kind='stable')[:10]
+        print('Latest score (top 10):')
+        for r in top:
+            print(f'  {laqa["score"].ids[r]:>8}  {score[r]}')
+
+    # ---------- figure
+    if args.png or args.gif:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        xlim = (0, req_step.max() + 2)
+        ylim = (-0.2, args.ymax)
+        if args.png:
+            with phase('plot'):
+                fig, ax = plt.subplots()
+                _setup_axis(ax, args.title, args.sps, xlim, ylim)
+                plot_steps(ax, laqa, emin, args.stable, id_done, e_done)
+                fig.savefig(args.png, bbox_inches='tight')
+            print(f'Save {args.png}')
+        if args.gif:
+            with phase('animate'):
+                fig, ax = plt.subplots()
+                _setup_axis(ax, args.title, args.sps, xlim, ylim)
+                anim = animate_steps(fig, ax, laqa, emin, args.stable)
+                anim.save(args.gif, writer='pillow', fps=args.fps)
+            print(f'Save {args.gif}')
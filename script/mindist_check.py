@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# mindist_check.py
+#
+#   2026/10/18
+#   check interatomic distances of all structures in init_struc_data.pkl
+#   against a mindist matrix (same as mindist_1, mindist_2, ... in cryspy.in)
+#     - numpy is required (pymatgen is required to read pickle)
+#     - input: xxx_struc_data.pkl (.gz) or xxx_struc_data.store
+#     - output: standard output or --outfile. violating IDs and pairs
+#
+#   structures with the same number of sites are stacked into arrays
+#   and checked in batches across a process pool
+#
+#   example:
+#     - atype = Si, mindist_1 = 2.0
+#       mindist_check.py init_struc_data.pkl -a Si -m 2.0
+#     - atype = Si O, mindist_1 = 1.5 1.0, mindist_2 = 1.0 1.5, 8 processes
+#       mindist_check.py init_struc_data.pkl -a Si O -m 1.5 1.0 -m 1.0 1.5 -j 8
+#
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import sys
+import time
+
+import numpy as np
+
+from periodic_nbr import min_image_distances
+from phase_timer import add_prof_option, phase, start_prof
+from struc_store import iter_struc_arrays, open_struc_data
+
+
+def check_batch(cids, lattices, frac_coords, type_idx, mindist, atype):
+    '''
+    return violations [(cid, i, j, pair, dist, mindist_ij), ...] in the batch
+    i == j means a site and its own periodic image
+    '''
+    dist = min_image_distances(lattices, frac_coords, mindist.max())
+    cutoff = mindist[type_idx[:, :, None], type_idx[:, None, :]]    # (nbatch, nsite, nsite)
+    viol = np.triu(dist < cutoff)
+    violations = []
+    for b, i, j in zip(*np.nonzero(viol)):
+        pair = f'{atype[type_idx[b, i]]}-{atype[type_idx[b, j]]}'
+        violations.append((cids[b], int(i), int(j), pair, float(dist[b, i, j]), float(cutoff[b, i, j])))
+    return violations
+
+
+def gen_batches(struc_data, atype, chunk):
+    '''
+    group structures by the number of sites and yield batches of arrays
+    '''
+    atype_idx = {a: k for k, a in enumerate(atype)}
+    groups = {}
+    for cid, lattice, frac_coords, species in iter_struc_arrays(struc_data):
+        try:
+            tidx = [atype_idx[sp] for sp in species]
+        except KeyError as e:
+            raise SystemExit(f'Error! ID {cid}: species {e} is not in atype {atype}')
+        group = groups.setdefault(len(species), ([], [], [], []))
+        group[0].append(cid)
+        group[1].append(lattice)
+        group[2].append(frac_coords)
+        group[3].append(tidx)
+        if len(group[0]) == chunk:
+            yield group[0], np.array(group[1]), np.array(group[2]), np.array(group[3])
+            del groups[len(species)]
+    for group in groups.values():
+        yield group[0], np.array(group[1]), np.array(group[2]), np.array(group[3])
+
+
+def check_mindist(struc_data, atype, mindist, njobs=1, chunk=1000):
+    nstruc = 0
+    violations = []
+    if njobs == 1:
+        for cids, lattices, frac_coords, type_idx in gen_batches(struc_data, atype, chunk):
+            nstruc += len(cids)
+            violations += check_batch(cids, lattices, frac_coords, type_idx, mindist, atype)
+    else:
+        # ------ at most 2 batches per process in flight
+        with ProcessPoolExecutor(max_workers=njobs) as executor:
+            running = deque()
+            for cids, lattices, frac_coords, type_idx in gen_batches(struc_data, atype, chunk):
+                nstruc += len(cids)
+                running.append(executor.submit(check_batch, cids, lattices, frac_coords, type_idx, mindist, atype))
+                if len(running) >= 2*njobs:
+                    violations += running.popleft().result()
+            while running:
+                violations += running.popleft().result()
+    violations.sort()
+    return nstruc, violations
+
+
+def out_report(nstruc, violations, f):
+    viol_ids = sorted(set(v[0] for v in violations))
+    f.write(f'# Checked structures: {nstruc}\n')
+    f.write(f'# Structures violating mindist: {len(viol_ids)}\n')
+    f.write(f'# IDs: {" ".join(str(cid) for cid in viol_ids)}\n')
+    f.write(f'# {"ID":>8} {"i":>4} {"j":>4} {"pair":>8} {"dist":>8} {"mindist":>8}\n')
+    for cid, i, j, pair, dist, cutoff in violations:
+        f.write(f'  {cid:>8} {i:>4} {j:>4} {pair:>8} {dist:8.4f} {cutoff:8.4f}\n')
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='input file: xxx_struc_data.pkl (.gz) or xxx_struc_data.store')
+    parser.add_argument('-a', '--atype', help='atom types, e.g., -a Si O', nargs='+', required=True)
+    parser.add_argument('-m', '--mindist', help='one row of mindist matrix, repeat for each atype, e.g., -m 1.5 1.0 -m 1.0 1.5',
+                        type=float, nargs='+', action='append', required=True)
+    parser.add_argument('-j', '--jobs', help='number of processes (default 1)', type=int, default=1)
+    parser.add_argument('-c', '--chunk', help='number of structures in a batch (default 1000)', type=int, default=1000)
+    parser.add_argument('-o', '--outfile', help='output file for the report (default: standard output)')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- mindist matrix
+    if len(args.mindist) != len(args.atype) or any(len(row) != len(args.atype) for row in args.mindist):
+        raise SystemExit(f'Error! mindist must be {len(args.atype)} x {len(args.atype)}:'
+                         f' give -m {len(args.atype)} times with {len(args.atype)} values each')
+    mindist = np.array(args.mindist)
+    if not np.allclose(mindist, mindist.T):
+        raise SystemExit('Error! mindist must be symmetric')
+
+    # ---------- check
+    start = time.perf_counter()
+    with phase('load'):
+        struc_data = open_struc_data(args.infile)
+    with phase('check') as ph:
+        nstruc, violations = check_mindist(struc_data, args.atype, mindist, args.jobs, args.chunk)
+        ph.add(nstruc)
+    elapsed = time.perf_counter() - start
+
+    # ---------- report
+    with phase('write'):
+        if args.outfile:
+            with open(args.outfile, 'w') as f:
+                out_report(nstruc, violations, f)
+        else:
+            out_report(nstruc, violations, sys.stdout)
+    print(f'# {nstruc} structures checked in {elapsed:.2f} s', file=sys.stderr)
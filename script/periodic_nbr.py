@@ -0,0 +1,103 @@
+#
+# periodic_nbr.py
+#
+#   2026/10/18
+#   NumPy kernels for interatomic distances with periodic images
+#     - numpy is required
+#     - structures with the same number of sites are processed as a batch
+#       lattices: (nbatch, 3, 3), row vectors
+#       frac_coords: (nbatch, nsite, 3)
+#
+import numpy as np
+
+
+def image_shifts(lattices, rcut):
+    '''
+    integer lattice translations (nimage, 3) which cover all the pairs
+    within rcut for every lattice in the batch
+
+    fractional differences are wrapped into [-0.5, 0.5) beforehand,
+    so |d_k + n_k| <= rcut * |inv(L)[:, k]| gives the range of n_k
+    '''
+    lattices = np.asarray(lattices).reshape(-1, 3, 3)
+    inv_norm = np.linalg.norm(np.linalg.inv(lattices), axis=1)    # (nbatch, 3), column norms
+    nmax = np.ceil(rcut * inv_norm.max(axis=0) + 0.5).astype(int)
+    ranges = [np.arange(-n, n + 1) for n in nmax]
+    return np.array(np.meshgrid(*ranges, indexing='ij')).reshape(3, -1).T
+
+
+def min_image_distances(lattices, frac_coords, rcut):
+    '''
+    minimum distances over periodic images, (nbatch, nsite, nsite)
+
+    diagonal elements are distances between a site and its own images,
+    which are not zero. pairs farther than rcut may be reported as
+    a distance larger than the true minimum, but never smaller than rcut
+    '''
+    lattices = np.asarray(lattices, dtype=float)
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    shifts = image_shifts(lattices, rcut)
+    # ---------- wrapped fractional differences, d_ij = x_j - x_i
+    diff = frac_coords[:, None, :, :] - frac_coords[:, :, None, :]
+    diff -= np.round(diff)
+    # ---------- cartesian
+    cart = np.einsum('bijk,bkl->bijl', diff, lattices)    # (nbatch, nsite, nsite, 3)
+    cart_shifts = np.einsum('mk,bkl->bml', shifts.astype(float), lattices)    # (nbatch, nimage, 3)
+    dist2 = np.full(cart.shape[:3], np.inf)
+    zero = np.flatnonzero(~shifts.any(axis=1))[0]
+    eye = np.eye(cart.shape[1], dtype=bool)
+    for m in range(len(shifts)):
+        d2 = ((cart + cart_shifts[:, m, None, None, :])**2).sum(axis=-1)
+        if m == zero:
+            d2[:, eye] = np.inf    # exclude the site itself
+        np.minimum(dist2, d2, out=dist2)
+    return np.sqrt(dist2)
+
+
+def batch_pair_distances(lattices, frac_coords, rcut):
+    '''
+    all the pairs within rcut for a batch of structures with the same number of sites,
+    including periodic images (i.e., a pair can appear several times)
+
+    returns b, i, j, dist as arrays, b is the index in the batch
+    '''
+    lattices = np.asarray(lattices, dtype=float)
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    shifts = image_shifts(lattices, rcut)
+    diff = frac_coords[:, None, :, :] - frac_coords[:, :, None, :]
+    diff -= np.round(diff)
+    cart = np.einsum('bijk,bkl->bijl', diff, lattices)    # (nbatch, nsite, nsite, 3)
+    cart_shifts = np.einsum('mk,bkl->bml', shifts.astype(float), lattices)    # (nbatch, nimage, 3)
+    # ---------- one image at a time: memory of (nbatch, nsite, nsite)
+    found = []
+    for m in range(len(shifts)):
+        dist = np.sqrt(((cart + cart_shifts[:, m, None, None, :])**2).sum(axis=-1))
+        mask = (dist < rcut) & (dist > 1e-8)
+        if mask.any():
+            b, i, j = np.nonzero(mask)
+            found.append((b, i, j, dist[mask]))
+    if not found:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty, empty, np.zeros(0)
+    return tuple(np.concatenate(x) for x in zip(*found))
+
+
+def pair_distances(lattice, frac_coords, rcut):
+    '''
+    all the pairs (i, j, distance) within rcut for one structure,
+    including periodic images (i.e., a pair can appear several times)
+
+    returns i, j, dist as arrays
+    '''
+    lattice = np.asarray(lattice, dtype=float)
+    frac_coords = np.asarray(frac_coords, dtype=float)
+    shifts = image_shifts(lattice, rcut)
+    diff = frac_coords[None, :, :] - frac_coords[:, None, :]
+    diff -= np.round(diff)
+    cart = diff @ lattice    # (nsite, nsite, 3)
+    cart_shifts = shifts @ lattice    # (nimage, 3)
+    dist = np.linalg.norm(cart[:, :, None, :] + cart_shifts[None, None, :, :], axis=-1)
+    # ---------- select
+    mask = (dist < rcut) & (dist > 1e-8)
+    i, j, _ = np.nonzero(mask)
+    return i, j, dist[mask]
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+#
+# phase_timer.py
+#
+#   2026/10/18
+#   per-phase timing and memory instrumentation for the scripts
+#     - enabled by the environment variable CRYSPY_PROF or the --prof option of the scripts
+#         CRYSPY_PROF=prof.json      write prof.json ({script} and {pid} are replaced)
+#         CRYSPY_PROF=prof_dir/      write prof_dir/{script}_{host}_{pid}.json (many runs in one directory)
+#         CRYSPY_PROF=1              write ./prof_{script}_{pid}.json
+#     - disabled: phase() returns a shared no-op context (no measurement)
+#     - for each phase: wall time, cpu time (this process, and child processes which have exited),
+#       peak RSS (high-water mark of the process at the end of the phase), RSS growth,
+#       and item counts
+#     - phases in the worker processes of -j are not recorded,
+#       their cpu time is in cpu_children_s of the phase which waited for them
+#
+#   output (json, also readable by chrome://tracing and https://ui.perfetto.dev)
+#     {"traceEvents": [{"name": "load", "ph": "X", "ts": us, "dur": us, "pid": ..., "tid": ..., "args": {...}}, ...],
+#      "phases": {"load": {"ncall", "wall_s", "cpu_s", "cpu_children_s", "peak_rss_mb", "rss_growth_mb", "count"}, ...},
+#      "meta": {"script", "argv", "host", "pid", "start", "wall_s", "cpu_s", "peak_rss_mb"}}
+#     nested phases are named by the path, e.g., load/unpickle
+#
+#   use in scripts:
+#     from phase_timer import add_prof_option, phase, start_prof
+#     add_prof_option(parser)
+#     args = parser.parse_args()
+#     start_prof(args.prof)
+#     with phase('write') as ph:
+#         for cid, struc in struc_data.items():
+#             struc.to(fmt='cif', filename=f'{cid}.cif')
+#             ph.add()    # one item, ph.add(n) for n items
+#
+#   aggregate many runs:
+#     phase_timer.py prof_dir/*.json
+#     phase_timer.py prof_dir/*.json --csv phases.csv --merge merged_trace.json
+#
+import argparse
+import atexit
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+
+_state = None    # dict while enabled
+_local = threading.local()
+_PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 1024**2 if hasattr(os, 'sysconf') else None
+
+
+def _peak_rss_mb():
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024**2 if sys.platform == 'darwin' else maxrss / 1024    # bytes on macOS, KB on Linux
+
+
+def _current_rss_mb():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError):
+        return None
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _script_name():
+    name = os.path.splitext(os.path.basename(sys.argv[0]))[0] if sys.argv and sys.argv[0] else ''
+    return name if name and name != '-c' else 'python'
+
+
+def _out_path(spec):
+    script = _script_name()
+    if spec == '1':
+        spec = os.path.join(os.getcwd(), 'prof_{script}_{pid}.json')
+    elif spec.endswith(os.sep) or os.path.isdir(spec):
+        os.makedirs(spec, exist_ok=True)
+        spec = os.path.join(spec, '{script}_' + platform.node() + '_{pid}.json')
+    return os.path.abspath(spec.replace('{script}', script).replace('{pid}', str(os.getpid())))
+
+
+# ---------- phases
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add(self, n=1):
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+
+    def add(self, n=1):
+        self.count += n
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.path = '/'.join(stack + [self.name])
+        stack.append(self.name)
+        self._rss0 = _current_rss_mb()
+        self._cpu0 = time.process_time()
+        self._children0 = _children_cpu()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter()
+        cpu = time.process_time() - self._cpu0
+        children = _children_cpu() - self._children0
+        rss1 = _current_rss_mb()
+        _local.stack.pop()
+        if _state is None:    # stopped inside the phase
+            return False
+        args = {'cpu_s': cpu, 'cpu_children_s': children, 'peak_rss_mb': _peak_rss_mb()}
+        if rss1 is not None and self._rss0 is not None:
+            args['rss_growth_mb'] = rss1 - self._rss0
+        if self.count:
+            args['count'] = self.count
+        with _state['lock']:
+            _state['events'].append({'name': self.path, 'ph': 'X', 'pid': os.getpid(),
+                                     'tid': threading.get_ident() % 2**31,
+                                     'ts': (self._t0 - _state['t0']) * 1e6, 'dur': (t1 - self._t0) * 1e6,
+                                     'args': args})
+        return False
+
+
+def phase(name):
+    '''
+    context manager recording the phase name, a no-op if disabled
+    '''
+    if _state is None:
+        return _NULL_PHASE
+    return _Phase(name)
+
+
+def enabled():
+    return _state is not None
+
+
+# ---------- start and write
+def add_prof_option(parser):
+    parser.add_argument('--prof', help='write per-phase timing and memory to this json file or directory'
+                                       ' (also enabled by CRYSPY_PROF)')
+
+
+def start_prof(spec=None):
+    '''
+    enable recording, spec: output file, directory, or '1' (default: CRYSPY_PROF)
+    the output is written at exit
+    '''
+    global _state
+    spec = spec or os.environ.get('CRYSPY_PROF')
+    if not spec or spec == '0':
+        return
+    if _state is not None:    # already started by CRYSPY_PROF, --prof changes the output
+        _state['path'] = _out_path(spec)
+        return
+    _state = {'path': _out_path(spec), 'events': [], 'lock': threading.Lock(),
+              't0': time.perf_counter(), 'cpu0': time.process_time(), 'start': time.time()}
+    atexit.register(write_prof)
+
+
+def summarize(events):
+    '''
+    {phase path: totals} from trace events
+    '''
+    phases = {}
+    for ev in events:
+        if ev.get('ph') != 'X':
+            continue
+        args = ev.get('args', {})
+        tot = phases.setdefault(ev['name'], {'ncall': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'cpu_children_s': 0.0,
+                                             'peak_rss_mb': 0.0, 'rss_growth_mb': 0.0, 'count': 0})
+        tot['ncall'] += 1
+        tot['wall_s'] += ev['dur'] / 1e6
+        tot['cpu_s'] += args.get('cpu_s', 0.0)
+        tot['cpu_children_s'] += args.get('cpu_children_s', 0.0)
+        tot['peak_rss_mb'] = max(tot['peak_rss_mb'], args.get('peak_rss_mb', 0.0))
+        tot['rss_growth_mb'] += args.get('rss_growth_mb', 0.0)
+        tot['count'] += args.get('count', 0)
+    return phases
+
+
+def write_prof():
+    global _state
+    if _state is None:
+        return
+    state, _state = _state, None
+    meta = {'script': _script_name(), 'argv': sys.argv, 'host': platform.node(), 'pid': os.getpid(),
+            'start': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(state['start'])),
+            'wall_s': time.perf_counter() - state['t0'], 'cpu_s': time.process_time() - state['cpu0'],
+            'cpu_children_s': _children_cpu(), 'peak_rss_mb': _peak_rss_mb()}
+    events = [{'name': 'process_name', 'ph': 'M', 'pid': os.getpid(), 'args': {'name': meta['script']}}]
+    events += sorted(state['events'], key=lambda ev: ev['ts'])
+    os.makedirs(os.path.dirname(state['path']), exist_ok=True)
+    with open(state['path'], 'w') as f:
+        json.dump({'traceEvents': events, 'phases': summarize(events), 'meta': meta}, f)
+
+
+# ---------- CRYSPY_PROF: enabled at import, before the scripts load anything
+start_prof()
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infiles', help='json files written by CRYSPY_PROF or --prof', nargs='+')
+    parser.add_argument('--csv', help='write the table to this csv file')
+    parser.add_argument('--merge', help='write one chrome trace of all the runs to this file')
+    args = parser.parse_args()
+
+    # ---------- aggregate: script, phase
+    rows = {}
+    runs = {}
+    merged = []
+    for ifile, filename in enumerate(args.infiles):
+        with open(filename, 'r') as f:
+            prof = json.load(f)
+        script = prof['meta']['script']
+        runs[script] = runs.get(script, 0) + 1
+        for name, tot in summarize(prof['traceEvents']).items():
+            row = rows.setdefault((script, name), {'nrun': 0, 'ncall': 0, 'wall_s': 0.0, 'wall_max_s': 0.0,
+                                                   'cpu_s': 0.0, 'cpu_children_s': 0.0, 'peak_rss_mb': 0.0,
+                                                   'count': 0})
+            row['nrun'] += 1
+            row['ncall'] += tot['ncall']
+            row['wall_s'] += tot['wall_s']
+            row['wall_max_s'] = max(row['wall_max_s'], tot['wall_s'])
+            row['cpu_s'] += tot['cpu_s']
+            row['cpu_children_s'] += tot['cpu_children_s']
+            row['peak_rss_mb'] = max(row['peak_rss_mb'], tot['peak_rss_mb'])
+            row['count'] += tot['count']
+        if args.merge:
+            # ------ one pid per run: runs on different hosts may have the same pid
+            for ev in prof['traceEvents']:
+                merged.append(dict(ev, pid=ifile))
+
+    # ---------- output
+    header = ['script', 'phase', 'nrun', 'ncall', 'wall_s', 'wall_mean_s', 'wall_max_s', 'cpu_s', 'cpu_children_s',
+              'peak_rss_mb', 'count', 'items_per_s']
+    table = []
+    for (script, name), row in sorted(rows.items(), key=lambda x: -x[1]['wall_s']):
+        rate = row['count'] / row['wall_s'] if row['count'] and row['wall_s'] > 0 else ''
+        table.append([script, name, row['nrun'], row['ncall'], row['wall_s'], row['wall_s'] / row['nrun'],
+                      row['wall_max_s'], row['cpu_s'], row['cpu_children_s'], row['peak_rss_mb'], row['count'], rate])
+    print(f'{"script":<16} {"phase":<28} {"runs":>5} {"wall (s)":>10} {"mean (s)":>9} {"cpu (s)":>9}'
+          f' {"peak MB":>8} {"count":>9} {"items/s":>10}')
+    for row in table:
+        rate = f'{row[11]:10.1f}' if row[11] != '' else f'{"":>10}'
+        print(f'{row[0]:<16} {row[1]:<28} {row[2]:5d} {row[4]:10.3f} {row[5]:9.3f} {row[7]:9.3f}'
+              f' {row[9]:8.1f} {row[10]:9d} {rate}')
+    print(f'{len(args.infiles)} runs: ' + ', '.join(f'{script} {n}' for script, n in sorted(runs.items())))
+    if args.csv:
+        import csv
+
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(table)
+        print(f'Save {args.csv}')
+    if args.merge:
+        with open(args.merge, 'w') as f:
+            json.dump({'traceEvents': merged}, f)
+        print(f'Save {args.merge}')
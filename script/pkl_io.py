@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+#
+# pkl_io.py
+#
+#   2026/10/18
+#   shared loader for pkl_data (scripts and notebooks)
+#     - load_data() opens plain pickle, gzip pickle (.gz), and block-compressed pickle
+#       transparently (the format is detected from the magic bytes, not the extension)
+#     - the file is streamed into pickle.load(), the compressed and decoded bytes are not held as a whole
+#     - decoded objects are memoized, keyed by (path, mtime, size),
+#       total size is capped by CRYSPY_PKL_CACHE_MB (default 1024, 0 disables)
+#     - the same object is returned for repeated calls, do not modify it in place
+#       (or use load_data(filename, cache=False))
+#
+#   block-compressed pickle (xxx.pkl.blk)
+#     magic (8 bytes) + header length (uint32) + header (json) + compressed blocks
+#     header: {"codec": "zstd", "raw_size": n, "raw_sizes": [...], "sizes": [...]}
+#     the pickle (protocol 5) is split into blocks, which are compressed and
+#     decompressed independently in threads (zlib, zstd, and lz4 release the GIL),
+#     a few blocks ahead of pickle.load() (BlockReader)
+#     codec: zstd (zstandard) or lz4 (lz4) if installed, zlib otherwise
+#
+#   example:
+#     pkl_io.py opt_struc_data.pkl.gz    # --> opt_struc_data.pkl.blk
+#     pkl_io.py rslt_data.pkl -o rslt_data.pkl.blk --codec zlib
+#     print_pkl.py opt_struc_data.pkl.blk
+#
+#   use in notebook (cryspy_utility/script in PYTHONPATH, or in CRYSPY_UTILITY_SCRIPT as in the notebooks):
+#     from pkl_io import load_data
+#
+import argparse
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import io
+import json
+import os
+import pickle
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from phase_timer import add_prof_option, phase, start_prof
+
+
+BLOCK_MAGIC = b'CPYBLK1\n'
+BLOCK_SIZE = 4 * 1024**2
+CACHE_MAX = int(float(os.environ.get('CRYSPY_PKL_CACHE_MB', 1024)) * 1024**2)
+NTHREAD = min(8, os.cpu_count() or 1)
+
+_cache = OrderedDict()    # {(path, mtime_ns, size): (obj, nbyte)}
+_cache_nbyte = 0
+_cache_lock = threading.Lock()
+
+
+# ---------- codecs
+def _codec(name):
+    '''
+    return (compress(data, level), decompress(data, raw_size))
+    '''
+    if name == 'zstd':
+        import zstandard
+
+        def compress(data, level):
+            return zstandard.ZstdCompressor(level=3 if level is None else level).compress(data)
+
+        def decompress(data, raw_size):
+            return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_size)
+        return compress, decompress
+    if name == 'lz4':
+        import lz4.frame
+
+        def compress(data, level):
+            return lz4.frame.compress(data, compression_level=0 if level is None else level)
+
+        def decompress(data, raw_size):
+            return lz4.frame.decompress(data)
+        return compress, decompress
+    if name == 'zlib':
+        def compress(data, level):
+            return zlib.compress(data, 6 if level is None else level)
+
+        def decompress(data, raw_size):
+            return zlib.decompress(data, bufsize=raw_size)
+        return compress, decompress
+    raise ValueError(f'Unknown codec: {name}')
+
+
+def available_codecs():
+    codecs = []
+    for name, module in (('zstd', 'zstandard'), ('lz4', 'lz4.frame')):
+        try:
+            __import__(module)
+            codecs.append(name)
+        except ImportError:
+            pass
+    return codecs + ['zlib']
+
+
+def default_codec():
+    return available_codecs()[0]
+
+
+# ---------- block format
+def dumps_blocks(obj, codec=None, level=None, block_size=BLOCK_SIZE, nthread=NTHREAD):
+    codec = default_codec() if codec is None else codec
+    compress, _ = _codec(codec)
+    raw = memoryview(pickle.dumps(obj, protocol=5))
+    blocks = [raw[i:i+block_size] for i in range(0, len(raw), block_size)]
+    with ThreadPoolExecutor(max_workers=nthread) as executor:
+        cblocks = list(executor.map(lambda b: compress(b, level), blocks))
+    header = json.dumps({'codec': codec, 'raw_size': len(raw),
+                         'raw_sizes': [len(b) for b in blocks],
+                         'sizes': [len(c) for c in cblocks]}).encode()
+    return b''.join([BLOCK_MAGIC, struct.pack('<I', len(header)), header] + cblocks)
+
+
+class BlockReader(io.RawIOBase):
+    '''
+    file-like object of the decoded pickle bytes of a block-compressed file
+    blocks are read in order and decompressed in threads, at most nthread blocks ahead,
+    so the memory is a few blocks, not the whole file
+    '''
+    def __init__(self, f, nthread=NTHREAD):
+        super().__init__()
+        self._f = f
+        if f.read(len(BLOCK_MAGIC)) != BLOCK_MAGIC:
+            raise ValueError('Not a block-compressed pickle')
+        (nhead,) = struct.unpack('<I', f.read(4))
+        header = json.loads(f.read(nhead))
+        try:
+            _, self._decompress = _codec(header['codec'])
+        except ImportError:
+            raise SystemExit(f'{header["codec"]} is required to read this file')
+        self._jobs = deque(zip(header['sizes'], header['raw_sizes']))
+        self._nthread = nthread
+        self._executor = ThreadPoolExecutor(max_workers=nthread)
+        self._running = deque()
+        self._block = memoryview(b'')
+        self._pos = 0
+        self._nread = 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._nread
+
+    def readinto(self, b):
+        while self._pos == len(self._block):
+            # ------ keep nthread blocks in flight
+            while self._jobs and len(self._running) < self._nthread:
+                size, raw_size = self._jobs.popleft()
+                self._running.append(self._executor.submit(self._decompress, self._f.read(size), raw_size))
+            if not self._running:
+                return 0
+            self._block = memoryview(self._running.popleft().result())
+            self._pos = 0
+        n = min(len(b), len(self._block) - self._pos)
+        b[:n] = self._block[self._pos:self._pos+n]
+        self._pos += n
+        self._nread += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._executor.shutdown(cancel_futures=True)
+            self._f.close()
+        super().close()
+
+
+def loads_blocks(data, nthread=NTHREAD):
+    '''
+    return decoded pickle bytes (not unpickled)
+    '''
+    with BlockReader(io.BytesIO(data), nthread) as reader:
+        return reader.read()
+
+
+def _open_raw(filename):
+    '''
+    file-like object of the pickle bytes of plain, gzip, or block-compressed file
+    '''
+    f = open(filename, 'rb')
+    magic = f.read(len(BLOCK_MAGIC))
+    f.seek(0)
+    if magic == BLOCK_MAGIC:
+        return io.BufferedReader(BlockReader(f), BLOCK_SIZE)
+    if magic[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=f, mode='rb')
+    return f
+
+
+# ---------- load and dump
+def load_data(filename, cache=True):
+    '''
+    load plain, gzip, or block-compressed pickle, memoized by (path, mtime, size)
+    '''
+    global _cache_nbyte
+    st = os.stat(filename)
+    key = (os.path.abspath(filename), st.st_mtime_ns, st.st_size)
+    if cache and CACHE_MAX > 0:
+        with _cache_lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key][0]
+    # ---------- streamed: the compressed and decoded bytes are never held as a whole
+    with phase('unpickle'), _open_raw(filename) as f:
+        obj = pickle.load(f)
+        nbyte = f.tell()
+    # ---------- memoize, size of the pickle as the memory estimate
+    if cache and CACHE_MAX > 0 and nbyte <= CACHE_MAX:
+        with _cache_lock:
+            for old in [k for k in _cache if k[0] == key[0]]:    # older versions of the file
+                _cache_nbyte -= _cache.pop(old)[1]
+            _cache[key] = (obj, nbyte)
+            _cache_nbyte += nbyte
+            while _cache_nbyte > CACHE_MAX:
+                _, (_, nbyte) = _cache.popitem(last=False)
+                _cache_nbyte -= nbyte
+    return obj
+
+
+def dump_data(obj, filename, codec=None, level=None, block_size=BLOCK_SIZE):
+    '''
+    write obj atomically
+    filename ending with .blk: block-compressed, .gz: gzip, otherwise plain pickle
+    '''
+    with phase('pickle'):
+        if filename.endswith('.blk'):
+            data = dumps_blocks(obj, codec, level, block_size)
+        elif filename.endswith('.gz'):
+            data = gzip.compress(pickle.dumps(obj))
+        else:
+            data = pickle.dumps(obj)
+    with phase('write'):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+
+
+def clear_cache():
+    global _cache_nbyte
+    with _cache_lock:
+        _cache.clear()
+        _cache_nbyte = 0
+
+
+def is_pickle_name(filename):
+    return filename.endswith(('.pkl', '.pkl.gz', '.pkl.blk'))
+
+
+def default_blk_path(filename):
+    for ext in ('.gz', '.blk'):
+        if filename.endswith(ext):
+            filename = filename[:-len(ext)]
+    return filename + '.blk'
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='input file: xxx.pkl, xxx.pkl.gz, or xxx.pkl.blk')
+    parser.add_argument('-o', '--outfile', help='output file: .blk, .gz, or plain pickle (default: xxx.pkl.blk)')
+    parser.add_argument('--codec', help=f'codec for .blk (available: {" ".join(available_codecs())})',
+                        choices=['zstd', 'lz4', 'zlib'])
+    parser.add_argument('--level', help='compression level', type=int)
+    parser.add_argument('--block_mb', help='block size in MB (default 4)', type=float, default=4.0)
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- convert
+    outfile = args.outfile if args.outfile else default_blk_path(args.infile)
+    start = time.perf_counter()
+    obj = load_data(args.infile, cache=False)
+    t_in = time.perf_counter() - start
+    dump_data(obj, outfile, args.codec, args.level, int(args.block_mb * 1024**2))
+    start = time.perf_counter()
+    load_data(outfile, cache=False)
+    t_out = time.perf_counter() - start
+    print(f'{args.infile}: {os.path.getsize(args.infile)/1024**2:.2f} MB, load {t_in:.3f} s')
+    print(f'{outfile}: {os.path.getsize(outfile)/1024**2:.2f} MB, load {t_out:.3f} s')
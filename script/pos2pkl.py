@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 #
 # pos2pkl.py
+#    2026 October 18
+#        read init_POSCARS block by block, parse POSCAR with numpy
+#        jobs option: build structures across a process pool
+#        segment option: append-only init_struc_data.seg (see struc_segment.py)
+#
 #    2023 July 22, T. Yamashita
 #        filter option: remove and sort species
 #        permit_diff_comp option: permit different composition
@@ -10,18 +15,24 @@
 #        pymatgen is required
 #
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import os
 import pickle
 import sys
 
-from pymatgen.core import Structure
+import numpy as np
+from pymatgen.core import Composition, Structure
+
+from phase_timer import add_prof_option, phase, start_prof
+from struc_segment import SegmentData, append_segment
 
 
-def check_append():
-    if os.path.isfile('init_struc_data.pkl'):
-        print('init_struc_data.pkl already exists.')
+def check_append(outfile='init_struc_data.pkl'):
+    if os.path.exists(outfile):
+        print(f'{outfile} already exists.')
         while True:
-            choice = input("Append to init_struc_data.pkl? [y/n]: ").lower()
+            choice = input(f"Append to {outfile}? [y/n]: ").lower()
             if choice in ['y', 'yes']:
                 return True
             elif choice in ['n', 'no']:
@@ -31,17 +42,93 @@ def check_append():
         return False
 
 
-def read_pos(infile, cid, struc_data, comp, permit_diff_comp, filter):
-    tmp_pos = []
+def iter_pos_blocks(infile):
+    '''
+    yield lines of each structure in init_POSCARS without loading the whole file
+    a new block starts at a line with 'ID_'
+    '''
+    block = []
     with open(infile, 'r') as f:
-        lines = f.readlines()
-    for line in lines:
-        if 'ID_' in line:
-            if tmp_pos:
-                tmp_pos = ''.join(tmp_pos)    # line --> str
-                tmp_struc = Structure.from_str(tmp_pos, fmt='poscar')
-                if filter:    # not vacant
-                    tmp_struc = remove_sort(tmp_struc, filter)
+        for line in f:
+            if 'ID_' in line and block:
+                yield block
+                block = []
+            block.append(line)
+    if block:    # for last structure (no ID_ in next line)
+        yield block
+
+
+def parse_pos_block(block):
+    '''
+    POSCAR lines --> lattice, species, frac_coords (numpy arrays)
+    VASP4 format, negative scale (volume), three scale factors, etc. are passed to pymatgen
+    '''
+    try:
+        scale_fields = block[1].split()
+        if len(scale_fields) != 1:    # per-axis scale factors
+            raise ValueError
+        scale = float(scale_fields[0])
+        lattice = np.array([line.split()[:3] for line in block[2:5]], dtype=float)
+        elements = block[5].split()
+        if scale <= 0.0 or not all(x.isalpha() for x in elements):
+            raise ValueError
+        lattice *= scale
+        nats = [int(x) for x in block[6].split()]
+        iline = 7
+        if block[iline].strip()[0] in 'sS':    # Selective dynamics
+            iline += 1
+        cartesian = block[iline].strip()[0] in 'cCkK'
+        iline += 1
+        coords = np.array([line.split()[:3] for line in block[iline:iline+sum(nats)]], dtype=float)
+        if len(coords) != sum(nats):
+            raise ValueError
+        if cartesian:
+            coords = np.linalg.solve(lattice.T, (scale * coords).T).T
+        species = [ele for ele, n in zip(elements, nats) for _ in range(n)]
+    except (ValueError, IndexError):
+        struc = Structure.from_str(''.join(block), fmt='poscar')
+        return struc.lattice.matrix, [site.species_string for site in struc], struc.frac_coords
+    return lattice, species, coords
+
+
+def build_strucs(blocks, filter):
+    strucs = []
+    for block in blocks:
+        lattice, species, frac_coords = parse_pos_block(block)
+        tmp_struc = Structure(lattice, species, frac_coords)
+        if filter:    # not vacant
+            tmp_struc = remove_sort(tmp_struc, filter)
+        strucs.append(tmp_struc)
+    return strucs
+
+
+def gen_batches(infile, batch_size):
+    batch = []
+    for block in iter_pos_blocks(infile):
+        batch.append(block)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_pos(infile, cid, struc_data, comp, permit_diff_comp, filter, njobs=1, chunk=200):
+    '''
+    init_POSCARS is read block by block, and structures are built across
+    a process pool (njobs > 1). only njobs*chunk blocks are in memory at once
+    '''
+    if njobs > 1:
+        executor = ProcessPoolExecutor(max_workers=njobs)
+    try:
+        for batch in gen_batches(infile, njobs*chunk):
+            if njobs > 1:
+                chunks = [batch[i:i+chunk] for i in range(0, len(batch), chunk)]
+                results = executor.map(partial(build_strucs, filter=filter), chunks)
+                strucs = [struc for result in results for struc in result]
+            else:
+                strucs = build_strucs(batch, filter)
+            for tmp_struc in strucs:
                 if not permit_diff_comp:
                     if comp is None:
                         comp = tmp_struc.composition
@@ -52,18 +139,9 @@ def read_pos(infile, cid, struc_data, comp, permit_diff_comp, filter):
                         sys.exit()
                 struc_data[cid] = tmp_struc
                 cid += 1
-                tmp_pos = []
-                tmp_pos.append(line)    # 1st line for new struc
-                continue
-            if not tmp_pos:
-                tmp_pos.append(line)
-        else:
-            tmp_pos.append(line)
-    if tmp_pos:    # for last structure (no ID_ in next line)
-        tmp_pos = ''.join(tmp_pos)    # line --> str
-        tmp_struc = Structure.from_str(tmp_pos, fmt='poscar')
-        struc_data[cid] = tmp_struc
-        cid += 1
+    finally:
+        if njobs > 1:
+            executor.shutdown()
     return cid, struc_data, comp
 
 
@@ -102,7 +180,12 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--single', help='input file: single structure file (POSCAR, cif)', nargs='*')
     parser.add_argument('-f', '--filter', help='filter (sort): remove species and sort', nargs='*')
     parser.add_argument('-p', '--permit_diff_comp', help='flag for permitting different composition', action='store_true')
+    parser.add_argument('-j', '--jobs', help='number of processes for init_POSCARS (default 1)', type=int, default=1)
+    parser.add_argument('--segment', help='write (append) init_struc_data.seg instead of init_struc_data.pkl',
+                        action='store_true')
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
 
     # ---------- if no inputs
     #            ==> args.single: None or []
@@ -119,11 +202,21 @@ if __name__ == '__main__':
     comp = None
 
     # ---------- check init_struc_data
-    append = check_append()
+    outfile = 'init_struc_data.seg' if args.segment else 'init_struc_data.pkl'
+    append = check_append(outfile)
 
     # ---------- read init_struc_data.pkl
-    if append:
-        with open('init_struc_data.pkl', 'rb') as f:
+    #            segment: only the manifest is read
+    if append and args.segment:
+        seg_data = SegmentData(outfile)
+        if seg_data.manifest['comp'] is not None:
+            comp = Composition(seg_data.manifest['comp'])
+        cid = seg_data.next_id()
+        print('\nLoad init_struc_data.seg')
+        print(f'Composition: {comp}')
+        print(f'The number of structures: {len(seg_data)}')
+    elif append:
+        with phase('load'), open('init_struc_data.pkl', 'rb') as f:
             struc_data = pickle.load(f)
         natot = struc_data[0].num_sites
         comp = struc_data[0].composition
@@ -133,15 +226,26 @@ if __name__ == '__main__':
         print(f'The number of structures: {len(struc_data)}')
 
     # ---------- init_POSCARS --> init_struc_data.pkl
-    for x in args.infile:
-        cid, struc_data, comp = read_pos(x, cid, struc_data, comp, args.permit_diff_comp, args.filter)
+    with phase('parse') as ph:
+        cid_start = cid
+        for x in args.infile:
+            cid, struc_data, comp = read_pos(x, cid, struc_data, comp, args.permit_diff_comp, args.filter, args.jobs)
 
-    # ---------- POSCAR, cif --> init_struc_data.pkl
-    for x in args.single:
-        cid, struc_data, comp = read_single(x, cid, struc_data, comp, args.permit_diff_comp, args.filter)
+        # ---------- POSCAR, cif --> init_struc_data.pkl
+        for x in args.single:
+            cid, struc_data, comp = read_single(x, cid, struc_data, comp, args.permit_diff_comp, args.filter)
+        ph.add(cid - cid_start)
 
     # ---------- save
+    if args.segment:
+        if not struc_data:
+            sys.exit('\nNo structure to append')
+        with phase('write'):
+            segfile = append_segment(outfile, struc_data, comp)
+        print(f'\nConverted. The number of structures: {cid}')
+        print(f'Save {outfile}/{segfile}')
+        sys.exit()
     print(f'\nConverted. The number of structures: {len(struc_data)}')
-    with open('init_struc_data.pkl', 'wb') as f:
+    with phase('write'), open('init_struc_data.pkl', 'wb') as f:
         pickle.dump(struc_data, f)
     print('Save init_struc_data.pkl')
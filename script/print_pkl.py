@@ -3,20 +3,29 @@
 # print_pkl.py
 #
 #   yyyy/mm/dd
+#   2026/10/18
+#   read xxx_struc_data.store (see struc_store.py)
+#   read init_struc_data.seg (see struc_segment.py)
+#   read block-compressed pickle xxx.pkl.blk (see pkl_io.py)
+#
 #   2024/??/?? T. Yamashita
 #
 import argparse
-import gzip
+import os
 from pathlib import Path
-import pickle
 from pprint import pprint
 
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+
 
 def extract_pkl_name(filepath):
     path = Path(filepath)
     filename = path.name
-    if filename.endswith('.gz'):
+    if filename.endswith('.gz') or filename.endswith('.blk'):
         filename = Path(filename).stem
+    if filename.endswith('.store') or filename.endswith('.seg'):
+        filename = Path(filename).stem + '.pkl'
     return filename
 
 
@@ -70,21 +79,29 @@ if __name__ == '__main__':
     # ---------- argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('infile', help='input file')
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
 
     # ---------- extract pkl_name
     #     e.g.
     #     ./data/pkl_data/init_struc_data.pkl --> init_struc_data.pkl
     #     ./data/pkl_data/init_struc_data.pkl.gz --> init_struc_data.pkl
+    #     ./data/pkl_data/init_struc_data.pkl.blk --> init_struc_data.pkl
+    #     ./data/pkl_data/init_struc_data.store --> init_struc_data.pkl
+    #     ./data/pkl_data/init_struc_data.seg --> init_struc_data.pkl
     pkl_name = extract_pkl_name(args.infile)
 
     # ---------- load pkl data
-    if args.infile.endswith('.gz'):
-        with gzip.open(args.infile, 'rb') as f:
-            pkl_data = pickle.load(f)
-    else:
-        with open(args.infile, 'rb') as f:
-            pkl_data = pickle.load(f)
+    #            store: only the index is read
+    #            numpy is imported only for a store or segment directory
+    with phase('load'):
+        if os.path.isdir(args.infile):
+            from struc_store import open_struc_data
+
+            pkl_data = open_struc_data(args.infile)
+        else:
+            pkl_data = load_data(args.infile)
 
     # ---------- print pkl data
     if pkl_name in [
@@ -1,54 +1,95 @@
 #!/usr/bin/env python3
-
+#
+# qe2vasp_cif.py
+#   2026/10/18
+#   pwscf.out is memory-mapped and searched backward from the end
+#   for the last CELL_PARAMETERS and ATOMIC_POSITIONS in one pass
+#   --batch option: convert many work directories across a process pool
+#
+#   example
+#     qe2vasp_cif.py pwscf.in    # --> in_struc.vasp, in_struc.cif
+#     qe2vasp_cif.py pwscf.in pwscf.out    # --> out_struc.vasp, out_struc.cif
+#     - batch mode, work/*/pwscf.in and work/*/pwscf.out with 8 processes
+#       output: .pkl ({cid: Structure}), .store (see struc_store.py),
+#               or multi-structure POSCAR file with ID_xx lines (readable by pos2pkl.py)
+#       qe2vasp_cif.py --batch 'work/*' -j 8 -o qe_struc_data.pkl
+#
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import glob
+import mmap
+import os
+import pickle
 import sys
 
-from pymatgen.core import Structure
-from pymatgen.core.units import Length
-from pymatgen.io.cif import CifWriter
+from phase_timer import add_prof_option, phase, start_prof
 
 
 def get_natot(filename):
     with open(filename, 'r') as f:
-        lines = f.readlines()
-    for line in lines:
-        if 'nat' in line:
-            nat = int(line.split()[-1])
-            break
+        for line in f:
+            if 'nat' in line:
+                nat = int(line.split()[-1])
+                break
 
     return nat
 
 
+def _block_from_mmap(mm, keyword, nline):
+    # ---------- last line containing keyword and the following lines
+    ipos = mm.rfind(keyword)    # search backward from the end of file
+    if ipos < 0:
+        return None
+    ipos = mm.rfind(b'\n', 0, ipos) + 1    # beginning of the line
+    lines = []
+    for _ in range(nline):
+        iend = mm.find(b'\n', ipos)
+        if iend < 0:    # last line without newline
+            if ipos < len(mm):
+                lines.append(mm[ipos:].decode())
+            break
+        lines.append(mm[ipos:iend+1].decode())
+        ipos = iend + 1
+    return lines
+
+
+def extract_last_blocks(filename, natot):
+    '''
+    last CELL_PARAMETERS (4 lines) and ATOMIC_POSITIONS (natot + 1 lines)
+    the file is memory-mapped, so only the pages near the end are read
+    in the usual case. None if not found.
+    '''
+    with open(filename, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:    # empty file
+            return None, None
+        with mm:
+            lines_atom = _block_from_mmap(mm, b'ATOMIC_POSITIONS', natot + 1)
+            lines_cell = _block_from_mmap(mm, b'CELL_PARAMETERS', 4)
+
+    return lines_cell, lines_atom
+
+
 def extract_cell_parameters(filename):
     # ---------- last CELL_PARAMETERS
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    lines_cell = None
-    for i, line in enumerate(reversed(lines)):
-        if 'CELL_PARAMETERS' in line:
-            ibegin = len(lines) - 1 - i
-            iend = ibegin + 4
-            lines_cell = lines[ibegin:iend]
-            break
+    lines_cell, _ = extract_last_blocks(filename, 0)
 
     return lines_cell
 
 
 def extract_atomic_positions(filename, natot):
     # ---------- last ATOMIC_POSITIONS
-    with open(filename, 'r') as f:
-        lines = f.readlines()
-    lines_atom = None
-    for i, line in enumerate(reversed(lines)):
-        if 'ATOMIC_POSITIONS' in line:
-            ibegin = len(lines) - 1 - i
-            iend = ibegin + natot + 1
-            lines_atom = lines[ibegin:iend]
-            break
+    _, lines_atom = extract_last_blocks(filename, natot)
 
     return lines_atom
 
 
 def from_lines(lines_cell, lines_atom):
+    from pymatgen.core import Structure
+    from pymatgen.core.units import Length
+
     # ---------- lattice
     unit = lines_cell[0].split()[1]
     if unit[0] == '(' and unit[-1] == ')':
@@ -84,33 +125,136 @@ def from_lines(lines_cell, lines_atom):
     return structure
 
 
-def out_struc(fin, fout, tolerance=0.1):
+def get_out_struc(fin, fout):
     natot = get_natot(fin)
-    lines_cell = extract_cell_parameters(fout)
+    lines_cell, lines_atom = extract_last_blocks(fout, natot)
     if lines_cell is None:    # in 'relax' mode, no CELL_PARAMETERS
         lines_cell = extract_cell_parameters(fin)    # get CELL_PARAMETERS from input
-    lines_atom = extract_atomic_positions(fout, natot)
+    if lines_cell is None or lines_atom is None:
+        raise ValueError(f'CELL_PARAMETERS or ATOMIC_POSITIONS not found in {fin}, {fout}')
     structure = from_lines(lines_cell, lines_atom)    # pymatgen format
-    structure.to(fmt='poscar', filename='out_struc.vasp')
-    cif = CifWriter(structure, symprec=tolerance)
-    cif.write_file('out_struc.cif')
+
+    return structure
+
+
+def out_struc(fin, fout, tolerance=0.1):
+    from pymatgen.io.cif import CifWriter
+
+    with phase('parse'):
+        structure = get_out_struc(fin, fout)
+    with phase('symmetrize'):
+        cif = CifWriter(structure, symprec=tolerance)
+    with phase('write'):
+        structure.to(fmt='poscar', filename='out_struc.vasp')
+        cif.write_file('out_struc.cif')
 
 
 def in_struc(fin, tolerance=0.001):
-    natot = get_natot(fin)
-    lines_cell = extract_cell_parameters(fin)
-    lines_atom = extract_atomic_positions(fin, natot)
-    structure = from_lines(lines_cell, lines_atom)    # pymatgen format
-    structure.to(fmt='poscar', filename='in_struc.vasp')
-    cif = CifWriter(structure, symprec=tolerance)
-    cif.write_file('in_struc.cif')
+    from pymatgen.io.cif import CifWriter
+
+    with phase('parse'):
+        natot = get_natot(fin)
+        lines_cell, lines_atom = extract_last_blocks(fin, natot)
+        structure = from_lines(lines_cell, lines_atom)    # pymatgen format
+    with phase('symmetrize'):
+        cif = CifWriter(structure, symprec=tolerance)
+    with phase('write'):
+        structure.to(fmt='poscar', filename='in_struc.vasp')
+        cif.write_file('in_struc.cif')
+
+
+def convert_dir(workdir, fin, fout):
+    '''
+    return (workdir, structure, None) or (workdir, None, error message)
+    '''
+    try:
+        structure = get_out_struc(os.path.join(workdir, fin), os.path.join(workdir, fout))
+    except Exception as e:
+        return workdir, None, f'{type(e).__name__}: {e}'
+    return workdir, structure, None
+
+
+def dir_key(workdir):
+    # ---------- work/12 --> 12 (structure ID), otherwise the path
+    name = os.path.basename(os.path.normpath(workdir))
+    return int(name) if name.isdigit() else workdir
+
+
+def batch_convert(patterns, fin, fout, njobs=1):
+    '''
+    convert all the directories matched by patterns
+    failures are printed and skipped
+    '''
+    workdirs = sorted({d for pattern in patterns for d in glob.glob(pattern) if os.path.isdir(d)})
+    workdirs = [d for d in workdirs if os.path.isfile(os.path.join(d, fout))]
+    struc_data = {}
+    nfail = 0
+    if njobs == 1:
+        results = (convert_dir(d, fin, fout) for d in workdirs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=njobs)
+        results = executor.map(partial(convert_dir, fin=fin, fout=fout), workdirs,
+                               chunksize=max(1, len(workdirs) // (4*njobs)))
+    try:
+        for workdir, structure, error in results:
+            if structure is None:
+                print(f'Failed: {workdir}: {error}', file=sys.stderr)
+                nfail += 1
+                continue
+            struc_data[dir_key(workdir)] = structure
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return struc_data, nfail
+
+
+def write_batch(struc_data, outfile):
+    if outfile.endswith('.pkl'):
+        with open(outfile, 'wb') as f:
+            pickle.dump(struc_data, f)
+    elif outfile.endswith('.store'):
+        from struc_store import write_store
+
+        if not all(isinstance(k, int) for k in struc_data):
+            raise SystemExit('Error! .store needs directories named by structure ID')
+        write_store(struc_data, outfile)
+    else:
+        with open(outfile, 'w') as f:
+            # ------ integer IDs in numerical order (pos2pkl.py numbers the blocks in file order)
+            for key in sorted(struc_data, key=lambda k: (not isinstance(k, int), k if isinstance(k, int) else str(k))):
+                poscar = struc_data[key].to(fmt='poscar')
+                f.write(f'ID_{key}\n' + poscar.split('\n', 1)[1])
 
 
 if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser(usage='[python] qe2vasp_cif.py pwscf.in [pwscf.out]'
+                                           '\n       [python] qe2vasp_cif.py --batch DIR [DIR ...] [-j JOBS] [-o OUTFILE]')
+    parser.add_argument('infiles', help='pwscf.in [pwscf.out]', nargs='*')
+    parser.add_argument('-b', '--batch', help='work directories or glob patterns, e.g., --batch \'work/*\'', nargs='+')
+    parser.add_argument('-j', '--jobs', help='number of processes for batch mode (default 1)', type=int, default=1)
+    parser.add_argument('-o', '--outfile', help='output of batch mode: .pkl, .store, or multi POSCAR (default: qe_struc_data.pkl)',
+                        default='qe_struc_data.pkl')
+    parser.add_argument('--fin', help='input file name in each directory (default: pwscf.in)', default='pwscf.in')
+    parser.add_argument('--fout', help='output file name in each directory (default: pwscf.out)', default='pwscf.out')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
 
-    if len(sys.argv) == 2:    # qe2vasp_cif pwscf.in --> in_struc.xxx
-        in_struc(sys.argv[1])
-    elif len(sys.argv) == 3:    # qe2vasp_cif pwscf.in pwscf.out --> out_struc.xxx
-        out_struc(sys.argv[1], sys.argv[2])
+    # ---------- batch mode
+    if args.batch:
+        with phase('parse') as ph:
+            struc_data, nfail = batch_convert(args.batch, args.fin, args.fout, args.jobs)
+            ph.add(len(struc_data))
+        with phase('write') as ph:
+            write_batch(struc_data, args.outfile)
+            ph.add(len(struc_data))
+        print(f'Converted: {len(struc_data)}, Failed: {nfail}')
+        print(f'Save {args.outfile}')
+    elif len(args.infiles) == 1:    # qe2vasp_cif pwscf.in --> in_struc.xxx
+        in_struc(args.infiles[0])
+    elif len(args.infiles) == 2:    # qe2vasp_cif pwscf.in pwscf.out --> out_struc.xxx
+        out_struc(args.infiles[0], args.infiles[1])
     else:
         raise SystemExit('Usage: [python] qe2vasp_cif.py pwscf.in [pwscf.out] ')
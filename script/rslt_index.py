@@ -0,0 +1,118 @@
+#
+# rslt_index.py
+#
+#   2026/10/18
+#   small persisted index over rslt_data.pkl (and nat_data.pkl for EA-vc)
+#   for queries in extract_struc.py
+#     - numpy and pandas are required
+#     - rslt_index.npz is saved in the same directory as rslt_data.pkl
+#       and rebuilt only when rslt_data.pkl or nat_data.pkl is modified (mtime, size)
+#     - top k is selected by np.argpartition, only the selected IDs are sorted
+#
+#   arrays in rslt_index.npz
+#     signature   int64 (4,): mtime_ns and size of rslt_data.pkl and nat_data.pkl
+#     ids         int64 (n,)
+#     energy      float64 (n,): E_eV_atom, nan for failed structures
+#     spg         int64 (n,): Spg_num_opt, 0 if unknown
+#     gen         int64 (n,): Gen for EA, -1 otherwise
+#     nat         int64 (n, ntype): nat_data for EA-vc, (n, 0) otherwise
+#
+import os
+import tempfile
+
+import numpy as np
+
+from pkl_io import load_data
+
+
+INDEX_VERSION = 1
+
+
+def _signature(path):
+    if not os.path.isfile(path):
+        return [0, 0]
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def build_rslt_index(rslt_path, nat_path):
+    rslt_data = load_data(rslt_path)
+    n = len(rslt_data)
+    index = {
+        'version': np.array(INDEX_VERSION),
+        'ids': rslt_data.index.to_numpy(dtype=np.int64),
+        'energy': rslt_data['E_eV_atom'].to_numpy(dtype=np.float64),
+        'spg': np.zeros(n, dtype=np.int64),
+        'gen': np.full(n, -1, dtype=np.int64),
+        'nat': np.zeros((n, 0), dtype=np.int64),
+    }
+    if 'Spg_num_opt' in rslt_data.columns:
+        index['spg'] = rslt_data['Spg_num_opt'].fillna(0).to_numpy(dtype=np.int64)
+    if 'Gen' in rslt_data.columns:
+        index['gen'] = rslt_data['Gen'].fillna(-1).to_numpy(dtype=np.int64)
+    nat_data = load_data(nat_path) if os.path.isfile(nat_path) else {}
+    if nat_data:    # not empty
+        ntype = len(next(iter(nat_data.values())))
+        index['nat'] = np.array([nat_data.get(cid, (-1,)*ntype) for cid in index['ids']],
+                                dtype=np.int64).reshape(n, ntype)
+    return index
+
+
+def load_rslt_index(pkl_dir):
+    '''
+    load rslt_index.npz in pkl_dir, rebuild it if rslt_data.pkl or nat_data.pkl is modified
+    '''
+    rslt_path = os.path.join(pkl_dir, 'rslt_data.pkl')
+    nat_path = os.path.join(pkl_dir, 'nat_data.pkl')
+    index_path = os.path.join(pkl_dir, 'rslt_index.npz')
+    signature = np.array(_signature(rslt_path) + _signature(nat_path), dtype=np.int64)
+    if os.path.isfile(index_path):
+        with np.load(index_path) as npz:
+            if int(npz['version']) == INDEX_VERSION and np.array_equal(npz['signature'], signature):
+                return {key: npz[key] for key in npz.files}
+    index = build_rslt_index(rslt_path, nat_path)
+    index['signature'] = signature
+    # ---------- atomic write: extract_struc.py running at the same time never reads a partial file
+    try:
+        fd, tmp = tempfile.mkstemp(dir=pkl_dir, suffix='.npz.tmp')
+    except OSError:    # e.g. read-only directory
+        return index
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **index)
+        os.replace(tmp, index_path)
+    except OSError:
+        os.remove(tmp)
+    return index
+
+
+def query(index, k=None, ewin=None, spg=None, gen=None, nat=None):
+    '''
+    IDs sorted by energy which satisfy all the given conditions
+
+    k: top k
+    ewin: E_eV_atom - Emin <= ewin (eV/atom)
+    spg: list of space group numbers
+    gen: (gen_min, gen_max), inclusive
+    nat: tuple of the number of atoms for each atom type (EA-vc)
+    '''
+    energy = index['energy']
+    mask = ~np.isnan(energy)
+    if not mask.any():
+        return []
+    if ewin is not None:
+        mask &= energy - energy[mask].min() <= ewin
+    if spg:
+        mask &= np.isin(index['spg'], spg)
+    if gen is not None:
+        mask &= (gen[0] <= index['gen']) & (index['gen'] <= gen[1])
+    if nat is not None:
+        if index['nat'].shape[1] != len(nat):
+            raise ValueError(f'nat_data.pkl is not found or len(nat) != {index["nat"].shape[1]}')
+        mask &= (index['nat'] == np.array(nat)).all(axis=1)
+    sel = np.flatnonzero(mask)
+    # ---------- top k: partial selection, then sort only k
+    if k is not None and k < len(sel):
+        sel = sel[np.argpartition(energy[sel], k - 1)[:k]]
+    sel = sel[np.argsort(energy[sel], kind='stable')]
+    return [int(cid) for cid in index['ids'][sel]]
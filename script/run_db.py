@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+#
+# run_db.py
+#
+#   2026/10/18
+#   cross-run results index: many CrySPY run directories --> one SQLite database
+#     - pandas is required (to read rslt_data.pkl), sqlite3 is in the standard library
+#     - a run directory is a directory with pkl_data/rslt_data.pkl
+#       (directories below a run directory, e.g., work/ and data/, are not searched)
+#     - run settings: input_data.pkl (cryspy is required to unpickle it),
+#       or cryspy.in in the run directory if input_data.pkl cannot be read
+#     - runs are parsed across a process pool and written in one transaction
+#     - rescan: only runs whose input_data.pkl, rslt_data.pkl, nat_data.pkl, or cryspy.in
+#       changed (mtime, size) are parsed again, runs which disappeared from the scanned trees are removed
+#
+#   tables
+#     runs      run_id, path, algo, calc_code, atype ('Si O'), nat ('8 16', NULL for EA-vc), natot,
+#               tot_struc, settings (json of input_data), nstruc, signature, scanned (unix time)
+#     strucs    run_id, cid, gen, spg_num, spg_sym, spg_num_opt, spg_sym_opt, energy (E_eV_atom),
+#               magmom, opt, formula ('Si8O16'), composition (reduced formula, 'SiO2'), natot
+#   indexes: strucs(energy), strucs(composition, energy), strucs(run_id, gen), runs(algo), runs(calc_code)
+#
+#   example:
+#     run_db.py scan ~/cryspy_runs -j 8                        # --> cryspy_runs.db
+#     run_db.py best -k 10                                     # global best 10 structures
+#     run_db.py best -k 5 --comp SiO2 --algo EA --gen 3 10
+#     run_db.py runs --calc_code VASP
+#     run_db.py sql "SELECT algo, COUNT(*), MIN(energy) FROM strucs JOIN runs USING(run_id) GROUP BY algo"
+#     extract_struc.py $(run_db.py best -k 1 --path_only)/pkl_data/opt_struc_data.pkl -i 7
+#
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import configparser
+from functools import reduce
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+
+from phase_timer import add_prof_option, phase, start_prof
+
+
+DB_VERSION = 1
+SIGNATURE_FILES = ['pkl_data/input_data.pkl', 'pkl_data/rslt_data.pkl', 'pkl_data/nat_data.pkl', 'cryspy.in']
+SKIP_DIRS = {'pkl_data', 'work', 'data', 'ext', 'calc_in', 'backup', '.git', '__pycache__'}
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    algo TEXT,
+    calc_code TEXT,
+    atype TEXT,
+    nat TEXT,
+    natot INTEGER,
+    tot_struc INTEGER,
+    settings TEXT,
+    nstruc INTEGER,
+    signature TEXT,
+    scanned REAL
+);
+CREATE TABLE IF NOT EXISTS strucs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    cid INTEGER NOT NULL,
+    gen INTEGER,
+    spg_num INTEGER,
+    spg_sym TEXT,
+    spg_num_opt INTEGER,
+    spg_sym_opt TEXT,
+    energy REAL,
+    magmom REAL,
+    opt TEXT,
+    formula TEXT,
+    composition TEXT,
+    natot INTEGER,
+    PRIMARY KEY (run_id, cid)
+);
+CREATE INDEX IF NOT EXISTS strucs_energy ON strucs(energy);
+CREATE INDEX IF NOT EXISTS strucs_comp_energy ON strucs(composition, energy);
+CREATE INDEX IF NOT EXISTS strucs_run_gen ON strucs(run_id, gen);
+CREATE INDEX IF NOT EXISTS runs_algo ON runs(algo);
+CREATE INDEX IF NOT EXISTS runs_calc_code ON runs(calc_code);
+'''
+# ---------- rslt_data column --> strucs column
+RSLT_COLUMNS = {'Gen': 'gen', 'Spg_num': 'spg_num', 'Spg_sym': 'spg_sym', 'Spg_num_opt': 'spg_num_opt',
+                'Spg_sym_opt': 'spg_sym_opt', 'E_eV_atom': 'energy', 'Magmom': 'magmom', 'Opt': 'opt'}
+STRUC_COLUMNS = ['run_id', 'cid'] + list(RSLT_COLUMNS.values()) + ['formula', 'composition', 'natot']
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA journal_mode=WAL')    # queries are not blocked during a scan
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version not in (0, DB_VERSION):
+        raise SystemExit(f'Error! {db_path}: unsupported version {version}')
+    conn.executescript(SCHEMA)
+    conn.execute(f'PRAGMA user_version = {DB_VERSION}')
+    return conn
+
+
+# ---------- scan
+def signature(run_dir):
+    sig = []
+    for name in SIGNATURE_FILES:
+        path = os.path.join(run_dir, name)
+        if os.path.isfile(path):
+            st = os.stat(path)
+            sig.append([name, st.st_mtime_ns, st.st_size])
+    return json.dumps(sig)
+
+
+def find_runs(roots):
+    '''
+    run directories (absolute paths) under roots
+    '''
+    runs = []
+    for root in roots:
+        for dirpath, dirnames, _ in os.walk(os.path.abspath(root)):
+            if os.path.isfile(os.path.join(dirpath, 'pkl_data', 'rslt_data.pkl')):
+                runs.append(dirpath)
+                dirnames[:] = []    # no nested runs
+                continue
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+    return runs
+
+
+def _plain(value):
+    # ---------- json-friendly value of input_data
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_plain(x) for x in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if hasattr(value, 'tolist'):    # numpy
+        return _plain(value.tolist())
+    return str(value)
+
+
+def read_settings(run_dir):
+    '''
+    settings dict from input_data.pkl, or cryspy.in
+    '''
+    from pkl_io import load_data
+
+    input_path = os.path.join(run_dir, 'pkl_data', 'input_data.pkl')
+    if os.path.isfile(input_path):
+        try:
+            rin = load_data(input_path, cache=False)
+            return {k: _plain(v) for k, v in vars(rin).items() if not k.startswith('_')}
+        except Exception:    # e.g., cryspy is not installed
+            pass
+    config = configparser.ConfigParser()
+    config.read(os.path.join(run_dir, 'cryspy.in'))
+    settings = {}
+    for section in config.sections():
+        for key, value in config.items(section):
+            settings[key] = value
+    # ------ same types as input_data
+    for key in ('atype', 'nat'):
+        if key in settings:
+            settings[key] = settings[key].split()
+    if 'nat' in settings:
+        settings['nat'] = [int(n) for n in settings['nat']]
+    for key in ('natot', 'tot_struc'):
+        if key in settings:
+            settings[key] = int(settings[key])
+    return settings
+
+
+def formula(atype, nat):
+    '''
+    ('Si O', (8, 16)) --> 'Si8O16', 'SiO2'
+    '''
+    nonzero = [(a, int(n)) for a, n in zip(atype, nat) if n > 0]
+    if not nonzero:
+        return None, None
+    div = reduce(math.gcd, [n for _, n in nonzero])
+    full = ''.join(f'{a}{n}' for a, n in nonzero)
+    reduced = ''.join(f'{a}{n // div}' if n // div > 1 else a for a, n in nonzero)
+    return full, reduced
+
+
+def _int(value):
+    return None if value is None or value != value else int(value)    # None or nan
+
+
+def _float(value):
+    return None if value is None or value != value else float(value)
+
+
+def parse_run(run_dir):
+    '''
+    run in a worker process, return (run_dir, signature, run row dict, struc rows, error)
+    '''
+    from pkl_io import load_data
+
+    sig = signature(run_dir)
+    try:
+        settings = read_settings(run_dir)
+        rslt_data = load_data(os.path.join(run_dir, 'pkl_data', 'rslt_data.pkl'), cache=False)
+        nat_path = os.path.join(run_dir, 'pkl_data', 'nat_data.pkl')
+        nat_data = load_data(nat_path, cache=False) if os.path.isfile(nat_path) else None
+    except Exception as e:
+        return run_dir, sig, None, [], f'{type(e).__name__}: {e}'
+    atype = settings.get('atype') or []
+    nat = settings.get('nat')
+    run = {'algo': settings.get('algo'), 'calc_code': settings.get('calc_code'),
+           'atype': ' '.join(atype) if atype else None,
+           'nat': ' '.join(str(n) for n in nat) if nat and nat_data is None else None,
+           'natot': _int(settings.get('natot')), 'tot_struc': _int(settings.get('tot_struc')),
+           'settings': json.dumps(settings)}
+    # ---------- per-structure rows
+    columns = {col: rslt_data[col].tolist() if col in rslt_data.columns else [None]*len(rslt_data)
+               for col in RSLT_COLUMNS}
+    fixed = formula(atype, nat) if nat and nat_data is None else (None, None)
+    rows = []
+    for k, cid in enumerate(rslt_data.index.tolist()):
+        cid = int(cid)
+        if nat_data is not None and cid in nat_data:
+            full, reduced = formula(atype, nat_data[cid])
+            natot = int(sum(nat_data[cid]))
+        else:
+            full, reduced = fixed
+            natot = run['natot']
+        rows.append((cid, _int(columns['Gen'][k]), _int(columns['Spg_num'][k]), columns['Spg_sym'][k],
+                     _int(columns['Spg_num_opt'][k]), columns['Spg_sym_opt'][k],
+                     _float(columns['E_eV_atom'][k]), _float(columns['Magmom'][k]), columns['Opt'][k],
+                     full, reduced, natot))
+    return run_dir, sig, run, rows, None
+
+
+def scan(conn, roots, njobs=1, force=False):
+    '''
+    parse new and changed runs under roots, remove runs which disappeared
+    '''
+    with phase('find') as ph:
+        run_dirs = find_runs(roots)
+        ph.add(len(run_dirs))
+    known = {path: (run_id, sig) for run_id, path, sig in conn.execute('SELECT run_id, path, signature FROM runs')}
+    todo = [run_dir for run_dir in run_dirs
+            if force or run_dir not in known or known[run_dir][1] != signature(run_dir)]
+    # ------ removed runs under the scanned roots
+    found = set(run_dirs)
+    prefixes = tuple(os.path.join(os.path.abspath(root), '') for root in roots)
+    removed = [run_id for path, (run_id, _) in known.items()
+               if path not in found and (path + os.sep).startswith(prefixes)]
+
+    nstruc, errors = 0, []
+    with phase('parse') as ph, conn:    # one transaction
+        for run_id in removed:
+            conn.execute('DELETE FROM strucs WHERE run_id = ?', (run_id,))
+            conn.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+        if njobs > 1 and len(todo) > 1:
+            executor = ProcessPoolExecutor(max_workers=njobs)
+            results = (future.result() for future in as_completed([executor.submit(parse_run, d) for d in todo]))
+        else:
+            executor = None
+            results = (parse_run(d) for d in todo)
+        try:
+            for run_dir, sig, run, rows, error in results:
+                if error is not None:
+                    errors.append((run_dir, error))
+                    continue
+                run_id = _upsert_run(conn, run_dir, sig, run, len(rows))
+                conn.execute('DELETE FROM strucs WHERE run_id = ?', (run_id,))
+                conn.executemany(f'INSERT INTO strucs ({", ".join(STRUC_COLUMNS)})'
+                                 f' VALUES ({", ".join("?"*len(STRUC_COLUMNS))})',
+                                 [(run_id,) + row for row in rows])
+                nstruc += len(rows)
+                ph.add()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    conn.execute('ANALYZE')    # statistics for the query planner
+    return len(run_dirs), len(todo) - len(errors), len(removed), nstruc, errors
+
+
+def _upsert_run(conn, run_dir, sig, run, nstruc):
+    values = dict(run, path=run_dir, signature=sig, nstruc=nstruc, scanned=time.time())
+    row = conn.execute('SELECT run_id FROM runs WHERE path = ?', (run_dir,)).fetchone()
+    if row is None:
+        cur = conn.execute(f'INSERT INTO runs ({", ".join(values)}) VALUES ({", ".join("?"*len(values))})',
+                           list(values.values()))
+        return cur.lastrowid
+    conn.execute(f'UPDATE runs SET {", ".join(f"{k} = ?" for k in values)} WHERE run_id = ?',
+                 list(values.values()) + [row[0]])
+    return row[0]
+
+
+# ---------- query
+def best(conn, k=10, comp=None, algo=None, calc_code=None, atype=None, gen=None, path=None):
+    '''
+    lowest energy structures over all runs, [(path, cid, energy, composition, spg_sym_opt, algo, gen), ...]
+    '''
+    where = ['s.energy IS NOT NULL']
+    params = []
+    if comp:
+        where.append('s.composition = ?')
+        params.append(comp)
+    if algo:
+        where.append('r.algo = ?')
+        params.append(algo)
+    if calc_code:
+        where.append('r.calc_code = ?')
+        params.append(calc_code)
+    if atype:
+        where.append('r.atype = ?')
+        params.append(' '.join(atype))
+    if gen:
+        where.append('s.gen BETWEEN ? AND ?')
+        params += list(gen)
+    if path:
+        where.append('r.path LIKE ?')
+        params.append(f'%{path}%')
+    sql = ('SELECT r.path, s.cid, s.energy, s.composition, s.spg_sym_opt, s.spg_num_opt, r.algo, s.gen'
+           ' FROM strucs s JOIN runs r ON s.run_id = r.run_id'
+           f' WHERE {" AND ".join(where)} ORDER BY s.energy LIMIT ?')
+    return conn.execute(sql, params + [k]).fetchall()
+
+
+def out_table(header, rows):
+    widths = [max([len(str(h))] + [len(_fmt(row[i])) for row in rows]) for i, h in enumerate(header)]
+    print('  '.join(f'{h:<{w}}' for h, w in zip(header, widths)))
+    for row in rows:
+        print('  '.join(f'{_fmt(x):<{w}}' for x, w in zip(row, widths)))
+
+
+def _fmt(value):
+    if isinstance(value, float):
+        return f'{value:.6f}'
+    return '' if value is None else str(value)
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', '--db', help='database file (default: cryspy_runs.db)', default='cryspy_runs.db')
+    add_prof_option(parser)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    # ------ scan
+    p_scan = subparsers.add_parser('scan', help='scan run directories into the database')
+    p_scan.add_argument('roots', help='directories to search for runs (default: .)', nargs='*', default=['.'])
+    p_scan.add_argument('-j', '--jobs', help='number of processes (default 1)', type=int, default=1)
+    p_scan.add_argument('-f', '--force', help='parse all the runs even if unchanged', action='store_true')
+    # ------ best
+    p_best = subparsers.add_parser('best', help='lowest energy structures over all runs')
+    p_best.add_argument('-k', help='number of structures (default 10)', type=int, default=10)
+    p_best.add_argument('--comp', help='reduced formula, e.g., --comp SiO2')
+    p_best.add_argument('--algo', help='algorithm, e.g., --algo EA')
+    p_best.add_argument('--calc_code', help='calc_code, e.g., --calc_code VASP')
+    p_best.add_argument('--atype', help='atom types, e.g., --atype Si O', nargs='+')
+    p_best.add_argument('--gen', help='range of generation in EA (inclusive), e.g., --gen 3 10', type=int, nargs=2)
+    p_best.add_argument('--path', help='substring of the run directory, e.g., --path 10GPa')
+    p_best.add_argument('--path_only', help='print only the run directory of the best structure',
+                        action='store_true')
+    # ------ runs
+    p_runs = subparsers.add_parser('runs', help='list runs')
+    p_runs.add_argument('--algo', help='algorithm, e.g., --algo EA')
+    p_runs.add_argument('--calc_code', help='calc_code, e.g., --calc_code VASP')
+    # ------ sql
+    p_sql = subparsers.add_parser('sql', help='run an SQL query')
+    p_sql.add_argument('query', help='SQL, e.g., "SELECT COUNT(*) FROM strucs"')
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    conn = connect(args.db)
+
+    # ---------- scan
+    if args.command == 'scan':
+        start = time.perf_counter()
+        nrun, nparsed, nremoved, nstruc, errors = scan(conn, args.roots, args.jobs, args.force)
+        for run_dir, error in errors:
+            print(f'Warning! {run_dir}: {error}', file=sys.stderr)
+        print(f'Found {nrun} runs: {nparsed} parsed ({nstruc} structures), {nrun - nparsed - len(errors)} unchanged,'
+              f' {nremoved} removed, {len(errors)} failed in {time.perf_counter() - start:.2f} s')
+        print(f'Save {args.db}')
+
+    # ---------- best
+    if args.command == 'best':
+        with phase('query'):
+            start = time.perf_counter()
+            rows = best(conn, args.k, args.comp, args.algo, args.calc_code, args.atype, args.gen, args.path)
+            elapsed = time.perf_counter() - start
+        if args.path_only:
+            if rows:
+                print(rows[0][0])
+            raise SystemExit()
+        out_table(['path', 'ID', 'E_eV_atom', 'comp', 'Spg_sym_opt', 'Spg_num_opt', 'algo', 'Gen'], rows)
+        print(f'# {len(rows)} structures in {elapsed*1e3:.1f} ms', file=sys.stderr)
+
+    # ---------- runs
+    if args.command == 'runs':
+        sql = 'SELECT path, algo, calc_code, atype, nat, nstruc FROM runs'
+        where, params = [], []
+        if args.algo:
+            where.append('algo = ?')
+            params.append(args.algo)
+        if args.calc_code:
+            where.append('calc_code = ?')
+            params.append(args.calc_code)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        rows = conn.execute(sql + ' ORDER BY path', params).fetchall()
+        out_table(['path', 'algo', 'calc_code', 'atype', 'nat', 'nstruc'], rows)
+
+    # ---------- sql
+    if args.command == 'sql':
+        cur = conn.execute(args.query)
+        rows = cur.fetchall()
+        conn.commit()
+        if cur.description:
+            out_table([d[0] for d in cur.description], rows)
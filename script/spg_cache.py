@@ -0,0 +1,334 @@
+#
+# spg_cache.py
+#
+#   2026/10/18
+#   persistent cache of symmetry analysis shared by
+#   spg_check.py, struc2cif.py, and extract_struc.py
+#     - numpy and pymatgen are required
+#     - key: sha256 of lattice, species, fractional coordinates, and symprec
+#     - value: space group, symmetry dataset, refined (conventional) structure,
+#              primitive structure, and cif string
+#     - one symmetry search (spglib dataset) per structure:
+#       the refined and primitive structures and the symmetrized cif are built from the dataset
+#       (the cif has the same sites as CifWriter output, but the order of operations may differ)
+#     - one pickle file per key in the cache directory
+#     - least recently used files are removed when the total size exceeds the limit
+#       (down to EVICT_RATIO of the limit, so the cache directory is not walked at every save)
+#
+#   environment variables
+#     CRYSPY_SPG_CACHE_DIR      cache directory (default: ~/.cache/cryspy_utility/spg)
+#     CRYSPY_SPG_CACHE_SIZE     size limit in MB (default: 512)
+#     CRYSPY_SPG_CACHE          0: disable the cache
+#
+import dataclasses
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from phase_timer import phase
+
+
+CACHE_DIR = os.environ.get('CRYSPY_SPG_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'cryspy_utility', 'spg'))
+CACHE_SIZE = float(os.environ.get('CRYSPY_SPG_CACHE_SIZE', 512)) * 1024**2    # MB --> byte
+CACHE_ENABLED = os.environ.get('CRYSPY_SPG_CACHE', '1') != '0'
+EVICT_RATIO = 0.9    # evict down to 90% of CACHE_SIZE, the directory is walked once per 10% of the limit
+ANGLE_TOLERANCE = 5.0    # same as default of SpacegroupAnalyzer
+ENTRY_VERSION = 2    # entries of older versions are recomputed
+_cache_nbyte = None    # total size estimated in this process, walked once at the first save
+
+
+def struc_key(struc, symprec):
+    '''
+    canonical hash of a structure and symprec
+
+    coordinates are rounded to 1e-6 and wrapped into [0, 1)
+    '''
+    lattice = np.round(struc.lattice.matrix, 6) + 0.0    # + 0.0: -0.0 --> 0.0
+    frac_coords = np.round(np.round(struc.frac_coords, 6) % 1.0, 6) + 0.0
+    h = hashlib.sha256()
+    h.update(lattice.tobytes())
+    h.update(' '.join(site.species_string for site in struc).encode())
+    h.update(frac_coords.tobytes())
+    h.update(f'{float(symprec):.6e} {ANGLE_TOLERANCE:.6e}'.encode())
+    return h.hexdigest()
+
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], key + '.pkl')
+
+
+def _load(key):
+    path = _path(key)
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    # ---------- mark as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+
+def _save(key, entry):
+    global _cache_nbyte
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # ---------- atomic write: other processes never read a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(entry, f)
+    os.replace(tmp, path)
+    # ---------- walk the cache directory only when the estimate exceeds the limit
+    if _cache_nbyte is None:
+        _cache_nbyte = _total_size()
+    else:
+        _cache_nbyte += os.path.getsize(path)
+    if _cache_nbyte > CACHE_SIZE:
+        _cache_nbyte = evict(EVICT_RATIO * CACHE_SIZE)
+
+
+def _list_files():
+    files = []
+    for root, _, filenames in os.walk(CACHE_DIR):
+        for filename in filenames:
+            if not filename.endswith('.pkl'):
+                continue
+            try:
+                st = os.stat(os.path.join(root, filename))
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, os.path.join(root, filename)))
+    return files
+
+
+def _total_size():
+    return sum(size for _, size, _ in _list_files())
+
+
+def evict(size_limit=None):
+    '''
+    remove least recently used entries until the total size <= size_limit
+    return the total size afterward
+    '''
+    if size_limit is None:
+        size_limit = CACHE_SIZE
+    files = _list_files()
+    total = sum(size for _, size, _ in files)
+    if total <= size_limit:
+        return total
+    files.sort()
+    for _, size, path in files:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= size_limit:
+            return total
+    return total
+
+
+def _analyze(struc, symprec):
+    from pymatgen.symmetry.analyzer import SpacegroupAnalyzer
+
+    spg_analyzer = SpacegroupAnalyzer(struc, symprec=symprec, angle_tolerance=ANGLE_TOLERANCE)
+    dataset = spg_analyzer.get_symmetry_dataset()
+    if dataclasses.is_dataclass(dataset):    # spglib >= 2.5
+        dataset = dataclasses.asdict(dataset)
+    sym_struc, orbits = _refined_structure(struc, dataset)
+    return {
+        'spg_sym': spg_analyzer.get_space_group_symbol(),
+        'spg_num': spg_analyzer.get_space_group_number(),
+        'dataset': dataset,
+        'sym_struc': sym_struc,
+        'prim_struc': _primitive_structure(struc, dataset),
+        'orbits': orbits,
+        'version': ENTRY_VERSION,
+    }
+
+
+def _input_site(dataset):
+    # ---------- primitive atom index --> first input atom mapped to it
+    first = {}
+    for i, p in enumerate(dataset['mapping_to_primitive']):
+        first.setdefault(int(p), i)
+    return first
+
+
+def _refined_structure(struc, dataset):
+    '''
+    standardized conventional cell of the dataset (same as get_refined_structure())
+    and the orbit of each site in the conventional cell
+    '''
+    from pymatgen.core import Structure
+
+    first = _input_site(dataset)
+    src = [first[int(p)] for p in dataset['std_mapping_to_primitive']]
+    species = [struc[i].species for i in src]
+    sym_struc = Structure(dataset['std_lattice'], species, dataset['std_positions']).get_sorted_structure()
+    return sym_struc, _std_orbits(sym_struc, dataset['hall_number'])
+
+
+def _std_orbits(sym_struc, hall_number):
+    '''
+    orbit (smallest site index in the orbit) of each site of the conventional cell
+
+    equivalent_atoms of the dataset are orbits of the input cell,
+    they can be split or merged in the conventional cell (e.g., O in a perovskite supercell),
+    so the orbits are made with the operations of the Hall setting (same setting as std_positions)
+    '''
+    import spglib
+
+    ops = spglib.get_symmetry_from_database(hall_number)
+    frac_coords = sym_struc.frac_coords
+    matrix = sym_struc.lattice.matrix
+    species = np.array([site.species_string for site in sym_struc])
+    same = species[:, None] == species[None, :]
+    orbits = np.arange(len(sym_struc))
+    for rot, trans in zip(ops['rotations'], ops['translations']):
+        image = frac_coords @ rot.T + trans
+        diff = image[:, None, :] - frac_coords[None, :, :]
+        diff -= np.round(diff)
+        match = (np.linalg.norm(diff @ matrix, axis=2) < 1e-3) & same    # std_positions are symmetrized
+        i, j = np.nonzero(match)
+        np.minimum.at(orbits, i, j)
+    # ---------- orbit of orbit until stable (ops form a group, one pass is usually enough)
+    while True:
+        new = orbits[orbits]
+        if np.array_equal(new, orbits):
+            break
+        orbits = new
+    return orbits.tolist()
+
+
+def _primitive_structure(struc, dataset):
+    '''
+    primitive cell of the dataset in the orientation of the input, reduced lattice
+    '''
+    from pymatgen.core import Structure
+
+    first = _input_site(dataset)
+    lattice = np.array(dataset['primitive_lattice'])
+    src = [first[p] for p in range(len(first))]
+    frac_coords = struc.cart_coords[src] @ np.linalg.inv(lattice)
+    prim = Structure(lattice, [struc[i].species for i in src], np.round(frac_coords, 12) % 1.0)    # -1e-16 --> 0
+    return prim.get_reduced_structure()
+
+
+def sym_cif(entry):
+    '''
+    symmetrized cif string from the entry without another symmetry search
+    built from the symmetry operations of the Hall setting in the spglib database
+    and the orbits of the conventional cell (see _std_orbits), the layout follows CifWriter
+    but the order of operations may differ
+    '''
+    import spglib
+    from pymatgen.core.operations import SymmOp
+    from pymatgen.io.cif import CifBlock, CifFile
+
+    struc = entry['sym_struc']
+    lattice = struc.lattice
+    comp = struc.composition
+    no_oxi_comp = comp.element_composition
+    blocks = {'_symmetry_space_group_name_H-M': entry['spg_sym']}
+    for attr in ('a', 'b', 'c'):
+        blocks[f'_cell_length_{attr}'] = f'{getattr(lattice, attr):.8f}'
+    for attr in ('alpha', 'beta', 'gamma'):
+        blocks[f'_cell_angle_{attr}'] = f'{getattr(lattice, attr):.8f}'
+    blocks['_symmetry_Int_Tables_number'] = entry['spg_num']
+    blocks['_chemical_formula_structural'] = no_oxi_comp.reduced_formula
+    blocks['_chemical_formula_sum'] = no_oxi_comp.formula
+    blocks['_cell_volume'] = f'{lattice.volume:.8f}'
+    _, fu = no_oxi_comp.get_reduced_composition_and_factor()
+    blocks['_cell_formula_units_Z'] = str(int(fu))
+    # ---------- symmetry operations
+    ops = spglib.get_symmetry_from_database(entry['dataset']['hall_number'])
+    ops = [SymmOp.from_rotation_and_translation(rot, trans).as_xyz_str()
+           for rot, trans in zip(ops['rotations'], ops['translations'])]
+    blocks['_symmetry_equiv_pos_site_id'] = [f'{i}' for i in range(1, len(ops) + 1)]
+    blocks['_symmetry_equiv_pos_as_xyz'] = ops
+    loops = [['_symmetry_equiv_pos_site_id', '_symmetry_equiv_pos_as_xyz']]
+    # ---------- one site for each orbit, sorted as in CifWriter
+    orbits = {}
+    for site, orbit in zip(struc, entry['orbits']):
+        orbits.setdefault(orbit, []).append(site)
+    unique_sites = [(min(sites, key=lambda site: tuple(abs(x) for x in site.frac_coords)), len(sites))
+                    for sites in orbits.values()]
+    unique_sites.sort(key=lambda t: (t[0].species.average_electroneg, -t[1], t[0].a, t[0].b, t[0].c))
+    columns = {key: [] for key in ('type_symbol', 'label', 'symmetry_multiplicity', 'fract_x', 'fract_y',
+                                   'fract_z', 'occupancy')}
+    count = 0
+    for site, mult in unique_sites:
+        for sp, occu in site.species.items():
+            columns['type_symbol'].append(str(sp))
+            columns['label'].append(f'{sp.symbol}{count}')
+            columns['symmetry_multiplicity'].append(f'{mult}')
+            columns['fract_x'].append(f'{site.a:.8f}')
+            columns['fract_y'].append(f'{site.b:.8f}')
+            columns['fract_z'].append(f'{site.c:.8f}')
+            columns['occupancy'].append(str(occu))
+            count += 1
+    for key, values in columns.items():
+        blocks[f'_atom_site_{key}'] = values
+    loops.append([f'_atom_site_{key}' for key in columns])
+    return str(CifFile({comp.reduced_formula: CifBlock(blocks, loops, comp.reduced_formula)}))
+
+
+def get_sym_entry(struc, symprec=0.01, cif=False):
+    '''
+    symmetry entry of struc: {'spg_sym', 'spg_num', 'dataset', 'sym_struc', 'prim_struc', 'orbits', ('cif')}
+
+    cif string (see sym_cif, equivalent to but not always identical with
+    struc.to(fmt='cif', symprec=symprec)) is added only when cif=True, and kept in the cache afterward
+    '''
+    key = struc_key(struc, symprec) if CACHE_ENABLED else None
+    entry = _load(key) if CACHE_ENABLED else None
+    updated = False
+    if entry is None or entry.get('version') != ENTRY_VERSION:    # not cached, or cached by an older version
+        with phase('symmetrize') as ph:
+            entry = _analyze(struc, symprec)
+            ph.add()
+        updated = True
+    if cif and 'cif' not in entry:
+        with phase('cif') as ph:
+            entry['cif'] = sym_cif(entry)
+            ph.add()
+        updated = True
+    if updated and CACHE_ENABLED:
+        _save(key, entry)
+    return entry
+
+
+def get_spg_info(struc, symprec=0.01):
+    '''
+    same as struc.get_space_group_info(symprec=symprec)
+    '''
+    if not CACHE_ENABLED:
+        with phase('symmetrize') as ph:
+            ph.add()
+            return struc.get_space_group_info(symprec=symprec, angle_tolerance=ANGLE_TOLERANCE)
+    entry = get_sym_entry(struc, symprec)
+    return entry['spg_sym'], entry['spg_num']
+
+
+def write_sym_cif(struc, filename, symprec=0.01):
+    '''
+    symmetrized cif like struc.to(fmt='cif', filename=filename, symprec=symprec)
+    with the cache, the cif is made by sym_cif (see its note on differences from CifWriter)
+    '''
+    if not CACHE_ENABLED:
+        with phase('cif') as ph:
+            struc.to(fmt='cif', filename=filename, symprec=symprec)
+            ph.add()
+        return
+    entry = get_sym_entry(struc, symprec, cif=True)
+    with phase('write') as ph, open(filename, 'w') as f:
+        f.write(entry['cif'])
+        ph.add()
@@ -1,22 +1,190 @@
 #!/usr/bin/env python
-
+#
+# 2026/10/18
+#   batch mode for struc_data (xxx_struc_data.pkl, .pkl.gz, .pkl.blk, .store)
+#     with multiple tolerances across a process pool
+#   results are cached in spg_cache (--no_cache to disable)
+#     batch mode does not use the cache unless --cache is given
+#     (only the space group is needed, one cache file per structure and tolerance is not worth it)
+#
+# example
+#   spg_check.py POSCAR
+#   spg_check.py -t 0.1 POSCAR
+#   spg_check.py POSCAR -t 0.1 -t 0.01
+#   - batch mode, output: spg_census.csv and histogram in standard output
+#     spg_check.py opt_struc_data.pkl -t 0.1 -t 0.01 -t 0.001 -j 8 -o spg_census.csv
+#
 import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from functools import partial
 
-from pymatgen.core import Structure
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import is_pickle_name
+import spg_cache
+from struc_store import is_store, open_struc_data
 
 
 def get_spg_info(filename, tolerance=0.01):
-    struc = Structure.from_file(filename)
-    spg_sym, spg_num = struc.get_space_group_info(symprec=tolerance)
+    from pymatgen.core import Structure
+
+    with phase('parse'):
+        struc = Structure.from_file(filename)
+    spg_sym, spg_num = spg_cache.get_spg_info(struc, symprec=tolerance)
     return spg_sym, spg_num
 
 
+def is_struc_data(filename):
+    return is_store(filename) or is_pickle_name(filename)
+
+
+def census_chunk(chunk, tolerances, use_cache=False):
+    '''
+    chunk: [(cid, struc), ...]
+    return rows [(cid, symprec, spg_num, spg_sym), ...]
+    spg_num = 0 and spg_sym = None if symmetry cannot be determined
+    '''
+    rows = []
+    for cid, struc in chunk:
+        for tol in tolerances:
+            try:
+                if use_cache:
+                    spg_sym, spg_num = spg_cache.get_spg_info(struc, symprec=tol)
+                else:
+                    spg_sym, spg_num = struc.get_space_group_info(symprec=tol,
+                                                                  angle_tolerance=spg_cache.ANGLE_TOLERANCE)
+            except ValueError:    # SymmetryUndeterminedError
+                spg_sym, spg_num = None, 0
+            rows.append((cid, tol, spg_num, spg_sym))
+    return rows
+
+
+def gen_chunks(struc_data, chunk_size):
+    chunk = []
+    for cid, struc in struc_data.items():
+        if struc is None:
+            continue
+        chunk.append((cid, struc))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class TableWriter:
+    '''
+    stream rows to csv or parquet (pyarrow is required for parquet)
+    '''
+    columns = ['cid', 'symprec', 'spg_num', 'spg_sym']
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.parquet = filename.endswith('.parquet')
+        if self.parquet:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise SystemExit('pyarrow is required for parquet output')
+            self.pa = pyarrow
+            self.schema = pyarrow.schema([('cid', pyarrow.int64()), ('symprec', pyarrow.float64()),
+                                          ('spg_num', pyarrow.int64()), ('spg_sym', pyarrow.string())])
+            self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+        else:
+            self.f = open(filename, 'w', newline='')
+            self.writer = csv.writer(self.f)
+            self.writer.writerow(self.columns)
+
+    def write(self, rows):
+        if self.parquet:
+            cols = list(zip(*rows))
+            self.writer.write_table(self.pa.table(
+                {name: list(col) for name, col in zip(self.columns, cols)}, schema=self.schema))
+        else:
+            self.writer.writerows(rows)
+            self.f.flush()
+
+    def close(self):
+        if self.parquet:
+            self.writer.close()
+        else:
+            self.f.close()
+
+
+def spg_census(struc_data, tolerances, outfile, njobs=1, chunk_size=100, use_cache=False):
+    '''
+    analyze every structure once per tolerance
+    rows are written to outfile chunk by chunk in order of IDs
+    return histogram {tolerance: Counter({(spg_num, spg_sym): count})}
+    '''
+    hist = {tol: Counter() for tol in tolerances}
+    writer = TableWriter(outfile)
+    chunks = gen_chunks(struc_data, chunk_size)
+    func = partial(census_chunk, tolerances=tolerances, use_cache=use_cache)
+
+    def add(rows):
+        writer.write(rows)
+        for _, tol, spg_num, spg_sym in rows:
+            hist[tol][(spg_num, spg_sym)] += 1
+
+    try:
+        if njobs == 1:
+            for chunk in chunks:
+                add(func(chunk))
+        else:
+            # ------ at most 2 chunks per process in flight
+            with ProcessPoolExecutor(max_workers=njobs) as executor:
+                running = deque()
+                for chunk in chunks:
+                    running.append(executor.submit(func, chunk))
+                    if len(running) >= 2*njobs:
+                        add(running.popleft().result())
+                while running:
+                    add(running.popleft().result())
+    finally:
+        writer.close()
+    return hist
+
+
+def out_hist(hist):
+    for tol, counter in hist.items():
+        print(f'\n# tolerance = {tol}, {sum(counter.values())} structures')
+        print(f'# {"spg_num":>7}  {"spg_sym":<12} {"count":>7}')
+        for (spg_num, spg_sym), count in counter.most_common():
+            print(f'  {spg_num:>7}  {str(spg_sym):<12} {count:>7}')
+
+
 if __name__ == '__main__':
     # ---------- argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('-t', '--tolerance', help='tolerance', type=float, default=0.01)
-    parser.add_argument('infile', help='input file')
+    parser.add_argument('-t', '--tolerance', help='tolerance (default 0.01), repeat for more than one, e.g., -t 0.1 -t 0.01',
+                        type=float, action='append')
+    parser.add_argument('-j', '--jobs', help='number of processes for batch mode (default 1)', type=int, default=1)
+    parser.add_argument('-o', '--outfile', help='output table for batch mode: .csv or .parquet (default: spg_census.csv)',
+                        default='spg_census.csv')
+    parser.add_argument('--no_cache', help='do not use the symmetry cache', action='store_true')
+    parser.add_argument('--cache', help='use the symmetry cache in batch mode', action='store_true')
+    parser.add_argument('infile', help='input file: structure file (POSCAR, cif, ...) or struc_data for batch mode')
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
+    tolerances = args.tolerance or [0.01]
+    if args.no_cache:
+        spg_cache.CACHE_ENABLED = False
+
+    # ---------- batch mode
+    if is_struc_data(args.infile):
+        with phase('load'):
+            struc_data = open_struc_data(args.infile)
+        with phase('census'):
+            hist = spg_census(struc_data, tolerances, args.outfile, args.jobs,
+                              use_cache=args.cache and spg_cache.CACHE_ENABLED)
+        out_hist(hist)
+        print(f'\nSave {args.outfile}')
+        raise SystemExit()
 
     # ---------- main
-    print(get_spg_info(args.infile, args.tolerance))
+    for tol in tolerances:
+        print(get_spg_info(args.infile, tol))
@@ -1,23 +1,34 @@
 #!/usr/bin/env python
 #
+# 2026 Oct. 18
+#   results are cached in spg_cache (--no_cache to disable)
 # 2023 Nov. 30 modified by T. Yamashita
 #
 import argparse
 
-from pymatgen.core import Structure
+from phase_timer import add_prof_option, phase, start_prof
+import spg_cache
 
 
 def get_cif(filename, tolerance=0.01):
-    struc = Structure.from_file(filename)
-    struc.to(fmt='cif', filename=filename+'.cif', symprec=tolerance)
+    from pymatgen.core import Structure
+
+    with phase('parse'):
+        struc = Structure.from_file(filename)
+    spg_cache.write_sym_cif(struc, filename+'.cif', symprec=tolerance)
 
 
 if __name__ == '__main__':
     # ---------- argparse
     parser = argparse.ArgumentParser()
     parser.add_argument('-t', '--tolerance', help='tolerance', type=float, default=0.01)
+    parser.add_argument('--no_cache', help='do not use the symmetry cache', action='store_true')
     parser.add_argument('infile', help='input file')
+    add_prof_option(parser)
     args = parser.parse_args()
+    start_prof(args.prof)
+    if args.no_cache:
+        spg_cache.CACHE_ENABLED = False
 
     # ---------- main
     filename = args.infile.split('/')[-1]    # ./aaa/bbb/POSCAR --> POSCAR
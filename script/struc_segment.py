@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+#
+# struc_segment.py
+#
+#   2026/10/18
+#   append-only segment layout for init_struc_data
+#     - pymatgen is required
+#     - pos2pkl.py --segment appends new structures as a new segment file,
+#       the existing segments are never rewritten
+#
+#   layout of init_struc_data.seg/
+#     manifest.json     format version, composition, number of files written, and segments
+#                       [{"file": "seg_00000.pkl", "id_min": 0, "id_max": 99, "nstruc": 100}, ...]
+#     seg_xxxxx.pkl     {cid: Structure} with contiguous IDs from id_min to id_max
+#
+#   example:
+#     - merge all segments into one segment
+#       struc_segment.py init_struc_data.seg --compact
+#     - write init_struc_data.pkl for CrySPY
+#       struc_segment.py init_struc_data.seg --to_pkl init_struc_data.pkl
+#
+import argparse
+import bisect
+import json
+import os
+import pickle
+import tempfile
+
+from phase_timer import add_prof_option, phase, start_prof
+
+
+SEGMENT_VERSION = 1
+
+
+def is_segment(path):
+    return os.path.isfile(os.path.join(path, 'manifest.json'))
+
+
+def read_manifest(path):
+    with open(os.path.join(path, 'manifest.json'), 'r') as f:
+        manifest = json.load(f)
+    if manifest['version'] != SEGMENT_VERSION:
+        raise ValueError(f'Unsupported segment version: {manifest["version"]}')
+    return manifest
+
+
+def _dump_atomic(obj, filepath, as_json=False):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filepath), suffix='.tmp')
+    if as_json:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f, indent=1)
+    else:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f)
+    os.replace(tmp, filepath)
+
+
+class SegmentData:
+    '''
+    read-only mapping {cid: Structure} over all the segments
+    segments are loaded on demand, and only the last one is kept in memory
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.manifest = read_manifest(path)
+        self.segments = self.manifest['segments']
+        self._id_min = [seg['id_min'] for seg in self.segments]
+        self._loaded = (None, None)    # (file, data)
+
+    def __len__(self):
+        return sum(seg['nstruc'] for seg in self.segments)
+
+    def __contains__(self, cid):
+        return self._segment(cid) is not None
+
+    def __getitem__(self, cid):
+        seg = self._segment(cid)
+        if seg is None:
+            raise KeyError(cid)
+        return self._load(seg)[cid]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def _segment(self, cid):
+        i = bisect.bisect_right(self._id_min, cid) - 1
+        if i >= 0 and cid <= self.segments[i]['id_max']:
+            return self.segments[i]
+        return None
+
+    def _load(self, seg):
+        if self._loaded[0] != seg['file']:
+            with open(os.path.join(self.path, seg['file']), 'rb') as f:
+                self._loaded = (seg['file'], pickle.load(f))
+        return self._loaded[1]
+
+    def get(self, cid, default=None):
+        seg = self._segment(cid)
+        if seg is None:
+            return default
+        return self._load(seg)[cid]
+
+    def keys(self):
+        return [cid for seg in self.segments for cid in range(seg['id_min'], seg['id_max'] + 1)]
+
+    def values(self):
+        for _, struc in self.items():
+            yield struc
+
+    def items(self):
+        for seg in self.segments:
+            yield from self._load(seg).items()
+
+    def next_id(self):
+        return self.segments[-1]['id_max'] + 1 if self.segments else 0
+
+
+def append_segment(path, struc_data, comp=None):
+    '''
+    write struc_data ({cid: Structure}, contiguous IDs) as a new segment
+
+    the manifest is replaced atomically after the segment file is written,
+    so an interrupted append leaves the existing segments valid
+    '''
+    cids = sorted(struc_data.keys())
+    if cids != list(range(cids[0], cids[-1] + 1)):
+        raise ValueError('IDs in a segment must be contiguous')
+    if is_segment(path):
+        manifest = read_manifest(path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        manifest = {'version': SEGMENT_VERSION, 'comp': None, 'nfile': 0, 'segments': []}
+    if manifest['segments'] and cids[0] <= manifest['segments'][-1]['id_max']:
+        raise ValueError(f'ID {cids[0]} already exists in {path}')
+    if manifest['comp'] is None and comp is not None:
+        manifest['comp'] = str(comp)
+    # ---------- segment file
+    segfile = f'seg_{manifest["nfile"]:05d}.pkl'
+    manifest['nfile'] += 1
+    _dump_atomic(struc_data, os.path.join(path, segfile))
+    # ---------- manifest
+    manifest['segments'].append({'file': segfile, 'id_min': cids[0],
+                                 'id_max': cids[-1], 'nstruc': len(cids)})
+    _dump_atomic(manifest, os.path.join(path, 'manifest.json'), as_json=True)
+    return segfile
+
+
+def compact(path):
+    '''
+    merge all segments into one segment file
+    '''
+    manifest = read_manifest(path)
+    if len(manifest['segments']) < 2:
+        return
+    seg_data = SegmentData(path)
+    struc_data = dict(seg_data.items())
+    old_files = [seg['file'] for seg in manifest['segments']]
+    # ---------- new segment, then manifest, then remove old files
+    segfile = f'seg_{manifest["nfile"]:05d}.pkl'
+    manifest['nfile'] += 1
+    _dump_atomic(struc_data, os.path.join(path, segfile))
+    cids = sorted(struc_data.keys())
+    manifest['segments'] = [{'file': segfile, 'id_min': cids[0],
+                             'id_max': cids[-1], 'nstruc': len(cids)}]
+    _dump_atomic(manifest, os.path.join(path, 'manifest.json'), as_json=True)
+    for old in old_files:
+        os.remove(os.path.join(path, old))
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('indir', help='input: init_struc_data.seg')
+    parser.add_argument('-c', '--compact', help='merge all segments into one segment', action='store_true')
+    parser.add_argument('--to_pkl', help='write a single pickle, e.g., --to_pkl init_struc_data.pkl')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- compact
+    if args.compact:
+        compact(args.indir)
+        print(f'Compacted {args.indir}')
+
+    # ---------- to pickle
+    if args.to_pkl:
+        with phase('load'):
+            struc_data = dict(SegmentData(args.indir).items())
+        with phase('write'), open(args.to_pkl, 'wb') as f:
+            pickle.dump(struc_data, f)
+        print(f'The number of structures: {len(struc_data)}')
+        print(f'Save {args.to_pkl}')
+
+    # ---------- info
+    if not args.compact and not args.to_pkl:
+        manifest = read_manifest(args.indir)
+        print(f'Composition: {manifest["comp"]}')
+        for seg in manifest['segments']:
+            print(f'{seg["file"]}: ID {seg["id_min"]} - {seg["id_max"]} ({seg["nstruc"]} structures)')
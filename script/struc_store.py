@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+#
+# struc_store.py
+#
+#   2026/10/18
+#   memory-mapped structure store for init_struc_data.pkl, opt_struc_data.pkl, etc.
+#     - numpy and pymatgen are required
+#     - input: struc_data pickle ({cid: Structure}, .gz and .blk are also OK, see pkl_io.py)
+#     - output: xxx_struc_data.store directory
+#
+#   layout of xxx.store/
+#     meta.json         format version, species table, number of structures and sites
+#     index.npy         int64 (nstruc, 3): [cid, offset, nsite], sorted by cid
+#     lattice.npy       float64 (nstruc, 3, 3)
+#     species.npy       int16 (nsite_tot,): index into the species table
+#     frac_coords.npy   float64 (nsite_tot, 3)
+#
+#   All the arrays are opened with mmap_mode='r', so fetching k structures
+#   touches only k rows of the index and the corresponding blocks.
+#   None in opt_struc_data (e.g. failed optimization) is stored as nsite = -1.
+#   Site properties (e.g. magmom) are not stored.
+#
+#   example:
+#     struc_store.py opt_struc_data.pkl    # --> opt_struc_data.store
+#     extract_struc.py opt_struc_data.store -i 7 10 12
+#     print_pkl.py opt_struc_data.store
+#
+import argparse
+import json
+import os
+
+import numpy as np
+
+from phase_timer import add_prof_option, phase, start_prof
+from pkl_io import load_data
+from struc_segment import SegmentData, is_segment
+
+
+STORE_VERSION = 1
+
+
+class StrucStore:
+    '''
+    read-only mapping {cid: Structure} backed by memory-mapped arrays
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta['version'] != STORE_VERSION:
+            raise ValueError(f'Unsupported store version: {self.meta["version"]}')
+        self.species = self.meta['species']
+        self.index = np.load(os.path.join(path, 'index.npy'), mmap_mode='r')
+        self.lattice = np.load(os.path.join(path, 'lattice.npy'), mmap_mode='r')
+        self.species_idx = np.load(os.path.join(path, 'species.npy'), mmap_mode='r')
+        self.frac_coords = np.load(os.path.join(path, 'frac_coords.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, cid):
+        return self._row(cid) is not None
+
+    def __getitem__(self, cid):
+        row = self._row(cid)
+        if row is None:
+            raise KeyError(cid)
+        return self._struc(row)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def _row(self, cid):
+        # ---------- binary search in the sorted cid column
+        cids = self.index[:, 0]
+        row = int(np.searchsorted(cids, cid))
+        if row < len(cids) and cids[row] == cid:
+            return row
+        return None
+
+    def _struc(self, row):
+        from pymatgen.core import Structure
+
+        _, offset, nsite = self.index[row]
+        if nsite < 0:
+            return None
+        species = [self.species[i] for i in self.species_idx[offset:offset+nsite]]
+        return Structure(np.array(self.lattice[row]), species,
+                         np.array(self.frac_coords[offset:offset+nsite]))
+
+    def get(self, cid, default=None):
+        row = self._row(cid)
+        if row is None:
+            return default
+        return self._struc(row)
+
+    def keys(self):
+        return [int(cid) for cid in self.index[:, 0]]
+
+    def values(self):
+        for row in range(len(self.index)):
+            yield self._struc(row)
+
+    def items(self):
+        for row in range(len(self.index)):
+            yield int(self.index[row, 0]), self._struc(row)
+
+    def _arrays(self, row):
+        cid, offset, nsite = (int(x) for x in self.index[row])
+        if nsite < 0:
+            return None
+        species = [self.species[i] for i in self.species_idx[offset:offset+nsite]]
+        return (cid, np.array(self.lattice[row]),
+                np.array(self.frac_coords[offset:offset+nsite]), species)
+
+    def iter_arrays(self, cids=None):
+        # ---------- (cid, lattice, frac_coords, species) without pymatgen
+        #            cids: only these IDs (missing IDs are skipped)
+        rows = range(len(self.index)) if cids is None else (self._row(cid) for cid in cids)
+        for row in rows:
+            if row is None:
+                continue
+            arrays = self._arrays(row)
+            if arrays is not None:
+                yield arrays
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, 'meta.json'))
+
+
+def open_struc_data(path):
+    '''
+    open struc_data from a pickle (.pkl, .pkl.gz, or .pkl.blk), a store directory,
+    or a segment directory (see struc_segment.py)
+
+    a store (segment) is returned as StrucStore (SegmentData),
+    which behaves like the dict in the pickle
+    '''
+    if is_store(path):
+        return StrucStore(path)
+    if is_segment(path):
+        return SegmentData(path)
+    return load_data(path)
+
+
+def iter_struc_arrays(struc_data, cids=None):
+    '''
+    yield (cid, lattice, frac_coords, species) for each structure (only cids if given)
+    None (e.g. failed optimization) is skipped
+    '''
+    if isinstance(struc_data, StrucStore):
+        yield from struc_data.iter_arrays(cids)
+        return
+    items = struc_data.items() if cids is None else ((cid, struc_data.get(cid)) for cid in cids)
+    for cid, struc in items:
+        if struc is None:
+            continue
+        yield cid, struc.lattice.matrix, struc.frac_coords, [site.species_string for site in struc]
+
+
+def write_store(struc_data, path):
+    # ---------- species table and offsets
+    cids = sorted(struc_data.keys())
+    species = []
+    species_map = {}
+    nsites = [-1 if struc_data[cid] is None else struc_data[cid].num_sites for cid in cids]
+    nsite_tot = sum(n for n in nsites if n > 0)
+    index = np.zeros((len(cids), 3), dtype=np.int64)
+    lattice = np.zeros((len(cids), 3, 3), dtype=np.float64)
+    species_idx = np.zeros(nsite_tot, dtype=np.int16)
+    frac_coords = np.zeros((nsite_tot, 3), dtype=np.float64)
+
+    # ---------- fill arrays
+    offset = 0
+    for row, (cid, nsite) in enumerate(zip(cids, nsites)):
+        struc = struc_data[cid]
+        index[row] = cid, offset, nsite
+        if struc is None:
+            continue
+        lattice[row] = struc.lattice.matrix
+        frac_coords[offset:offset+nsite] = struc.frac_coords
+        for i, site in enumerate(struc):
+            sp = site.species_string
+            if sp not in species_map:
+                species_map[sp] = len(species)
+                species.append(sp)
+            species_idx[offset+i] = species_map[sp]
+        offset += nsite
+
+    # ---------- save
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'index.npy'), index)
+    np.save(os.path.join(path, 'lattice.npy'), lattice)
+    np.save(os.path.join(path, 'species.npy'), species_idx)
+    np.save(os.path.join(path, 'frac_coords.npy'), frac_coords)
+    # ------ meta.json last: a store without meta.json is not recognized
+    meta = {'version': STORE_VERSION, 'species': species,
+            'nstruc': len(cids), 'nsite_tot': nsite_tot}
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+
+def default_store_path(infile):
+    # ---------- ./pkl_data/opt_struc_data.pkl.gz --> ./pkl_data/opt_struc_data.store
+    path = infile
+    if path.endswith('.gz') or path.endswith('.blk'):
+        path = path.rsplit('.', 1)[0]
+    if path.endswith('.pkl'):
+        path = path[:-4]
+    return path + '.store'
+
+
+if __name__ == '__main__':
+    '''
+    convert struc_data pickle to store directory
+    '''
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infile', help='input file: xxx_struc_data.pkl (.gz, .blk)')
+    parser.add_argument('-o', '--outdir', help='output store directory (default: xxx_struc_data.store)')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+
+    # ---------- convert
+    outdir = args.outdir if args.outdir else default_store_path(args.infile)
+    with phase('load'):
+        struc_data = open_struc_data(args.infile)
+    with phase('write') as ph:
+        write_store(struc_data, outdir)
+        ph.add(len(struc_data))
+    print(f'The number of structures: {len(struc_data)}')
+    print(f'Save {outdir}')
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+#
+# sym_pipeline.py
+#
+#   2026/10/18
+#   space group, primitive cell, conventional cell, and symmetrized cif in one pass
+#   (get_primitive_cell.py + spg_check.py + struc2cif.py for many structures)
+#     - pymatgen is required
+#     - input: structure files (POSCAR, cif, ...) or one struc_data (xxx_struc_data.pkl, .store, segment)
+#     - one symmetry search per structure (see spg_cache.py), results are cached in spg_cache
+#     - structures are processed in chunks across a process pool
+#
+#   output in --outdir (default: sym_out)
+#     {name}_prim.vasp    primitive cell (POSCAR format, with --tolerance)
+#     {name}_conv.vasp    conventional standard cell (POSCAR format, same as the refined structure)
+#     {name}.cif          symmetrized cif
+#     sym_summary.csv     name, spg_num, spg_sym, nsite, nsite_prim, nsite_conv
+#   name: ID for struc_data, path of the file with / replaced by _ (work/0001/CONTCAR --> work_0001_CONTCAR)
+#
+#   the primitive cell is the spglib primitive cell (reduced lattice) found with --tolerance,
+#   it can be larger than get_primitive_structure() in get_primitive_cell.py (tolerance 0.25 A)
+#   for structures that are not exactly symmetric, e.g., relaxed structures (use a larger --tolerance)
+#
+#   example:
+#     sym_pipeline.py POSCAR
+#     sym_pipeline.py work/*/CONTCAR -t 0.001 -j 8
+#     sym_pipeline.py opt_struc_data.pkl -j 8 --outputs cif prim
+#
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import csv
+from functools import partial
+import os
+import time
+
+from phase_timer import add_prof_option, phase, start_prof
+import spg_cache
+from spg_check import is_struc_data
+from struc_store import open_struc_data
+
+
+OUTPUTS = ['prim', 'conv', 'cif']
+SUMMARY_COLUMNS = ['name', 'spg_num', 'spg_sym', 'nsite', 'nsite_prim', 'nsite_conv']
+
+
+def file_name(path):
+    # ---------- ./work/0001/CONTCAR --> work_0001_CONTCAR
+    return os.path.normpath(path).lstrip(os.sep).replace(os.sep, '_')
+
+
+def process_chunk(chunk, symprec, outdir, outputs):
+    '''
+    chunk: [(name, struc or path), ...]
+    write the outputs and return summary rows
+    spg_num = 0 and spg_sym = None if symmetry cannot be determined
+    '''
+    from pymatgen.core import Structure
+
+    rows = []
+    for name, struc in chunk:
+        if isinstance(struc, str):
+            try:
+                struc = Structure.from_file(struc)
+            except (OSError, ValueError, IndexError) as e:    # unreadable file
+                print(f'Error! {struc}: {e!r}')
+                rows.append((name, 0, None, 0, 0, 0))
+                continue
+        try:
+            entry = spg_cache.get_sym_entry(struc, symprec, cif='cif' in outputs)
+        except ValueError:    # SymmetryUndeterminedError
+            rows.append((name, 0, None, len(struc), 0, 0))
+            continue
+        prefix = os.path.join(outdir, name)
+        if 'prim' in outputs:
+            entry['prim_struc'].to(fmt='poscar', filename=f'{prefix}_prim.vasp')
+        if 'conv' in outputs:
+            entry['sym_struc'].to(fmt='poscar', filename=f'{prefix}_conv.vasp')
+        if 'cif' in outputs:
+            with open(f'{prefix}.cif', 'w') as f:
+                f.write(entry['cif'])
+        rows.append((name, entry['spg_num'], entry['spg_sym'], len(struc),
+                     len(entry['prim_struc']), len(entry['sym_struc'])))
+    return rows
+
+
+def gen_chunks(items, chunk_size):
+    chunk = []
+    for name, struc in items:
+        if struc is None:
+            continue
+        chunk.append((name, struc))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_pipeline(items, symprec, outdir, outputs, njobs=1, chunk_size=50):
+    '''
+    items: iterable of (name, struc or path)
+    return summary rows in the input order
+    '''
+    os.makedirs(outdir, exist_ok=True)
+    chunks = gen_chunks(items, chunk_size)
+    func = partial(process_chunk, symprec=symprec, outdir=outdir, outputs=outputs)
+    rows = []
+    if njobs == 1:
+        for chunk in chunks:
+            rows += func(chunk)
+    else:
+        # ------ at most 2 chunks per process in flight
+        with ProcessPoolExecutor(max_workers=njobs) as executor:
+            running = deque()
+            for chunk in chunks:
+                running.append(executor.submit(func, chunk))
+                if len(running) >= 2*njobs:
+                    rows += running.popleft().result()
+            while running:
+                rows += running.popleft().result()
+    return rows
+
+
+if __name__ == '__main__':
+    # ---------- argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('infiles', help='structure files (POSCAR, cif, ...) or one struc_data', nargs='+')
+    parser.add_argument('-t', '--tolerance', help='tolerance (default 0.01)', type=float, default=0.01)
+    parser.add_argument('-j', '--jobs', help='number of processes (default 1)', type=int, default=1)
+    parser.add_argument('-c', '--chunk', help='number of structures in a task (default 50)', type=int, default=50)
+    parser.add_argument('--outdir', help='output directory (default: sym_out)', default='sym_out')
+    parser.add_argument('--outputs', help='outputs (default: all), e.g., --outputs cif prim', nargs='+',
+                        choices=OUTPUTS, default=OUTPUTS)
+    parser.add_argument('--no_cache', help='do not use the symmetry cache', action='store_true')
+    add_prof_option(parser)
+    args = parser.parse_args()
+    start_prof(args.prof)
+    if args.no_cache:
+        spg_cache.CACHE_ENABLED = False
+
+    # ---------- input
+    start = time.perf_counter()
+    if len(args.infiles) == 1 and is_struc_data(args.infiles[0]):
+        with phase('load'):
+            struc_data = open_struc_data(args.infiles[0])
+        items = ((str(cid), struc) for cid, struc in struc_data.items())
+    else:
+        items = ((file_name(path), path) for path in args.infiles)    # parsed in the workers
+
+    # ---------- analyze and write
+    with phase('run') as ph:
+        rows = run_pipeline(items, args.tolerance, args.outdir, args.outputs, args.jobs, args.chunk)
+        ph.add(len(rows))
+    with phase('write'):
+        summary = os.path.join(args.outdir, 'sym_summary.csv')
+        with open(summary, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUMMARY_COLUMNS)
+            writer.writerows(rows)
+    elapsed = time.perf_counter() - start
+
+    # ---------- output
+    if len(rows) <= 20:
+        print(f'# {"name":<24} {"spg_num":>7}  {"spg_sym":<12} {"nsite":>6} {"prim":>6} {"conv":>6}')
+        for name, spg_num, spg_sym, nsite, nsite_prim, nsite_conv in rows:
+            print(f'  {name:<24} {spg_num:>7}  {str(spg_sym):<12} {nsite:>6} {nsite_prim:>6} {nsite_conv:>6}')
+    else:
+        counter = Counter((row[1], row[2]) for row in rows)
+        print(f'# {"spg_num":>7}  {"spg_sym":<12} {"count":>7}')
+        for (spg_num, spg_sym), count in counter.most_common():
+            print(f'  {spg_num:>7}  {str(spg_sym):<12} {count:>7}')
+    nfail = sum(1 for row in rows if row[1] == 0)
+    print(f'\n{len(rows)} structures ({nfail} failed) in {elapsed:.2f} s ({args.jobs} processes)')
+    print(f'Save {args.outdir}/')
@@ -0,0 +1,63 @@
+#
+# test_spg_cache.py
+#
+#   symmetrized cif of spg_cache (built from the dataset) must be read back by CifParser
+#   with the same sites as CifWriter
+#
+#   python -m pytest tests
+#
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'script'))
+
+pytest.importorskip('pymatgen')
+pytest.importorskip('spglib')
+
+from pymatgen.core import Lattice, Structure    # noqa: E402
+from pymatgen.io.cif import CifParser, CifWriter    # noqa: E402
+
+import spg_cache    # noqa: E402
+
+
+def perovskite():
+    return Structure(Lattice.cubic(3.9), ['Sr', 'Co', 'O', 'O', 'O'],
+                     [[0, 0, 0], [0.5, 0.5, 0.5], [0.5, 0.5, 0], [0.5, 0, 0.5], [0, 0.5, 0.5]])
+
+
+def diamond():
+    return Structure(Lattice.cubic(5.43), ['Si'] * 8,
+                     [[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5], [0, 0.5, 0.5],
+                      [0.25, 0.25, 0.25], [0.75, 0.75, 0.25], [0.75, 0.25, 0.75], [0.25, 0.75, 0.75]])
+
+
+STRUCS = {
+    'perovskite': perovskite(),
+    'perovskite_221': perovskite() * (2, 2, 1),
+    'perovskite_222': perovskite() * (2, 2, 2),
+    'diamond': diamond(),
+    'diamond_prim': diamond().get_primitive_structure(),
+    'pmm2': Structure(Lattice.orthorhombic(3, 4, 5), ['Ti', 'O', 'O'],
+                      [[0, 0, 0.1], [0.5, 0, 0.3], [0, 0.5, 0.7]]),
+}
+
+
+def atom_sites(cif):
+    return sorted(line.split() for line in cif.split('_atom_site_occupancy')[1].splitlines() if line.strip())
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(spg_cache, 'CACHE_ENABLED', False)
+
+
+@pytest.mark.parametrize('name', STRUCS)
+def test_sym_cif_round_trip(name):
+    struc = STRUCS[name]
+    entry = spg_cache.get_sym_entry(struc, 0.01, cif=True)
+    parsed = CifParser.from_str(entry['cif']).parse_structures(primitive=False)[0]
+    assert len(parsed) == len(entry['sym_struc'])
+    assert parsed.composition.reduced_formula == struc.composition.reduced_formula
+    assert atom_sites(entry['cif']) == atom_sites(str(CifWriter(struc, symprec=0.01)))